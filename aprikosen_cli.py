@@ -0,0 +1,244 @@
+"""
+Kommandozeilen-Batchlauf für viele Prognoseparameter-Sätze.
+
+Liest Parameterzeilen aus einer CSV-Datei zeilenweise, prüft sie mit denselben
+Regeln wie die Streamlit-App, berechnet gültige Zeilen blockweise mit der
+vektorisierten Engine und schreibt die Ergebnisse fortlaufend. Importiert
+weder Streamlit noch Plot-Bibliotheken.
+
+Beispiel:
+    python aprikosen_cli.py parameter.csv ergebnisse.csv --fehler fehler.csv
+
+Erwartete Spalten: startbestand, monatliche_zugaenge, jaehrliches_wachstum,
+prognosejahre sowie optional id.
+
+Die Zusammenfassung enthält neben dem Endbestand dessen Zehnerlogarithmus
+(Log10_Endbestand), der auch bei Überlauf von float64 endlich bleibt; der
+Endbestand wird je Zeile ganzzahlig geschrieben, solange er darstellbar ist.
+"""
+import argparse
+import csv
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from aprikosen_eingaben import MAX_PROGNOSEJAHRE, pruefe_prognoseparameter
+from aprikosen_prognose_engine import (
+    MODELLVERSION,
+    berechne_bestand_ohne_ueberlauf,
+    berechne_log_bestand,
+    berechne_szenarien,
+    berechne_wachstumsfaktor,
+)
+from aprikosen_szenariowuerfel import Szenariowuerfel
+
+PFLICHTSPALTEN = ('startbestand', 'monatliche_zugaenge', 'jaehrliches_wachstum', 'prognosejahre')
+STANDARD_BATCHGROESSE = 10_000
+
+
+def _runde_je_zeile(werte):
+    # Ganze Zahl, solange darstellbar, sonst Gleitkommazahl – je Zeile, damit ein Überlauf
+    # nicht das Format aller anderen Zeilen des Blocks ändert
+    gerundet = np.rint(werte)
+    ganzzahlig = np.isfinite(gerundet) & (np.abs(gerundet) < 2.0 ** 63)
+    ergebnis = gerundet.astype(object)
+    ergebnis[ganzzahlig] = gerundet[ganzzahlig].astype(np.int64).astype(object)
+    return ergebnis
+
+
+def _berechne_zusammenfassung(batch, wuerfel=None, interpolieren=False):
+    startbestand = np.asarray(batch['startbestand'], dtype=np.float64)
+    monatliche_zugaenge = np.asarray(batch['monatliche_zugaenge'], dtype=np.float64)
+    jaehrliches_wachstum = np.asarray(batch['jaehrliches_wachstum'], dtype=np.float64)
+    prognosejahre = np.asarray(batch['prognosejahre'], dtype=np.int64)
+
+    # Endbestand entspricht der letzten Zeile der Monatsprognose (Monat = 12 × Jahre);
+    # im Logarithmus gerechnet bleibt er auch jenseits von float64 als Log10_Endbestand erhalten
+    letzter_monat = prognosejahre * 12 - 1
+    monatlicher_wachstumsfaktor = berechne_wachstumsfaktor(jaehrliches_wachstum)
+    log_end_bestand = berechne_log_bestand(
+        startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, letzter_monat
+    )
+    quelle = None
+    if wuerfel is not None:
+        abfrage = wuerfel.abfrage(
+            startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre, interpolieren=interpolieren
+        )
+        end_bestand = np.rint(abfrage['Endbestand'].to_numpy())
+        quelle = abfrage['Quelle'].to_numpy()
+    else:
+        end_bestand = np.rint(berechne_bestand_ohne_ueberlauf(
+            startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, letzter_monat
+        ))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gesamtwachstum_prozent = (end_bestand / startbestand - 1) * 100
+
+    zusammenfassung = pd.DataFrame({
+        'id': batch['id'],
+        'startbestand': startbestand.astype(np.int64),
+        'monatliche_zugaenge': monatliche_zugaenge.astype(np.int64),
+        'jaehrliches_wachstum': jaehrliches_wachstum,
+        'prognosejahre': prognosejahre,
+        'Endbestand': _runde_je_zeile(end_bestand),
+        'Log10_Endbestand': log_end_bestand / np.log(10),
+        'Gesamtwachstum_Prozent': gesamtwachstum_prozent,
+        'Zinseszinseffekt': end_bestand - (startbestand + letzter_monat * monatliche_zugaenge),
+    })
+    if quelle is not None:
+        zusammenfassung['Quelle'] = quelle
+    return zusammenfassung
+
+
+def _berechne_monatswerte(batch):
+    teile = []
+    ids = np.asarray(batch['id'], dtype=object)
+    prognosejahre = np.asarray(batch['prognosejahre'])
+    for jahre in np.unique(prognosejahre):
+        auswahl = prognosejahre == jahre
+        lang = berechne_szenarien(
+            np.asarray(batch['startbestand'])[auswahl],
+            np.asarray(batch['monatliche_zugaenge'])[auswahl],
+            np.asarray(batch['jaehrliches_wachstum'])[auswahl],
+            int(jahre),
+            langformat=True,
+        )
+        lang.insert(0, 'id', ids[auswahl][lang.pop('Szenario').to_numpy()])
+        teile.append(lang)
+    return pd.concat(teile, ignore_index=True)
+
+
+def _leerer_batch():
+    return {'id': [], **{spalte: [] for spalte in PFLICHTSPALTEN}}
+
+
+def fuehre_batch_aus(eingabe, ausgabe, fehlerausgabe=None, sep=';', batchgroesse=STANDARD_BATCHGROESSE,
+                     monatlich=False, max_prognosejahre=MAX_PROGNOSEJAHRE, wuerfel=None, interpolieren=False):
+    """
+    Verarbeitet eine Parameterdatei zeilenweise und schreibt Ergebnisse blockweise
+
+    Mit einem Szenariowürfel werden Zusammenfassungen auf dem Raster
+    nachgeschlagen statt berechnet; die Spalte 'Quelle' zeigt die Herkunft.
+
+    Returns:
+        dict: Anzahl gelesener, berechneter und fehlerhafter Zeilen
+    """
+    statistik = {'gelesen': 0, 'berechnet': 0, 'fehlerhaft': 0}
+    leser = csv.DictReader(eingabe, delimiter=sep)
+    fehlende = [spalte for spalte in PFLICHTSPALTEN if spalte not in (leser.fieldnames or [])]
+    if fehlende:
+        raise ValueError(f"Fehlende Spalten in der Eingabedatei: {', '.join(fehlende)}")
+
+    fehlerschreiber = None
+    if fehlerausgabe is not None:
+        fehlerschreiber = csv.writer(fehlerausgabe, delimiter=sep)
+        fehlerschreiber.writerow(['zeile', 'id', 'fehler'])
+
+    kopfzeile = True
+    batch = _leerer_batch()
+
+    def schreibe_batch():
+        nonlocal kopfzeile, batch
+        if not batch['id']:
+            return
+        if monatlich:
+            ergebnis = _berechne_monatswerte(batch)
+        else:
+            ergebnis = _berechne_zusammenfassung(batch, wuerfel, interpolieren)
+        ergebnis.to_csv(ausgabe, sep=sep, index=False, header=kopfzeile)
+        kopfzeile = False
+        statistik['berechnet'] += len(batch['id'])
+        batch = _leerer_batch()
+
+    # Zeile 1 ist die Kopfzeile
+    for zeilennummer, zeile in enumerate(leser, start=2):
+        statistik['gelesen'] += 1
+        zeilen_id = (zeile.get('id') or '').strip() or str(zeilennummer)
+        werte, validation_errors = pruefe_prognoseparameter(
+            *((zeile.get(spalte) or '') for spalte in PFLICHTSPALTEN),
+            max_prognosejahre=max_prognosejahre,
+        )
+        if validation_errors:
+            statistik['fehlerhaft'] += 1
+            for error in validation_errors:
+                if fehlerschreiber is not None:
+                    fehlerschreiber.writerow([zeilennummer, zeilen_id, error])
+                else:
+                    print(f"Zeile {zeilennummer} ({zeilen_id}): {error}", file=sys.stderr)
+            continue
+
+        batch['id'].append(zeilen_id)
+        for spalte in PFLICHTSPALTEN:
+            batch[spalte].append(werte[spalte])
+        if len(batch['id']) >= batchgroesse:
+            schreibe_batch()
+
+    schreibe_batch()
+    return statistik
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Berechnet Aprikosenbäume-Prognosen für alle Parameterzeilen einer CSV-Datei."
+    )
+    parser.add_argument('eingabe', help="CSV-Datei mit Parameterzeilen ('-' für stdin)")
+    parser.add_argument('ausgabe', help="Ziel-CSV für die Ergebnisse ('-' für stdout)")
+    parser.add_argument('--fehler', help="Optionale CSV-Datei für Zeilenfehler (sonst stderr)")
+    parser.add_argument('--sep', default=';', help="Trennzeichen für Ein- und Ausgabe (Standard: ';')")
+    parser.add_argument('--batchgroesse', type=int, default=STANDARD_BATCHGROESSE,
+                        help=f"Zeilen je Berechnungsblock (Standard: {STANDARD_BATCHGROESSE})")
+    parser.add_argument('--monatlich', action='store_true',
+                        help="Monatswerte je Zeile statt einer Zusammenfassung ausgeben")
+    parser.add_argument('--max-prognosejahre', type=int, default=MAX_PROGNOSEJAHRE,
+                        help=f"Obergrenze für den Prognosezeitraum (Standard: {MAX_PROGNOSEJAHRE})")
+    parser.add_argument('--wuerfel', help="Verzeichnis eines vorberechneten Szenariowürfels für Nachschlagewerte")
+    parser.add_argument('--interpolieren', action='store_true',
+                        help="Wachstum zwischen Rasterpunkten aus dem Würfel interpolieren statt zu berechnen")
+    args = parser.parse_args(argv)
+
+    wuerfel = None
+    if args.wuerfel:
+        wuerfel = Szenariowuerfel(args.wuerfel)
+        if wuerfel.veraltet:
+            print(
+                f"⚠️ Szenariowürfel hat Modellversion {wuerfel.meta.get('modellversion')}, erwartet "
+                f"{MODELLVERSION}; es wird vollständig mit der Engine gerechnet.",
+                file=sys.stderr,
+            )
+
+    start = time.perf_counter()
+    eingabe = sys.stdin if args.eingabe == '-' else open(args.eingabe, newline='', encoding='utf-8')
+    ausgabe = sys.stdout if args.ausgabe == '-' else open(args.ausgabe, 'w', newline='', encoding='utf-8')
+    fehlerausgabe = open(args.fehler, 'w', newline='', encoding='utf-8') if args.fehler else None
+    try:
+        statistik = fuehre_batch_aus(
+            eingabe,
+            ausgabe,
+            fehlerausgabe=fehlerausgabe,
+            sep=args.sep,
+            batchgroesse=args.batchgroesse,
+            monatlich=args.monatlich,
+            max_prognosejahre=args.max_prognosejahre,
+            wuerfel=wuerfel,
+            interpolieren=args.interpolieren,
+        )
+    except ValueError as exc:
+        print(f"❌ {exc}", file=sys.stderr)
+        return 2
+    finally:
+        for datei in (eingabe, ausgabe, fehlerausgabe):
+            if datei not in (None, sys.stdin, sys.stdout):
+                datei.close()
+
+    dauer = time.perf_counter() - start
+    print(
+        f"✅ {statistik['berechnet']:,} von {statistik['gelesen']:,} Zeilen berechnet, "
+        f"{statistik['fehlerhaft']:,} fehlerhaft ({dauer:.2f} s)",
+        file=sys.stderr,
+    )
+    return 1 if statistik['fehlerhaft'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
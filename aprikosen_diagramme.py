@@ -0,0 +1,200 @@
+"""
+Clientseitige Diagramme für die Streamlit-App.
+
+Statt serverseitig gerenderter PNG-Grafiken werden kompakte Spaltendaten mit
+einer Vega-Lite-Spezifikation (Altair) an den Browser geschickt; Zoom und
+Tooltips funktionieren dort ohne erneuten Skriptlauf. Lange Monatsreihen werden
+vorab mit Largest-Triangle-Three-Buckets (LTTB) auf höchstens max_punkte
+Punkte reduziert, wobei Spitzen und Knicke der Kurve erhalten bleiben.
+"""
+import altair as alt
+import numpy as np
+import pandas as pd
+
+DIAGRAMM_MAX_PUNKTE = 300
+
+_PROGNOSE = 'Prognose mit Wachstum'
+_LINEAR = 'Lineare Entwicklung (ohne Zinseszins)'
+_MEDIAN = 'Monte-Carlo-Median (P50)'
+
+
+def berechne_lttb_indizes(x, y, max_punkte=DIAGRAMM_MAX_PUNKTE):
+    """
+    Wählt mit Largest-Triangle-Three-Buckets die darzustellenden Punkte einer Reihe aus
+
+    Erster und letzter Punkt bleiben immer erhalten; die übrigen Punkte werden in
+    max_punkte - 2 gleich große Klassen geteilt, aus denen jeweils der Punkt mit
+    der größten Dreiecksfläche zum zuvor gewählten Punkt und zum Mittelwert der
+    Folgeklasse übernommen wird.
+
+    Returns:
+        np.ndarray: Aufsteigende Indizes der ausgewählten Punkte
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    anzahl = len(y)
+    if max_punkte >= anzahl or max_punkte < 3:
+        return np.arange(anzahl)
+
+    # Klassengrenzen der inneren Punkte; die letzte "Klasse" ist der Endpunkt allein
+    breite = (anzahl - 2) / (max_punkte - 2)
+    kanten = np.append((np.arange(max_punkte - 1) * breite).astype(np.int64) + 1, anzahl)
+    laengen = np.diff(kanten)
+    mittel_x = np.add.reduceat(x, kanten[:-1]) / laengen
+    mittel_y = np.add.reduceat(y, kanten[:-1]) / laengen
+
+    indizes = np.empty(max_punkte, dtype=np.int64)
+    indizes[0] = 0
+    indizes[-1] = anzahl - 1
+    gewaehlt = 0
+    for klasse in range(max_punkte - 2):
+        start, ende = kanten[klasse], kanten[klasse + 1]
+        flaeche = np.abs(
+            (x[gewaehlt] - mittel_x[klasse + 1]) * (y[start:ende] - y[gewaehlt])
+            - (x[gewaehlt] - x[start:ende]) * (mittel_y[klasse + 1] - y[gewaehlt])
+        )
+        gewaehlt = start + int(np.argmax(flaeche))
+        indizes[klasse + 1] = gewaehlt
+    return indizes
+
+
+def erstelle_bestandsdiagramm(df, baender=None, linear=True, logarithmisch=False, max_punkte=DIAGRAMM_MAX_PUNKTE):
+    """
+    Linienverlauf der Prognose, optional mit linearer Entwicklung und Monte-Carlo-Band
+
+    Die Punktauswahl richtet sich nach der Prognosereihe und gilt für alle
+    Reihen, damit sie eine gemeinsame Zeitachse behalten. Tabellen in
+    Jahresauflösung (ohne 'Datum') werden über dem Prognosejahr gezeichnet.
+    """
+    # Lange Reihen in Jahresauflösung nach dem (stets endlichen) Logarithmus auswählen
+    reihe = df['Log10_Baumbestand'] if 'Log10_Baumbestand' in df else df['Baumbestand']
+    indizes = berechne_lttb_indizes(df['Monat'], reihe, max_punkte)
+    if 'Datum' in df:
+        achse, x, x_tooltip = 'Datum', alt.X('Datum:T', title='Datum'), alt.Tooltip('Datum:T', format='%m/%Y')
+        titel = 'Monatliche Baumbestandsentwicklung'
+    else:
+        achse, x, x_tooltip = 'Prognosejahr', alt.X('Prognosejahr:Q', title='Prognosejahr'), 'Prognosejahr:Q'
+        titel = 'Jährliche Baumbestandsentwicklung'
+    daten = pd.DataFrame({
+        achse: df[achse].to_numpy()[indizes],
+        _PROGNOSE: df['Baumbestand'].to_numpy()[indizes],
+        _LINEAR: df['Lineare_Entwicklung'].to_numpy()[indizes],
+    })
+    reihen = [_PROGNOSE, _LINEAR]
+    farben = ['seagreen', 'black']
+    striche = [[1, 0], [6, 4]]
+    if not linear:
+        daten = daten.drop(columns=_LINEAR)
+        del reihen[1], farben[1], striche[1]
+    if baender is not None:
+        for spalte in ('P5', 'P50', 'P95'):
+            daten[spalte] = np.rint(baender[spalte].to_numpy()[indizes])
+        daten = daten.rename(columns={'P50': _MEDIAN})
+        reihen.append(_MEDIAN)
+        farben.append('seagreen')
+        striche.append([2, 2])
+
+    basis = alt.Chart(daten).encode(x=x)
+    skala = alt.Scale(type='log') if logarithmisch else alt.Scale()
+    linien = basis.transform_fold(reihen, as_=['Reihe', 'Baeume']).mark_line(
+        strokeWidth=2, point=alt.OverlayMarkDef(size=15, opacity=0.6)
+    ).encode(
+        y=alt.Y('Baeume:Q', title='Anzahl Bäume', scale=skala),
+        color=alt.Color('Reihe:N', scale=alt.Scale(domain=reihen, range=farben),
+                        legend=alt.Legend(title=None, orient='top-left')),
+        strokeDash=alt.StrokeDash('Reihe:N', scale=alt.Scale(domain=reihen, range=striche), legend=None),
+        tooltip=[
+            x_tooltip,
+            alt.Tooltip('Reihe:N'),
+            alt.Tooltip('Baeume:Q', title='Bäume', format=',.0f'),
+        ],
+    )
+    ebenen = [linien]
+    if baender is not None:
+        ebenen.insert(0, basis.mark_area(color='seagreen', opacity=0.2).encode(
+            y=alt.Y('P5:Q', scale=skala),
+            y2='P95:Q',
+            tooltip=[
+                x_tooltip,
+                alt.Tooltip('P5:Q', format=',.0f'),
+                alt.Tooltip('P95:Q', format=',.0f'),
+            ],
+        ))
+
+    return alt.layer(*ebenen).properties(
+        title=titel, height=400
+    ).interactive(bind_y=False)
+
+
+def erstelle_anteilsdiagramm(rest_bestand, zinseszinseffekt):
+    """Kreisdiagramm aus linearer Entwicklung und Zinseszinseffekt am Endbestand"""
+    daten = pd.DataFrame({
+        'Anteil': ['Lineare Entwicklung', 'Zinseszinseffekt'],
+        'Baeume': [rest_bestand, zinseszinseffekt],
+    })
+    daten['Prozent'] = daten['Baeume'] / daten['Baeume'].sum()
+
+    basis = alt.Chart(daten).encode(
+        theta=alt.Theta('Baeume:Q', stack=True),
+        order=alt.Order('Anteil:N'),
+    )
+    kreis = basis.mark_arc(outerRadius=140).encode(
+        color=alt.Color('Anteil:N', scale=alt.Scale(range=['#a3c9a8', '#2e7d32']),
+                        legend=alt.Legend(title=None, orient='bottom')),
+        tooltip=[
+            alt.Tooltip('Anteil:N'),
+            alt.Tooltip('Baeume:Q', title='Bäume', format=',.0f'),
+            alt.Tooltip('Prozent:Q', format='.1%'),
+        ],
+    )
+    beschriftung = basis.mark_text(radius=165).encode(text=alt.Text('Prozent:Q', format='.1%'))
+    return (kreis + beschriftung).properties(height=360)
+
+
+def erstelle_tornadodiagramm(tornado, relative_aenderung):
+    """Balkendiagramm der linearisierten Endbestandsänderung je Parameter"""
+    beschriftungen = {
+        'Startbestand': 'Startbestand',
+        'Monatliche_Zugaenge': 'Monatliche Zugänge',
+        'Jaehrliches_Wachstum_Prozent': 'Jährliches Wachstum',
+        'Prognosejahre': 'Prognosezeitraum',
+    }
+    namen = [beschriftungen[parameter] for parameter in tornado['Parameter']]
+    richtungen = [f"-{relative_aenderung:.0%}", f"+{relative_aenderung:.0%}"]
+    daten = pd.DataFrame({
+        'Parameter': namen * 2,
+        'Richtung': np.repeat(richtungen, len(namen)),
+        'Aenderung': np.concatenate([tornado['Aenderung_Minus'], tornado['Aenderung_Plus']]),
+    })
+
+    balken = alt.Chart(daten).mark_bar().encode(
+        x=alt.X('Aenderung:Q', title='Änderung des Endbestands (Bäume)'),
+        y=alt.Y('Parameter:N', sort=namen, title=None),
+        color=alt.Color('Richtung:N', scale=alt.Scale(domain=richtungen, range=['#c62828', '#2e7d32']),
+                        legend=alt.Legend(title=None, orient='top-right')),
+        tooltip=['Parameter:N', 'Richtung:N', alt.Tooltip('Aenderung:Q', title='Änderung', format=',.0f')],
+    )
+    nulllinie = alt.Chart(pd.DataFrame({'Aenderung': [0]})).mark_rule(color='black').encode(x='Aenderung:Q')
+    return (balken + nulllinie).properties(title='Sensitivität des Endbestands', height=220)
+
+
+def erstelle_ueberwachungsdiagramm(abweichungen):
+    """Prognosen einer Plantage als Linien, eingelesene Ist-Bestände als Punkte"""
+    prognosen = alt.Chart(abweichungen).mark_line(strokeWidth=2).encode(
+        x=alt.X('Datum:T', title='Datum'),
+        y=alt.Y('Prognosewert:Q', title='Anzahl Bäume'),
+        color=alt.Color('Prognose:N', legend=alt.Legend(title=None, orient='top-left')),
+        tooltip=[
+            alt.Tooltip('Datum:T', format='%m/%Y'),
+            alt.Tooltip('Prognose:N'),
+            alt.Tooltip('Prognosewert:Q', title='Prognose', format=',.0f'),
+            alt.Tooltip('Istwert:Q', title='Ist', format=',.0f'),
+        ],
+    )
+    ist = abweichungen.dropna(subset=['Istwert']).drop_duplicates('Datum')
+    punkte = alt.Chart(ist).mark_point(color='black', filled=True, size=30).encode(
+        x='Datum:T',
+        y='Istwert:Q',
+        tooltip=[alt.Tooltip('Datum:T', format='%m/%Y'), alt.Tooltip('Istwert:Q', title='Ist', format=',.0f')],
+    )
+    return (prognosen + punkte).properties(title='Prognose und Ist-Bestand', height=400).interactive(bind_y=False)
@@ -0,0 +1,111 @@
+"""
+Prüfung und Umwandlung von Benutzereingaben.
+
+Wird von der Streamlit-App und dem Kommandozeilen-Batchlauf gemeinsam genutzt
+und importiert deshalb weder Streamlit noch Plot-Bibliotheken.
+"""
+import csv
+
+MAX_PROGNOSEJAHRE = 1000
+ZEITPLAN_SCHLUESSEL = ('Monat', 'Kalendermonat')
+ZEITPLAN_SPALTEN = ('monatliche_zugaenge', 'jaehrliches_wachstum')
+
+
+def parse_int(value: str, field_label: str, minimum: int = 0, maximum: int | None = None):
+    if not value.strip():
+        raise ValueError(f"{field_label} ist ein Pflichtfeld.")
+    try:
+        parsed = int(value)
+    except ValueError:
+        raise ValueError(f"{field_label} muss eine ganze Zahl sein.")
+    if parsed < minimum:
+        raise ValueError(f"{field_label} muss mindestens {minimum} betragen.")
+    if maximum is not None and parsed > maximum:
+        raise ValueError(f"{field_label} darf höchstens {maximum} betragen.")
+    return parsed
+
+
+def parse_float(value: str, field_label: str, minimum: float = 0.0, maximum: float | None = None):
+    if not value.strip():
+        raise ValueError(f"{field_label} ist ein Pflichtfeld.")
+    try:
+        parsed = float(value.replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{field_label} muss eine Zahl sein.")
+    if parsed < minimum:
+        raise ValueError(f"{field_label} muss mindestens {minimum} betragen.")
+    if maximum is not None and parsed > maximum:
+        raise ValueError(f"{field_label} darf höchstens {maximum} betragen.")
+    return parsed
+
+
+def pruefe_prognoseparameter(startbestand_input: str, monatliche_zugaenge_input: str,
+                             jaehrliches_wachstum_input: str, prognosejahre_input: str,
+                             max_prognosejahre: int = MAX_PROGNOSEJAHRE):
+    """
+    Prüft die vier Grundparameter einer Prognose und sammelt alle Fehlermeldungen
+
+    Returns:
+        tuple[dict, list[str]]: Gültige Werte je Parameter und Fehlermeldungen
+    """
+    werte = {}
+    validation_errors = []
+    pruefungen = (
+        ('startbestand', parse_int, startbestand_input, "Startbestand (Bäume)", {}),
+        ('monatliche_zugaenge', parse_int, monatliche_zugaenge_input, "Monatliche Zugänge", {}),
+        ('jaehrliches_wachstum', parse_float, jaehrliches_wachstum_input, "Jährliches Wachstum (%)", {}),
+        ('prognosejahre', parse_int, prognosejahre_input, "Prognosezeitraum (Jahre)",
+         {'minimum': 1, 'maximum': max_prognosejahre}),
+    )
+    for name, parser, value, field_label, grenzen in pruefungen:
+        try:
+            werte[name] = parser(value, field_label, **grenzen)
+        except ValueError as exc:
+            validation_errors.append(str(exc))
+    return werte, validation_errors
+
+
+def pruefe_zeitplan(zeilen, monate_gesamt: int, sep: str = ';'):
+    """
+    Prüft eine Zeitplan-CSV für monatliche Zugänge und jährliches Wachstum
+
+    Die Schlüsselspalte 'Monat' (1 bis monate_gesamt) beschreibt Stufen, die
+    bis zum nächsten angegebenen Monat gelten; 'Kalendermonat' (1 bis 12)
+    beschreibt ein Saisonprofil, das sich jedes Jahr wiederholt. Mindestens
+    eine der Spalten aus ZEITPLAN_SPALTEN muss vorhanden sein; leere Zellen
+    übernehmen den Wert aus dem Formular.
+
+    Returns:
+        tuple[dict, list[str]]: Schlüsselspalte und je Wertespalte ein dict
+            Schlüssel -> Wert sowie Fehlermeldungen
+    """
+    leser = csv.DictReader(zeilen, delimiter=sep)
+    spalten = leser.fieldnames or []
+    schluessel = next((name for name in ZEITPLAN_SCHLUESSEL if name in spalten), None)
+    wertespalten = [name for name in ZEITPLAN_SPALTEN if name in spalten]
+    if schluessel is None or not wertespalten:
+        return {}, [
+            f"Der Zeitplan benötigt eine der Spalten {' oder '.join(ZEITPLAN_SCHLUESSEL)} "
+            f"und mindestens eine der Spalten {', '.join(ZEITPLAN_SPALTEN)}."
+        ]
+
+    werte = {'schluessel': schluessel, **{name: {} for name in wertespalten}}
+    validation_errors = []
+    gesehen = set()
+    maximum = monate_gesamt if schluessel == 'Monat' else 12
+    parser = {'monatliche_zugaenge': parse_int, 'jaehrliches_wachstum': parse_float}
+    # Zeile 1 ist die Kopfzeile
+    for zeilennummer, zeile in enumerate(leser, start=2):
+        try:
+            position = parse_int(zeile.get(schluessel) or '', f"Zeile {zeilennummer}: {schluessel}",
+                                 minimum=1, maximum=maximum)
+            if position in gesehen:
+                raise ValueError(f"Zeile {zeilennummer}: {schluessel} {position} ist doppelt angegeben.")
+            gesehen.add(position)
+            for name in wertespalten:
+                wert = (zeile.get(name) or '').strip()
+                if wert:
+                    werte[name][position] = parser[name](wert, f"Zeile {zeilennummer}: {name}")
+        except ValueError as exc:
+            validation_errors.append(str(exc))
+    return werte, validation_errors
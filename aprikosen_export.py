@@ -0,0 +1,230 @@
+"""
+Spaltenorientierter Export der Prognoseergebnisse nach Parquet und Arrow IPC.
+
+Die Tabellen werden ohne zeilenweise Python-Umwandlung direkt aus den
+NumPy-Spalten der DataFrames geschrieben. Die Modellparameter und die
+Modellversion stehen als JSON in den Schema-Metadaten, sodass jede Datei ihre
+Entstehung selbst beschreibt. Szenario-Läufe können als nach Spalten
+partitionierter Parquet-Datensatz abgelegt werden.
+
+Arrow-IPC-Dateien werden unkomprimiert geschrieben und lassen sich deshalb
+speicherabgebildet ohne Kopie lesen; Parquet ist kompakter, muss beim Lesen
+aber dekodiert werden.
+
+Für die zeilenorientierten Formate gibt es Stromschreiber, die Blöcke (etwa
+aus iteriere_szenarien) nacheinander anhängen und nur den jeweiligen Block im
+Speicher halten: CSV über einen großen Schreibpuffer im gewohnten Format mit
+sep=';', Excel über eine openpyxl-Arbeitsmappe im Nur-Schreiben-Modus. Beide
+messen Zeilen und Bytes pro Sekunde.
+"""
+import json
+import os
+import time
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from aprikosen_prognose_engine import MODELLVERSION
+
+METADATEN_PARAMETER = b'aprikosen.parameter'
+METADATEN_MODELLVERSION = b'aprikosen.modellversion'
+STANDARD_PUFFERGROESSE = 1 << 20
+EXCEL_MAX_ZEILEN = 1_048_576
+
+
+def erstelle_arrow_tabelle(df, parameter=None):
+    """
+    Wandelt einen DataFrame spaltenweise in eine Arrow-Tabelle mit Parametern in den Metadaten
+
+    Returns:
+        pa.Table: Tabelle ohne Index-Spalte
+    """
+    tabelle = pa.Table.from_pandas(df, preserve_index=False)
+    metadaten = dict(tabelle.schema.metadata or {})
+    metadaten[METADATEN_MODELLVERSION] = str(MODELLVERSION).encode()
+    if parameter is not None:
+        metadaten[METADATEN_PARAMETER] = json.dumps(parameter, ensure_ascii=False, default=str).encode()
+    return tabelle.replace_schema_metadata(metadaten)
+
+
+def schreibe_parquet(df, pfad, parameter=None, partitionen=None, kompression='zstd'):
+    """
+    Schreibt einen DataFrame als Parquet-Datei oder, mit partitionen, als partitionierten Datensatz
+
+    Mit partitionen (z. B. ['Szenario']) ist pfad ein Verzeichnis mit einem
+    Unterverzeichnis Spalte=Wert je Partition.
+    """
+    tabelle = erstelle_arrow_tabelle(df, parameter)
+    if partitionen:
+        pq.write_to_dataset(
+            tabelle, pfad, partition_cols=list(partitionen), compression=kompression,
+            existing_data_behavior='delete_matching',
+        )
+    else:
+        pq.write_table(tabelle, pfad, compression=kompression)
+
+
+def schreibe_arrow(df, pfad, parameter=None):
+    """Schreibt einen DataFrame als unkomprimierte Arrow-IPC-Datei für speicherabgebildetes Lesen"""
+    tabelle = erstelle_arrow_tabelle(df, parameter)
+    with pa.OSFile(str(pfad), 'wb') as datei, ipc.new_file(datei, tabelle.schema) as schreiber:
+        schreiber.write_table(tabelle)
+
+
+def lies_arrow(pfad, speicherabbild=True):
+    """
+    Liest eine Arrow-IPC-Datei; mit speicherabbild=True zeigen die Spalten ohne Kopie in die Datei
+
+    Returns:
+        pa.Table: Tabelle samt Metadaten (mit .to_pandas() in einen DataFrame wandelbar)
+    """
+    quelle = pa.memory_map(str(pfad), 'r') if speicherabbild else pa.OSFile(str(pfad), 'rb')
+    with quelle:
+        return ipc.open_file(quelle).read_all()
+
+
+def lies_parquet(pfad, spalten=None, filter=None, schema=None):
+    """
+    Liest eine Parquet-Datei oder einen partitionierten Datensatz, optional nur Teile davon
+
+    Mit schema werden alle Dateien eines Datensatzes auf dieses Schema
+    gebracht, auch wenn einzelne Teile mit anderen Spaltentypen geschrieben wurden.
+
+    Returns:
+        pa.Table: Tabelle samt Metadaten
+    """
+    return pq.read_table(pfad, columns=spalten, filters=filter, schema=schema, memory_map=True)
+
+
+def lies_parameter(tabelle_oder_schema):
+    """
+    Liest Modellparameter und Modellversion aus den Metadaten einer Tabelle
+
+    Returns:
+        tuple[dict | None, int | None]: Parameter und Modellversion
+    """
+    metadaten = getattr(tabelle_oder_schema, 'schema', tabelle_oder_schema).metadata or {}
+    parameter = metadaten.get(METADATEN_PARAMETER)
+    modellversion = metadaten.get(METADATEN_MODELLVERSION)
+    return (
+        json.loads(parameter) if parameter is not None else None,
+        int(modellversion) if modellversion is not None else None,
+    )
+
+
+def _exportstatistik(zeilen, bytes_geschrieben, sekunden):
+    sekunden = max(sekunden, 1e-9)
+    return {
+        'Zeilen': zeilen,
+        'Bytes': bytes_geschrieben,
+        'Sekunden': sekunden,
+        'Zeilen_pro_Sekunde': zeilen / sekunden,
+        'Bytes_pro_Sekunde': bytes_geschrieben / sekunden,
+    }
+
+
+class CsvStromSchreiber:
+    """
+    Hängt DataFrame-Blöcke gepuffert an eine CSV-Datei an; die Kopfzeile wird nur einmal geschrieben
+
+    Als Kontextmanager verwenden; statistik ist nach dem Schließen vollständig.
+    Die Dauer zählt nur die Zeit in diesem Schreiber, sodass mehrere abwechselnd
+    befüllte Schreiber sich nicht gegenseitig in den Durchsatz einrechnen.
+    """
+
+    def __init__(self, pfad, sep=';', puffergroesse=STANDARD_PUFFERGROESSE, encoding='utf-8'):
+        self.pfad = pfad
+        self.sep = sep
+        self.puffergroesse = puffergroesse
+        self.encoding = encoding
+        self.zeilen = 0
+        self._kopf_geschrieben = False
+        self._datei = None
+        self._sekunden = 0.0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._datei = open(self.pfad, 'w', newline='', encoding=self.encoding, buffering=self.puffergroesse)
+        self._sekunden += time.perf_counter() - start
+        return self
+
+    def schreibe(self, df):
+        start = time.perf_counter()
+        df.to_csv(self._datei, sep=self.sep, index=False, header=not self._kopf_geschrieben)
+        self._kopf_geschrieben = True
+        self.zeilen += len(df)
+        self._sekunden += time.perf_counter() - start
+
+    def __exit__(self, *exc_info):
+        start = time.perf_counter()
+        self._datei.close()
+        self._sekunden += time.perf_counter() - start
+
+    @property
+    def statistik(self):
+        return _exportstatistik(self.zeilen, os.path.getsize(self.pfad), self._sekunden)
+
+
+class ExcelStromSchreiber:
+    """
+    Schreibt DataFrame-Blöcke in eine Excel-Arbeitsmappe im Nur-Schreiben-Modus
+
+    openpyxl lagert jedes Blatt beim Anhängen in eine temporäre Datei aus, der
+    Speicherbedarf bleibt daher konstant. Überschreitet ein Blatt die
+    Excel-Grenze von EXCEL_MAX_ZEILEN Zeilen, wird es als Name_2, Name_3, ...
+    fortgesetzt. Wie bei CsvStromSchreiber zählt nur die Zeit in diesem Schreiber.
+    """
+
+    def __init__(self, pfad):
+        self.pfad = pfad
+        self.zeilen = 0
+        self._arbeitsmappe = None
+        self._blaetter = {}
+        self._sekunden = 0.0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._arbeitsmappe = openpyxl.Workbook(write_only=True)
+        self._sekunden += time.perf_counter() - start
+        return self
+
+    def _blatt(self, name, spalten):
+        # Aktuelles Blatt zu name samt Zeilenzahl; bei voller Seite ein Folgeblatt anlegen
+        blatt, zeilen, nummer = self._blaetter.get(name, (None, EXCEL_MAX_ZEILEN, 0))
+        if zeilen >= EXCEL_MAX_ZEILEN:
+            nummer += 1
+            blatt = self._arbeitsmappe.create_sheet(name if nummer == 1 else f"{name}_{nummer}")
+            blatt.append(list(spalten))
+            zeilen = 1
+        self._blaetter[name] = (blatt, zeilen, nummer)
+        return blatt, zeilen
+
+    def schreibe(self, blattname, df):
+        start = time.perf_counter()
+        # Fehlende Werte als leere Zellen wie bei DataFrame.to_excel
+        werte = df.astype(object).where(df.notna(), None)
+        # Auch ein leerer erster Block legt das Blatt samt Kopfzeile an
+        if blattname not in self._blaetter:
+            self._blatt(blattname, df.columns)
+        position = 0
+        while position < len(werte):
+            blatt, zeilen = self._blatt(blattname, df.columns)
+            teil = werte.iloc[position:position + EXCEL_MAX_ZEILEN - zeilen]
+            for zeile in teil.itertuples(index=False, name=None):
+                blatt.append(zeile)
+            self._blaetter[blattname] = (blatt, zeilen + len(teil), self._blaetter[blattname][2])
+            position += len(teil)
+        self.zeilen += len(df)
+        self._sekunden += time.perf_counter() - start
+
+    def __exit__(self, *exc_info):
+        start = time.perf_counter()
+        self._arbeitsmappe.save(self.pfad)
+        self._sekunden += time.perf_counter() - start
+
+    @property
+    def statistik(self):
+        bytes_geschrieben = os.path.getsize(self.pfad) if os.path.exists(self.pfad) else 0
+        return _exportstatistik(self.zeilen, bytes_geschrieben, self._sekunden)
@@ -0,0 +1,210 @@
+"""
+Kalibrierung der Modellparameter aus beobachteten Baumbeständen.
+
+Für jede Plantage werden Startbestand S, monatliche Zugänge Z und jährliches
+Wachstum p so bestimmt, dass die geschlossene Form
+
+    B_k = S × f^k + Z × (f^k - 1) / (f - 1),   f = (1 + p / 100)^(1/12)
+
+die beobachteten Monatsbestände im Sinne kleinster Quadrate am besten trifft.
+Bei festem Wachstum ist das Modell linear in S und Z; für ein Raster von
+Wachstumsraten je Plantage genügen deshalb je Rasterpunkt die fünf Summen der
+Normalgleichungen (Σa², Σab, Σb², Σay, Σby mit a = f^k, b = (f^k - 1)/(f - 1)).
+Das Raster wird in mehreren Durchläufen um das jeweils beste Wachstum verfeinert.
+
+Die Beobachtungen werden in jedem Durchlauf blockweise aus einem DataFrame,
+einer CSV- oder einer Parquet-Datei gelesen und nie vollständig geladen; alle
+Plantagen eines Blocks werden gemeinsam berechnet.
+
+Erwartete Spalten: id, Baumbestand und entweder Monat (1 = Startbestand) oder
+Datum (der erste beobachtete Monat einer Plantage gilt als Start).
+"""
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+from aprikosen_prognose_engine import berechne_bestand, berechne_wachstumsfaktor
+
+STANDARD_LESEBLOCK = 50_000
+RASTERPUNKTE = 21
+STANDARD_DURCHLAEUFE = 4
+STANDARD_WACHSTUM_BEREICH = (0.0, 60.0)
+
+
+def lies_beobachtungen(quelle, blockgroesse=STANDARD_LESEBLOCK, sep=';'):
+    """
+    Liest Beobachtungen blockweise aus einem DataFrame, einer Parquet-Datei bzw. einem Datensatz oder einer CSV
+
+    Yields:
+        pd.DataFrame: Höchstens blockgroesse Beobachtungszeilen
+    """
+    if isinstance(quelle, pd.DataFrame):
+        for start in range(0, len(quelle), blockgroesse):
+            yield quelle.iloc[start:start + blockgroesse]
+    elif str(quelle).endswith('.csv'):
+        yield from pd.read_csv(quelle, sep=sep, chunksize=blockgroesse)
+    else:
+        for batch in ds.dataset(quelle, format='parquet').to_batches(batch_size=blockgroesse):
+            yield batch.to_pandas()
+
+
+class _Plantagenindex:
+    # Gemeinsame Nummerierung der Plantagen und Monatsindex k je Beobachtung
+
+    def __init__(self, quelle, blockgroesse, sep):
+        teile = []
+        self.nach_datum = None
+        for block in lies_beobachtungen(quelle, blockgroesse, sep):
+            if self.nach_datum is None:
+                self.nach_datum = 'Monat' not in block
+            teile.append(pd.DataFrame({'id': block['id'].to_numpy(), 'monat': self._monate(block)})
+                         .groupby('id')['monat'].agg(['min', 'max', 'count']))
+        if not teile:
+            raise ValueError("Keine Beobachtungen gefunden.")
+        uebersicht = pd.concat(teile).groupby(level=0).agg({'min': 'min', 'max': 'max', 'count': 'sum'})
+        self.ids = uebersicht.index
+        # Nach Datum beginnt jede Plantage in ihrem ersten beobachteten Monat, sonst in Monat 1
+        self.erster_monat = uebersicht['min'].to_numpy() if self.nach_datum else np.zeros(len(uebersicht), np.int64)
+        self.letzter_index = uebersicht['max'].to_numpy() - self.erster_monat
+        self.anzahl = uebersicht['count'].to_numpy()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _monate(self, block):
+        # Monatsordinal (nach Datum) bzw. Monat - 1
+        if self.nach_datum:
+            return pd.DatetimeIndex(block['Datum']).to_period('M').asi8
+        return block['Monat'].to_numpy(dtype=np.int64) - 1
+
+    def zerlege(self, block):
+        # Plantagennummer, Monatsindex k (0 = Start) und Bestand je Beobachtung, nach Plantage sortiert
+        plantage = self.ids.get_indexer(block['id'].to_numpy())
+        reihenfolge = np.argsort(plantage, kind='stable')
+        plantage = plantage[reihenfolge]
+        monate = self._monate(block)[reihenfolge] - self.erster_monat[plantage]
+        return plantage, monate, block['Baumbestand'].to_numpy(dtype=np.float64)[reihenfolge]
+
+
+def _summiere_je_plantage(plantage, werte, ziel):
+    # Addiert die Zeilen von werte je Plantage (plantage sortiert) auf ziel[plantage]
+    if not len(plantage):
+        return
+    grenzen = np.flatnonzero(np.append(True, plantage[1:] != plantage[:-1]))
+    ziel[plantage[grenzen]] += np.add.reduceat(werte, grenzen, axis=0)
+
+
+def _loese_normalgleichungen(summen):
+    # Kleinste Quadrate für S und Z >= 0 aus (aa, ab, bb, ay, by); liefert S, Z und die
+    # Fehlerquadratsumme ohne den für alle Rasterpunkte gleichen Summanden Σy²
+    aa, ab, bb, ay, by = summen
+    with np.errstate(divide='ignore', invalid='ignore'):
+        determinante = aa * bb - ab * ab
+        start = (bb * ay - ab * by) / determinante
+        zugaenge = (aa * by - ab * ay) / determinante
+        # Randlösungen, falls ein Parameter negativ würde
+        nur_start = (zugaenge < 0) | ~np.isfinite(zugaenge)
+        start = np.where(nur_start, np.maximum(ay / aa, 0.0), start)
+        zugaenge = np.where(nur_start, 0.0, zugaenge)
+        nur_zugaenge = start < 0
+        zugaenge = np.where(nur_zugaenge, np.maximum(by / bb, 0.0), zugaenge)
+        start = np.where(nur_zugaenge, 0.0, start)
+    fehler = -2 * (start * ay + zugaenge * by) + start ** 2 * aa + 2 * start * zugaenge * ab + zugaenge ** 2 * bb
+    return start, zugaenge, fehler
+
+
+def _metriken(summen, praefix=''):
+    anzahl, fehler, abs_fehler, quadrat, rel_fehler, y, yy = summen
+    with np.errstate(divide='ignore', invalid='ignore'):
+        streuung = yy - y ** 2 / anzahl
+        return {
+            f'{praefix}RMSE': np.sqrt(quadrat / anzahl),
+            f'{praefix}MAE': abs_fehler / anzahl,
+            f'{praefix}MAPE_Prozent': rel_fehler / anzahl * 100,
+            f'{praefix}Bias': fehler / anzahl,
+            f'{praefix}R2': np.where(streuung > 0, 1 - quadrat / streuung, np.nan),
+        }
+
+
+def kalibriere(quelle, pruefmonate=0, wachstum_bereich=STANDARD_WACHSTUM_BEREICH, durchlaeufe=STANDARD_DURCHLAEUFE,
+               blockgroesse=STANDARD_LESEBLOCK, sep=';'):
+    """
+    Schätzt Startbestand, monatliche Zugänge und jährliches Wachstum je Plantage
+
+    Mit pruefmonate > 0 bleiben die letzten pruefmonate Monate jeder Plantage
+    bei der Schätzung außen vor und dienen als Prognose-gegen-Ist-Vergleich
+    (Spalten mit Präfix 'Prognose_'). Die Parameterspalten heißen wie die
+    Eingaben der App und des Batchlaufs (startbestand, monatliche_zugaenge,
+    jaehrliches_wachstum) und können direkt übernommen werden. Abweichungen
+    sind Modell minus Beobachtung (positiver Bias = Überschätzung), MAPE
+    bezieht sich auf den beobachteten Bestand – wie in aprikosen_ueberwachung.
+
+    Returns:
+        pd.DataFrame: Eine Zeile je Plantage mit Parametern, Beobachtungszahl
+            und Fehlermaßen (RMSE, MAE, MAPE_Prozent, Bias, R2)
+    """
+    index = _Plantagenindex(quelle, blockgroesse, sep)
+    anzahl_plantagen = len(index)
+    # Letzter Monatsindex, der noch in die Schätzung eingeht
+    schaetzung_bis = index.letzter_index - pruefmonate
+
+    minimum, maximum = wachstum_bereich
+    zentrum = np.full(anzahl_plantagen, (minimum + maximum) / 2)
+    schritt = (maximum - minimum) / (RASTERPUNKTE - 1)
+    versatz = np.arange(RASTERPUNKTE) - RASTERPUNKTE // 2
+    for _ in range(durchlaeufe):
+        raster = np.clip(zentrum[:, None] + schritt * versatz, minimum, maximum)
+        summen = np.zeros((anzahl_plantagen, 5, RASTERPUNKTE))
+        for block in lies_beobachtungen(quelle, blockgroesse, sep):
+            plantage, monate, bestand = index.zerlege(block)
+            auswahl = monate <= schaetzung_bis[plantage]
+            plantage, monate, bestand = plantage[auswahl], monate[auswahl], bestand[auswahl]
+            # Koeffizienten von Z und S: b = (f^k - 1) / (f - 1), a = f^k = 1 + (f - 1) × b
+            faktor = berechne_wachstumsfaktor(raster[plantage])
+            b = berechne_bestand(0.0, 1.0, faktor, monate[:, None])
+            a = 1 + (faktor - 1) * b
+            y = bestand[:, None]
+            beitraege = np.empty((len(bestand), 5, RASTERPUNKTE))
+            np.multiply(a, a, out=beitraege[:, 0])
+            np.multiply(a, b, out=beitraege[:, 1])
+            np.multiply(b, b, out=beitraege[:, 2])
+            np.multiply(a, y, out=beitraege[:, 3])
+            np.multiply(b, y, out=beitraege[:, 4])
+            _summiere_je_plantage(plantage, beitraege, summen)
+        summen = np.moveaxis(summen, 1, 0)
+        start, zugaenge, fehler = _loese_normalgleichungen(summen)
+        beste = np.argmin(np.where(np.isfinite(fehler), fehler, np.inf), axis=1)
+        zentrum = raster[np.arange(anzahl_plantagen), beste]
+        schritt /= (RASTERPUNKTE - 1) / 2
+
+    zeilen = np.arange(anzahl_plantagen)
+    start, zugaenge = start[zeilen, beste], zugaenge[zeilen, beste]
+    wachstum = zentrum
+    faktor = berechne_wachstumsfaktor(wachstum)
+
+    # Fehlermaße auf Schätz- und Prüfzeitraum
+    fehlersummen = np.zeros((2, anzahl_plantagen, 7))
+    for block in lies_beobachtungen(quelle, blockgroesse, sep):
+        plantage, monate, bestand = index.zerlege(block)
+        modell = berechne_bestand(start[plantage], zugaenge[plantage], faktor[plantage], monate)
+        abweichung = modell - bestand
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relativ = np.where(bestand != 0, np.abs(abweichung) / np.abs(bestand), 0.0)
+        werte = np.stack([np.ones_like(bestand), abweichung, np.abs(abweichung), abweichung ** 2, relativ,
+                          bestand, bestand ** 2], axis=-1)
+        pruefung = monate > schaetzung_bis[plantage]
+        for teil, maske in enumerate((~pruefung, pruefung)):
+            _summiere_je_plantage(plantage[maske], werte[maske], fehlersummen[teil])
+
+    ergebnis = pd.DataFrame({'id': index.ids})
+    if index.nach_datum:
+        ergebnis['startdatum'] = pd.PeriodIndex.from_ordinals(index.erster_monat, freq='M').to_timestamp()
+    ergebnis['startbestand'] = np.rint(start)
+    ergebnis['monatliche_zugaenge'] = np.rint(zugaenge)
+    ergebnis['jaehrliches_wachstum'] = wachstum.round(4)
+    ergebnis['Anzahl_Beobachtungen'] = index.anzahl
+    ergebnis['Letzter_Monat'] = index.letzter_index + 1
+    ergebnis = ergebnis.assign(**_metriken(fehlersummen[0].T))
+    if pruefmonate > 0:
+        ergebnis = ergebnis.assign(**_metriken(fehlersummen[1].T, 'Prognose_'))
+    return ergebnis
@@ -0,0 +1,176 @@
+"""
+Altersstrukturiertes Kohortenmodell des Aprikosenbaumbestands.
+
+Der Bestand wird als Vektor n je Altersmonat geführt und monatlich mit einer
+Leslie-Matrix fortgeschrieben:
+
+    n'[0]     = Σ_a F(a) × n[a] + Zugänge       (Vermehrung und Pflanzung)
+    n'[a + 1] = s(a) × n[a]                     (Altern mit Überlebensrate)
+
+Die letzte Altersklasse sammelt alle älteren Bäume. Die Fruchtbarkeit
+F(a) = (f - 1) × Reife(a) überträgt das jährliche Wachstum des aggregierten
+Modells auf die tragfähigen Bäume; s(a) folgt aus der jährlichen Mortalität.
+Mit voller Reife ab Alter 0 und ohne Mortalität ergibt sich exakt
+Bestand × f + Zugänge wie in der Engine.
+
+Die Matrix hat nur eine Zeile und eine Nebendiagonale und wird deshalb nie
+aufgebaut: ein Schritt ist ein Skalarprodukt plus eine verschobene
+Multiplikation, vektorisiert über alle Kohorten und Szenarien gleichzeitig.
+"""
+import numpy as np
+import pandas as pd
+
+from aprikosen_prognose_engine import berechne_wachstumsfaktor, erstelle_kalender
+
+STANDARD_KOHORTEN = 600
+
+
+class KohortenParameter:
+    def __init__(
+        self,
+        startbestand,
+        monatliche_zugaenge,
+        jaehrliches_wachstum_prozent,
+        prognosejahre,
+        startalter_jahre=8.0,
+        reifealter_jahre=3.0,
+        reife_steilheit=2.0,
+        mortalitaet_jung_prozent=5.0,
+        mortalitaet_prozent=1.0,
+        mortalitaet_alt_prozent=10.0,
+        altersgrenze_jahre=25.0,
+        ertrag_kg_pro_jahr=30.0,
+        anzahl_kohorten=STANDARD_KOHORTEN,
+        reife=None,
+        mortalitaet=None,
+        ertrag=None,
+    ):
+        if anzahl_kohorten < 2:
+            raise ValueError("anzahl_kohorten muss mindestens 2 betragen.")
+        if not 0 <= startalter_jahre * 12 < anzahl_kohorten:
+            raise ValueError("startalter_jahre muss innerhalb der Altersklassen liegen.")
+
+        # Grundparameter wie im aggregierten Modell (Skalare oder ein Wert je Szenario)
+        self.startbestand = startbestand
+        self.monatliche_zugaenge = monatliche_zugaenge
+        self.jaehrliches_wachstum_prozent = jaehrliches_wachstum_prozent
+        self.prognosejahre = prognosejahre
+
+        # Altersstruktur
+        self.startalter_jahre = startalter_jahre
+        self.anzahl_kohorten = anzahl_kohorten
+
+        # Standardkurven; reife, mortalitaet (% p. a.) und ertrag (kg p. a.) ersetzen sie
+        # als Werte je Altersmonat, Form (anzahl_kohorten,) oder (Szenarien, anzahl_kohorten)
+        self.reifealter_jahre = reifealter_jahre
+        self.reife_steilheit = reife_steilheit
+        self.mortalitaet_jung_prozent = mortalitaet_jung_prozent
+        self.mortalitaet_prozent = mortalitaet_prozent
+        self.mortalitaet_alt_prozent = mortalitaet_alt_prozent
+        self.altersgrenze_jahre = altersgrenze_jahre
+        self.ertrag_kg_pro_jahr = ertrag_kg_pro_jahr
+        self.reife = reife
+        self.mortalitaet = mortalitaet
+        self.ertrag = ertrag
+
+    @property
+    def monate_gesamt(self):
+        return self.prognosejahre * 12
+
+    @property
+    def alter_jahre(self):
+        return np.arange(self.anzahl_kohorten) / 12
+
+    def reifekurve(self):
+        """Tragfähiger Anteil je Altersmonat (logistisch um das Reifealter)"""
+        if self.reife is not None:
+            return np.asarray(self.reife, dtype=np.float64)
+        return 1 / (1 + np.exp(-self.reife_steilheit * (self.alter_jahre - self.reifealter_jahre)))
+
+    def mortalitaetskurve(self):
+        """Jährliche Mortalität in % je Altersmonat: Jungbäume, Ertragsphase, Altbäume"""
+        if self.mortalitaet is not None:
+            return np.asarray(self.mortalitaet, dtype=np.float64)
+        alter = self.alter_jahre
+        return np.select(
+            [alter < self.reifealter_jahre, alter >= self.altersgrenze_jahre],
+            [self.mortalitaet_jung_prozent, self.mortalitaet_alt_prozent],
+            self.mortalitaet_prozent,
+        )
+
+    def ertragskurve(self):
+        """Jährlicher Ertrag in kg je Baum und Altersmonat"""
+        if self.ertrag is not None:
+            return np.asarray(self.ertrag, dtype=np.float64)
+        return self.ertrag_kg_pro_jahr * self.reifekurve()
+
+
+def simuliere_kohorten(parameter):
+    """
+    Schreibt die Kohortenvektoren aller Szenarien Monat für Monat fort
+
+    Zeile m der Ergebnisse ist wie in der Engine der Stand vor dem m-ten
+    Schritt; Zeile 1 enthält also den Startbestand.
+
+    Returns:
+        dict[str, np.ndarray]: 'Baumbestand', 'Reife_Baeume', 'Abgaenge' und
+            'Ertrag_kg' (Monatsertrag) mit Form (Szenarien, Monate) sowie
+            'Kohorten', den Endzustand mit Form (Szenarien, anzahl_kohorten)
+    """
+    startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent = np.broadcast_arrays(*(
+        np.atleast_1d(np.asarray(wert, dtype=np.float64))
+        for wert in (parameter.startbestand, parameter.monatliche_zugaenge, parameter.jaehrliches_wachstum_prozent)
+    ))
+    anzahl_szenarien = len(startbestand)
+    anzahl_kohorten = parameter.anzahl_kohorten
+    form = (anzahl_szenarien, anzahl_kohorten)
+
+    reife = np.broadcast_to(parameter.reifekurve(), form)
+    ueberleben = np.broadcast_to((1 - parameter.mortalitaetskurve() / 100) ** (1 / 12), form)
+    monatsertrag = np.broadcast_to(parameter.ertragskurve() / 12, form)
+    fruchtbarkeit = (berechne_wachstumsfaktor(jaehrliches_wachstum_prozent) - 1)[:, None] * reife
+
+    kohorten = np.zeros(form)
+    kohorten[:, int(round(parameter.startalter_jahre * 12))] = startbestand
+    naechste = np.empty(form)
+
+    monate = parameter.monate_gesamt
+    ergebnis = {name: np.empty((anzahl_szenarien, monate))
+                for name in ('Baumbestand', 'Reife_Baeume', 'Abgaenge', 'Ertrag_kg')}
+    for monat in range(monate):
+        ergebnis['Baumbestand'][:, monat] = kohorten.sum(axis=1)
+        ergebnis['Reife_Baeume'][:, monat] = np.einsum('ij,ij->i', reife, kohorten)
+        ergebnis['Ertrag_kg'][:, monat] = np.einsum('ij,ij->i', monatsertrag, kohorten)
+        geburten = np.einsum('ij,ij->i', fruchtbarkeit, kohorten)
+
+        # Nebendiagonale der Leslie-Matrix; die letzte Klasse bleibt zusätzlich bestehen
+        np.multiply(ueberleben, kohorten, out=kohorten)
+        ergebnis['Abgaenge'][:, monat] = ergebnis['Baumbestand'][:, monat] - kohorten.sum(axis=1)
+        naechste[:, 1:] = kohorten[:, :-1]
+        naechste[:, -1] += kohorten[:, -1]
+        naechste[:, 0] = geburten + monatliche_zugaenge
+        kohorten, naechste = naechste, kohorten
+
+    ergebnis['Kohorten'] = kohorten
+    return ergebnis
+
+
+def berechne_kohortenprojektion(parameter, startdatum=None):
+    """
+    Monatstabelle des Kohortenmodells für einen einzelnen Parametersatz
+
+    Returns:
+        pd.DataFrame: Spalten 'Monat', (Kalenderspalten,) 'Baumbestand',
+            'Reife_Baeume', 'Junge_Baeume', 'Abgaenge' und 'Ertrag_kg'
+    """
+    ergebnis = simuliere_kohorten(parameter)
+    monate = parameter.monate_gesamt
+    df = pd.DataFrame({'Monat': np.arange(1, monate + 1)})
+    if startdatum is not None:
+        df = pd.concat([df, erstelle_kalender(startdatum, monate)], axis=1)
+    df['Baumbestand'] = ergebnis['Baumbestand'][0]
+    df['Reife_Baeume'] = ergebnis['Reife_Baeume'][0]
+    df['Junge_Baeume'] = df['Baumbestand'] - df['Reife_Baeume']
+    df['Abgaenge'] = ergebnis['Abgaenge'][0]
+    df['Ertrag_kg'] = ergebnis['Ertrag_kg'][0]
+    return df
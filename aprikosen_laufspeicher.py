@@ -0,0 +1,286 @@
+"""
+Lokaler Speicher für Prognoseläufe.
+
+Jeder Lauf wird über einen stabilen Hash seiner Parameter (Startdatum,
+Startbestand, Zugänge, Wachstum) und der Modellversion identifiziert; der
+Prognosezeitraum gehört bewusst nicht zum Schlüssel. Die Monatswerte liegen
+als Parquet-Teildateien in einem Verzeichnis je Lauf, die Parameter und der
+ungerundete Endzustand in einem SQLite-Index.
+
+Ein erneuter Lauf mit gleichen Parametern wird aus dem Speicher bedient. Ist
+der angefragte Zeitraum länger als der gespeicherte, werden nur die fehlenden
+Monate ab dem gespeicherten Endzustand berechnet und als weitere Teildatei
+angehängt:
+
+    Bestand_{k0 + j} = Endzustand × f^j + Zugänge × (f^j - 1) / (f - 1)
+
+Alle Teildateien haben dasselbe Schema (TEILSCHEMA, Bestände als float64),
+damit ein über 2^63 hinaus fortgesetzter Lauf lesbar bleibt; erst beim Lesen
+werden die Bestände wie in der Engine mit runde_bestand zu int64, solange alle
+Werte darstellbar sind.
+
+Eine Instanz kann wie der Ergebniscache von mehreren Threads (Sitzungen des
+Streamlit-Servers) gemeinsam genutzt werden. Mit max_bytes und max_alter_tage
+ist der Speicher begrenzt: Nach jedem Schreiben werden Läufe entfernt, die
+länger als max_alter_tage nicht genutzt wurden, und danach die am längsten
+ungenutzten, bis die Parquet-Dateien zusammen höchstens max_bytes belegen.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from aprikosen_export import lies_parquet, schreibe_parquet
+from aprikosen_prognose_engine import (
+    MODELLVERSION,
+    _kalender_fuer_monate,
+    berechne_bestand,
+    berechne_wachstumsfaktor,
+    runde_bestand,
+)
+
+STANDARD_LAUFSPEICHER = 'laufspeicher'
+TEILSCHEMA = pa.schema([
+    ('Monat', pa.int64()),
+    ('Datum', pa.timestamp('us')),
+    ('Baumbestand', pa.float64()),
+    ('Monatlicher_Zuwachs', pa.float64()),
+])
+_BESTANDSSPALTEN = ('Baumbestand', 'Monatlicher_Zuwachs')
+ABFRAGE_SPALTEN = ('startdatum', 'startbestand', 'monatliche_zugaenge', 'jaehrliches_wachstum', 'prognosejahre',
+                   'modellversion', 'endbestand', 'erstellt', 'aktualisiert', 'genutzt', 'bytes')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS laeufe (
+    schluessel TEXT PRIMARY KEY,
+    startdatum TEXT NOT NULL,
+    startbestand REAL NOT NULL,
+    monatliche_zugaenge REAL NOT NULL,
+    jaehrliches_wachstum REAL NOT NULL,
+    prognosejahre INTEGER NOT NULL,
+    modellversion INTEGER NOT NULL,
+    endzustand REAL NOT NULL,
+    endbestand REAL NOT NULL,
+    erstellt TEXT NOT NULL,
+    aktualisiert TEXT NOT NULL,
+    genutzt TEXT NOT NULL,
+    bytes INTEGER NOT NULL
+)
+"""
+
+# Spalten, die Indizes älterer Versionen beim Öffnen ergänzt werden
+_NACHGERUESTETE_SPALTEN = {
+    'genutzt': "TEXT NOT NULL DEFAULT ''",
+    'bytes': "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+def berechne_parameterhash(startdatum, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent,
+                           modellversion=MODELLVERSION):
+    """Stabiler SHA-256-Hash der Laufparameter ohne Prognosezeitraum"""
+    parameter = {
+        'startdatum': pd.Timestamp(startdatum).isoformat(),
+        'startbestand': float(startbestand),
+        'monatliche_zugaenge': float(monatliche_zugaenge),
+        'jaehrliches_wachstum_prozent': float(jaehrliches_wachstum_prozent),
+        'modellversion': int(modellversion),
+    }
+    return hashlib.sha256(json.dumps(parameter, sort_keys=True).encode()).hexdigest()
+
+
+def _berechne_monate(startdatum, startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, von, bis):
+    # Monatszeilen von bis bis (einschließlich) ab dem Bestand startbestand in Zeile von - 1 (bzw. 0 für von = 1)
+    schritte = np.arange(bis - von + 1) + (0 if von == 1 else 1)
+    bestand = berechne_bestand(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, schritte)
+    return pd.DataFrame({
+        'Monat': np.arange(von, bis + 1, dtype=np.int64),
+        # Nur den Kalender der neuen Monate aufbauen, nicht den gesamten Zeitraum ab Monat 1
+        'Datum': _kalender_fuer_monate(startdatum, np.arange(von - 1, bis))['Datum'].to_numpy(),
+        'Baumbestand': np.rint(bestand),
+        'Monatlicher_Zuwachs': np.rint(bestand * (monatlicher_wachstumsfaktor - 1) + monatliche_zugaenge),
+    }), bestand[-1]
+
+
+def _runde_bestaende(df):
+    # Gespeichert wird float64; zurück kommen die Dtypes der Engine (int64, solange darstellbar)
+    return df.assign(**{spalte: runde_bestand(df[spalte].to_numpy()) for spalte in _BESTANDSSPALTEN})
+
+
+class Laufspeicher:
+    def __init__(self, verzeichnis=STANDARD_LAUFSPEICHER, max_bytes=None, max_alter_tage=None):
+        self.verzeichnis = verzeichnis
+        self.max_bytes = max_bytes
+        self.max_alter_tage = max_alter_tage
+        os.makedirs(verzeichnis, exist_ok=True)
+        self._verbindung = sqlite3.connect(os.path.join(verzeichnis, 'index.sqlite'), check_same_thread=False)
+        self._sperre = threading.Lock()
+        self._verbindung.execute(_SCHEMA)
+        vorhanden = {zeile[1] for zeile in self._verbindung.execute("PRAGMA table_info(laeufe)")}
+        for spalte, definition in _NACHGERUESTETE_SPALTEN.items():
+            if spalte not in vorhanden:
+                self._verbindung.execute(f"ALTER TABLE laeufe ADD COLUMN {spalte} {definition}")
+        self._verbindung.commit()
+
+    def schliessen(self):
+        self._verbindung.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.schliessen()
+
+    def _laufverzeichnis(self, schluessel):
+        return os.path.join(self.verzeichnis, schluessel)
+
+    def lade(self, schluessel, prognosejahre=None):
+        """
+        Liest die gespeicherten Monatswerte eines Laufs, optional nur die ersten prognosejahre Jahre
+
+        Returns:
+            pd.DataFrame: Spalten 'Monat', 'Datum', 'Baumbestand' und 'Monatlicher_Zuwachs'
+        """
+        filter = None if prognosejahre is None else [('Monat', '<=', prognosejahre * 12)]
+        df = lies_parquet(self._laufverzeichnis(schluessel), filter=filter, schema=TEILSCHEMA).to_pandas()
+        return _runde_bestaende(df.sort_values('Monat', ignore_index=True))
+
+    def hole_oder_berechne(self, startdatum, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent,
+                           prognosejahre):
+        """
+        Liefert die Monatswerte eines Laufs aus dem Speicher, setzt ihn fort oder berechnet ihn neu
+
+        Returns:
+            tuple[pd.DataFrame, str]: Monatswerte für 12 × prognosejahre Monate und
+                die Herkunft 'Speicher', 'Fortgesetzt' oder 'Neu'
+        """
+        schluessel = berechne_parameterhash(startdatum, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent)
+        with self._sperre:
+            return self._hole_oder_berechne(
+                schluessel, startdatum, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre
+            )
+
+    def _hole_oder_berechne(self, schluessel, startdatum, startbestand, monatliche_zugaenge,
+                            jaehrliches_wachstum_prozent, prognosejahre):
+        eintrag = self._verbindung.execute(
+            "SELECT prognosejahre, endzustand FROM laeufe WHERE schluessel = ?", (schluessel,)
+        ).fetchone()
+        # Mikrosekunden, damit die Nutzungsreihenfolge für die Verdrängung eindeutig ist
+        jetzt = pd.Timestamp.now().isoformat(timespec='microseconds')
+        if eintrag is not None and eintrag[0] >= prognosejahre:
+            with self._verbindung:
+                self._verbindung.execute("UPDATE laeufe SET genutzt = ? WHERE schluessel = ?", (jetzt, schluessel))
+            return self.lade(schluessel, prognosejahre), 'Speicher'
+
+        faktor = berechne_wachstumsfaktor(jaehrliches_wachstum_prozent)
+        parameter = {
+            'startdatum': pd.Timestamp(startdatum).isoformat(),
+            'startbestand': startbestand,
+            'monatliche_zugaenge': monatliche_zugaenge,
+            'jaehrliches_wachstum_prozent': jaehrliches_wachstum_prozent,
+            'modellversion': MODELLVERSION,
+        }
+        if eintrag is None:
+            von, zustand, herkunft = 1, startbestand, 'Neu'
+        else:
+            von, zustand, herkunft = eintrag[0] * 12 + 1, eintrag[1], 'Fortgesetzt'
+        neu, endzustand = _berechne_monate(
+            startdatum, zustand, monatliche_zugaenge, faktor, von, prognosejahre * 12
+        )
+
+        os.makedirs(self._laufverzeichnis(schluessel), exist_ok=True)
+        teildatei = os.path.join(self._laufverzeichnis(schluessel), f"monate_{von:06d}-{prognosejahre * 12:06d}.parquet")
+        schreibe_parquet(neu, teildatei, parameter)
+        with self._verbindung:
+            self._verbindung.execute(
+                """
+                INSERT INTO laeufe (schluessel, startdatum, startbestand, monatliche_zugaenge, jaehrliches_wachstum,
+                                    prognosejahre, modellversion, endzustand, endbestand, erstellt, aktualisiert,
+                                    genutzt, bytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(schluessel) DO UPDATE SET
+                    prognosejahre = excluded.prognosejahre,
+                    endzustand = excluded.endzustand,
+                    endbestand = excluded.endbestand,
+                    aktualisiert = excluded.aktualisiert,
+                    genutzt = excluded.genutzt,
+                    bytes = bytes + excluded.bytes
+                """,
+                (
+                    schluessel, parameter['startdatum'], float(startbestand), float(monatliche_zugaenge),
+                    float(jaehrliches_wachstum_prozent), prognosejahre, MODELLVERSION, float(endzustand),
+                    float(neu['Baumbestand'].iloc[-1]), jetzt, jetzt, jetzt, os.path.getsize(teildatei),
+                ),
+            )
+        neu = self.lade(schluessel) if herkunft == 'Fortgesetzt' else _runde_bestaende(neu)
+        self._bereinige(self.max_bytes, self.max_alter_tage)
+        return neu, herkunft
+
+    def bereinige(self, max_bytes=None, max_alter_tage=None):
+        """
+        Entfernt lange ungenutzte Läufe und danach die am längsten ungenutzten, bis max_bytes eingehalten ist
+
+        Returns:
+            int: Anzahl der entfernten Läufe
+        """
+        with self._sperre:
+            return self._bereinige(max_bytes, max_alter_tage)
+
+    def _bereinige(self, max_bytes, max_alter_tage):
+        if max_bytes is None and max_alter_tage is None:
+            return 0
+        laeufe = self._verbindung.execute(
+            "SELECT schluessel, genutzt, bytes FROM laeufe ORDER BY genutzt DESC, rowid DESC"
+        ).fetchall()
+        grenze = '' if max_alter_tage is None else (
+            pd.Timestamp.now() - pd.Timedelta(days=max_alter_tage)
+        ).isoformat(timespec='microseconds')
+        entfernen = []
+        belegt = 0
+        for schluessel, genutzt, groesse in laeufe:
+            if genutzt < grenze or (max_bytes is not None and belegt + groesse > max_bytes):
+                entfernen.append(schluessel)
+            else:
+                belegt += groesse
+        with self._verbindung:
+            self._verbindung.executemany(
+                "DELETE FROM laeufe WHERE schluessel = ?", [(schluessel,) for schluessel in entfernen]
+            )
+        for schluessel in entfernen:
+            shutil.rmtree(self._laufverzeichnis(schluessel), ignore_errors=True)
+        return len(entfernen)
+
+    def abfrage(self, nur_aktuelle_version=True, **bereiche):
+        """
+        Sucht gespeicherte Läufe nach Parameterbereichen
+
+        Jeder Bereich ist ein Paar (minimum, maximum), None lässt eine Seite
+        offen, z. B. abfrage(jaehrliches_wachstum=(5, 8), startbestand=(None, 10_000)).
+
+        Returns:
+            pd.DataFrame: Eine Zeile je Lauf mit Schlüssel, Parametern und Endbestand
+        """
+        bedingungen = []
+        werte = []
+        if nur_aktuelle_version:
+            bedingungen.append("modellversion = ?")
+            werte.append(MODELLVERSION)
+        for spalte, (minimum, maximum) in bereiche.items():
+            if spalte not in ABFRAGE_SPALTEN:
+                raise ValueError(f"Unbekannte Abfragespalte: {spalte}")
+            if minimum is not None:
+                bedingungen.append(f"{spalte} >= ?")
+                werte.append(minimum.isoformat() if isinstance(minimum, pd.Timestamp) else minimum)
+            if maximum is not None:
+                bedingungen.append(f"{spalte} <= ?")
+                werte.append(maximum.isoformat() if isinstance(maximum, pd.Timestamp) else maximum)
+        sql = "SELECT schluessel, " + ", ".join(ABFRAGE_SPALTEN) + " FROM laeufe"
+        if bedingungen:
+            sql += " WHERE " + " AND ".join(bedingungen)
+        with self._sperre:
+            return pd.read_sql_query(sql + " ORDER BY erstellt", self._verbindung, params=werte)
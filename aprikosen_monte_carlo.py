@@ -0,0 +1,227 @@
+"""
+Stochastische Prognose des Aprikosenbaumbestands (Monte-Carlo-Simulation).
+
+Statt eines festen jährlichen Wachstums und fixer monatlicher Zugänge werden
+für jeden Pfad und Monat Wachstumsrate und Zugänge aus (optional korrelierten)
+Normalverteilungen gezogen. Zusätzlich können Schadensereignisse wie Frost oder
+Hagel einen zufälligen Anteil des Bestands vernichten:
+
+    Neuer Bestand = Bestand × Wachstumsfaktor × (1 - Schadensanteil) + Zugänge
+
+Die Pfade werden blockweise simuliert; jeder Block erhält einen eigenen, aus
+dem Seed abgeleiteten Zufallsstrom. Bei gleichem Seed und gleicher Blockgröße
+sind die Ergebnisse damit exakt reproduzierbar – unabhängig davon, ob die
+Blöcke seriell oder auf mehrere Prozesse verteilt berechnet werden. Bei der
+Quantilskizze verdichtet jeder Worker seine Blöcke in eine eigene Statistik;
+die Klassenzählungen werden exakt zusammengeführt, die Perzentile sind also
+ebenfalls unabhängig von der Worker-Anzahl.
+"""
+import numpy as np
+import pandas as pd
+
+from aprikosen_parallel import anzahl_worker, erstelle_ergebnisspeicher, fuehre_aufgaben_aus, sammle_ergebnisse
+from aprikosen_statistik import STANDARD_RELATIVE_GENAUIGKEIT, LaufendeMonatsstatistik
+
+STANDARD_BLOCKGROESSE = 2_000
+STANDARD_PERZENTILE = (5, 50, 95)
+MAX_EXAKT_SPEICHER_BYTES = 64 * 1024 ** 2
+
+
+class MonteCarloParameter:
+    def __init__(
+        self,
+        startbestand,
+        monatliche_zugaenge,
+        jaehrliches_wachstum_prozent,
+        prognosejahre,
+        wachstum_streuung_prozent=0.0,
+        zugaenge_streuung=0.0,
+        korrelation=0.0,
+        schaden_wahrscheinlichkeit=0.0,
+        schaden_anteil_min=0.0,
+        schaden_anteil_max=0.0,
+    ):
+        if not -1.0 <= korrelation <= 1.0:
+            raise ValueError("korrelation muss zwischen -1 und 1 liegen.")
+        if not 0.0 <= schaden_wahrscheinlichkeit <= 1.0:
+            raise ValueError("schaden_wahrscheinlichkeit muss zwischen 0 und 1 liegen.")
+        if not 0.0 <= schaden_anteil_min <= schaden_anteil_max <= 1.0:
+            raise ValueError("Es muss 0 <= schaden_anteil_min <= schaden_anteil_max <= 1 gelten.")
+
+        # Erwartungswerte wie im deterministischen Modell
+        self.startbestand = startbestand
+        self.monatliche_zugaenge = monatliche_zugaenge
+        self.jaehrliches_wachstum_prozent = jaehrliches_wachstum_prozent
+        self.prognosejahre = prognosejahre
+
+        # Unsicherheit (Standardabweichungen je Monat)
+        self.wachstum_streuung_prozent = wachstum_streuung_prozent
+        self.zugaenge_streuung = zugaenge_streuung
+        self.korrelation = korrelation
+
+        # Schadensereignisse (Wahrscheinlichkeit je Monat, vernichteter Anteil)
+        self.schaden_wahrscheinlichkeit = schaden_wahrscheinlichkeit
+        self.schaden_anteil_min = schaden_anteil_min
+        self.schaden_anteil_max = schaden_anteil_max
+
+    @property
+    def monate_gesamt(self):
+        return self.prognosejahre * 12
+
+
+def _blockgroessen(anzahl_pfade, block_groesse):
+    anzahl_bloecke = -(-anzahl_pfade // block_groesse)
+    groessen = np.full(anzahl_bloecke, block_groesse)
+    if anzahl_bloecke:
+        groessen[-1] = anzahl_pfade - block_groesse * (anzahl_bloecke - 1)
+    return groessen
+
+
+def simuliere_block(parameter, anzahl_pfade, rng):
+    """
+    Simuliert einen Block von Bestandspfaden mit dem übergebenen Zufallsgenerator
+
+    Returns:
+        np.ndarray: Bestand zu Beginn jedes Monats, Form (Monate, Pfade)
+    """
+    form = (parameter.monate_gesamt, anzahl_pfade)
+
+    # Korrelierte Standardnormalverteilungen für Wachstum und Zugänge
+    z_wachstum = rng.standard_normal(form)
+    z_zugaenge = (
+        parameter.korrelation * z_wachstum
+        + np.sqrt(1.0 - parameter.korrelation ** 2) * rng.standard_normal(form)
+    )
+
+    # Monatlicher Wachstumsfaktor je Pfad und Monat (Wachstum nicht unter -100 %)
+    wachstum_prozent = parameter.jaehrliches_wachstum_prozent + parameter.wachstum_streuung_prozent * z_wachstum
+    faktor = np.exp(np.log1p(np.maximum(wachstum_prozent, -100.0) / 100) / 12)
+    zugaenge = np.maximum(parameter.monatliche_zugaenge + parameter.zugaenge_streuung * z_zugaenge, 0.0)
+
+    if parameter.schaden_wahrscheinlichkeit > 0 and parameter.schaden_anteil_max > 0:
+        betroffen = rng.random(form) < parameter.schaden_wahrscheinlichkeit
+        anteil = rng.uniform(parameter.schaden_anteil_min, parameter.schaden_anteil_max, np.count_nonzero(betroffen))
+        faktor[betroffen] *= 1.0 - anteil
+
+    # Rekursion über die Monate, vektorisiert über alle Pfade des Blocks
+    bestand = np.empty(form)
+    aktuell = np.full(anzahl_pfade, float(parameter.startbestand))
+    for monat in range(parameter.monate_gesamt):
+        bestand[monat] = aktuell
+        aktuell = aktuell * faktor[monat] + zugaenge[monat]
+
+    return bestand
+
+
+def _blockaufgaben(parameter, anzahl_pfade, seed, block_groesse):
+    groessen = _blockgroessen(anzahl_pfade, block_groesse)
+    starts = np.cumsum(groessen) - groessen
+    seeds = np.random.SeedSequence(seed).spawn(len(groessen))
+    return [
+        (parameter, int(start), int(groesse), block_seed)
+        for start, groesse, block_seed in zip(starts, groessen, seeds)
+    ]
+
+
+def _simuliere_in_spalten(ziel, parameter, start, anzahl_pfade, block_seed):
+    ziel[:, start:start + anzahl_pfade] = simuliere_block(parameter, anzahl_pfade, np.random.default_rng(block_seed))
+
+
+def simuliere_pfadbloecke(parameter, anzahl_pfade, seed=None, block_groesse=STANDARD_BLOCKGROESSE):
+    """
+    Erzeugt die simulierten Pfade blockweise, sodass nie mehr als ein Block im Speicher liegt
+
+    Yields:
+        np.ndarray: Bestand je Block, Form (Monate, Pfade im Block)
+    """
+    for parameter, _, groesse, block_seed in _blockaufgaben(parameter, anzahl_pfade, seed, block_groesse):
+        yield simuliere_block(parameter, groesse, np.random.default_rng(block_seed))
+
+
+def _verdichte_bloecke(monate_gesamt, relative_genauigkeit, aufgaben):
+    # Läuft je Worker: eigene Statistik über eine zusammenhängende Folge von Pfadblöcken
+    statistik = LaufendeMonatsstatistik(monate_gesamt, relative_genauigkeit)
+    for parameter, _, groesse, block_seed in aufgaben:
+        statistik.aktualisiere(simuliere_block(parameter, groesse, np.random.default_rng(block_seed)))
+    return statistik
+
+
+def berechne_monatsstatistik(parameter, anzahl_pfade, seed=None, block_groesse=STANDARD_BLOCKGROESSE,
+                             relative_genauigkeit=STANDARD_RELATIVE_GENAUIGKEIT, rohdaten_pfad=None, max_worker=1):
+    """
+    Simuliert die Pfade blockweise und verdichtet sie laufend zu Monatsstatistiken
+
+    Der Speicherbedarf hängt nur von der Monatszahl ab, nicht von anzahl_pfade.
+    Mit rohdaten_pfad werden die Rohpfade zusätzlich als float32 in eine Datei
+    ausgelagert (siehe aprikosen_statistik.lade_rohdaten); das ist nur seriell
+    möglich. Mit max_worker > 1 (None = alle Kerne) verdichtet jeder Worker
+    einen Teil der Blöcke, die Teilstatistiken werden mit zusammenfuehren vereint.
+
+    Returns:
+        LaufendeMonatsstatistik: Mittelwert, Streuung, Extremwerte und Quantile je Monat
+    """
+    aufgaben = _blockaufgaben(parameter, anzahl_pfade, seed, block_groesse)
+    worker = min(anzahl_worker(max_worker), len(aufgaben))
+    if worker > 1 and rohdaten_pfad is not None:
+        raise ValueError("Rohdaten können nur seriell (max_worker=1) ausgelagert werden.")
+    if worker <= 1:
+        statistik = LaufendeMonatsstatistik(parameter.monate_gesamt, relative_genauigkeit, rohdaten_pfad)
+        for block in simuliere_pfadbloecke(parameter, anzahl_pfade, seed=seed, block_groesse=block_groesse):
+            statistik.aktualisiere(block)
+        return statistik
+
+    gruppen = [list(gruppe) for gruppe in np.array_split(np.arange(len(aufgaben)), worker)]
+    teile = sammle_ergebnisse(
+        _verdichte_bloecke,
+        [(parameter.monate_gesamt, relative_genauigkeit, [aufgaben[i] for i in gruppe]) for gruppe in gruppen],
+        worker,
+    )
+    statistik = teile[0]
+    for teil in teile[1:]:
+        statistik.zusammenfuehren(teil)
+    return statistik
+
+
+def berechne_perzentilbaender(parameter, anzahl_pfade, perzentile=STANDARD_PERZENTILE, seed=None,
+                              block_groesse=STANDARD_BLOCKGROESSE, max_worker=1,
+                              relative_genauigkeit=STANDARD_RELATIVE_GENAUIGKEIT,
+                              max_speicher_bytes=MAX_EXAKT_SPEICHER_BYTES):
+    """
+    Berechnet Perzentilbänder des Baumbestands für jeden Monat
+
+    Standardmäßig werden die Pfade blockweise laufend in einer Quantilskizze
+    mit relativem Fehler <= relative_genauigkeit verdichtet; der Speicherbedarf
+    hängt dann nicht von anzahl_pfade ab. Mit relative_genauigkeit=None werden
+    die Perzentile exakt berechnet; dafür werden die Bestände als float32
+    gesammelt (Monate × Pfade × 4 Byte), was nur bis max_speicher_bytes
+    zugelassen ist. Mit max_worker > 1 (None = alle Kerne) werden die Blöcke
+    auf einen Prozesspool verteilt: mit Skizze verdichtet jeder Worker seine
+    Blöcke selbst, im exakten Modus schreiben sie direkt in geteilten Speicher.
+
+    Returns:
+        pd.DataFrame: Spalte 'Monat' sowie eine Spalte 'P<q>' je Perzentil
+    """
+    if relative_genauigkeit is not None:
+        statistik = berechne_monatsstatistik(
+            parameter, anzahl_pfade, seed=seed, block_groesse=block_groesse,
+            relative_genauigkeit=relative_genauigkeit, max_worker=max_worker
+        )
+        return statistik.zusammenfassung(perzentile)[['Monat'] + [f'P{perzentil:g}' for perzentil in perzentile]]
+
+    form = (parameter.monate_gesamt, anzahl_pfade)
+    speicherbedarf = form[0] * form[1] * np.dtype(np.float32).itemsize
+    if speicherbedarf > max_speicher_bytes:
+        raise ValueError(
+            f"Exakte Perzentile benötigen {speicherbedarf / 1024 ** 2:,.0f} MiB (Grenze "
+            f"{max_speicher_bytes / 1024 ** 2:,.0f} MiB); bitte relative_genauigkeit angeben "
+            "oder weniger Pfade simulieren."
+        )
+    with erstelle_ergebnisspeicher(form, np.float32, max_worker) as speicher:
+        aufgaben = _blockaufgaben(parameter, anzahl_pfade, seed, block_groesse)
+        fuehre_aufgaben_aus(_simuliere_in_spalten, aufgaben, speicher, max_worker)
+        werte = np.percentile(speicher.array, perzentile, axis=1)
+
+    baender = pd.DataFrame({'Monat': np.arange(1, parameter.monate_gesamt + 1)})
+    for perzentil, reihe in zip(perzentile, werte):
+        baender[f'P{perzentil:g}'] = reihe
+    return baender
@@ -0,0 +1,126 @@
+"""
+Ausführungs-Backend für große Szenario- und Monte-Carlo-Läufe.
+
+Eine Berechnung wird in unabhängige Aufgaben (z. B. Szenario- oder Pfadblöcke)
+zerlegt, die ihr Teilergebnis direkt in einen gemeinsamen Ergebnisspeicher
+schreiben. Bei mehreren Workern liegt dieser Speicher im Shared Memory, sodass
+zwischen den Prozessen nur die kleinen Aufgabenbeschreibungen und keine Arrays
+oder DataFrames gepickelt werden.
+
+Der serielle Pfad führt exakt dieselben Aufgaben nacheinander im eigenen
+Prozess aus und liefert damit bitidentische Ergebnisse.
+
+Aufgaben mit kleinem, festem Ergebnis (z. B. einer Quantilskizze je Worker)
+laufen über sammle_ergebnisse; hier wird nur das Ergebnis zurückgepickelt.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+
+def anzahl_worker(max_worker=None):
+    """Ermittelt die tatsächliche Worker-Anzahl; None bedeutet alle verfügbaren Kerne"""
+    if max_worker is None:
+        return os.cpu_count() or 1
+    return max(1, int(max_worker))
+
+
+class Ergebnisspeicher:
+    """
+    Ergebnis-Array, das bei paralleler Ausführung im Shared Memory liegt
+
+    Als Kontextmanager verwenden; nach dem Verlassen ist das Array ungültig,
+    benötigte Ergebnisse müssen vorher kopiert oder aggregiert werden.
+    """
+
+    def __init__(self, form, dtype=np.float64, geteilt=False):
+        self.form = tuple(form)
+        self.dtype = np.dtype(dtype)
+        self._shm = None
+        if geteilt:
+            groesse = max(1, int(np.prod(self.form)) * self.dtype.itemsize)
+            self._shm = SharedMemory(create=True, size=groesse)
+            self.array = np.ndarray(self.form, dtype=self.dtype, buffer=self._shm.buf)
+        else:
+            self.array = np.empty(self.form, dtype=self.dtype)
+
+    @property
+    def name(self):
+        return self._shm.name if self._shm is not None else None
+
+    def als_array(self):
+        """Liefert das Ergebnis als gewöhnliches Array, das den Kontext überdauert"""
+        return self.array if self._shm is None else self.array.copy()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.array = None
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                # Ein Aufrufer hält noch eine Sicht auf den Speicher; das Mapping
+                # wird dann beim Freigeben dieser Sicht geschlossen.
+                pass
+            self._shm.unlink()
+            self._shm = None
+
+
+def _fuehre_aufgabe_aus(funktion, name, form, dtype, aufgabe):
+    shm = SharedMemory(name=name)
+    try:
+        ziel = np.ndarray(form, dtype=dtype, buffer=shm.buf)
+        funktion(ziel, *aufgabe)
+        del ziel
+    finally:
+        shm.close()
+
+
+def fuehre_aufgaben_aus(funktion, aufgaben, speicher, max_worker=None):
+    """
+    Führt funktion(ziel_array, *aufgabe) für jede Aufgabe aus
+
+    funktion muss auf Modulebene definiert sein, damit sie an Worker-Prozesse
+    übergeben werden kann, und darf nur in ihren eigenen Bereich von ziel_array
+    schreiben. Ohne geteilten Speicher oder mit nur einem Worker wird seriell
+    im eigenen Prozess gerechnet.
+    """
+    aufgaben = list(aufgaben)
+    worker = min(anzahl_worker(max_worker), len(aufgaben))
+    if speicher.name is None or worker <= 1:
+        for aufgabe in aufgaben:
+            funktion(speicher.array, *aufgabe)
+        return
+
+    ausfuehren = partial(_fuehre_aufgabe_aus, funktion, speicher.name, speicher.form, speicher.dtype)
+    with ProcessPoolExecutor(max_workers=worker) as executor:
+        # list(...) reicht Ausnahmen aus den Workern an den Aufrufer weiter
+        list(executor.map(ausfuehren, aufgaben))
+
+
+def sammle_ergebnisse(funktion, aufgaben, max_worker=None):
+    """
+    Führt funktion(*aufgabe) für jede Aufgabe aus und liefert die Ergebnisse in Aufgabenreihenfolge
+
+    Wie bei fuehre_aufgaben_aus muss funktion auf Modulebene definiert sein;
+    mit nur einem Worker wird seriell im eigenen Prozess gerechnet.
+
+    Returns:
+        list: Ein Ergebnis je Aufgabe
+    """
+    aufgaben = list(aufgaben)
+    worker = min(anzahl_worker(max_worker), len(aufgaben))
+    if worker <= 1:
+        return [funktion(*aufgabe) for aufgabe in aufgaben]
+    with ProcessPoolExecutor(max_workers=worker) as executor:
+        return list(executor.map(funktion, *zip(*aufgaben)))
+
+
+def erstelle_ergebnisspeicher(form, dtype=np.float64, max_worker=None):
+    """Legt den Ergebnisspeicher nur bei mehr als einem Worker im Shared Memory an"""
+    return Ergebnisspeicher(form, dtype=dtype, geteilt=anzahl_worker(max_worker) > 1)
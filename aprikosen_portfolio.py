@@ -0,0 +1,175 @@
+"""
+Portfolio vieler Plantagen mit hierarchischer Verdichtung.
+
+Alle Plantagen liegen spaltenweise in NumPy-Arrays (Startmonat, Startbestand,
+Zugänge, Wachstum sowie Hierarchiespalten wie Region und Eigentümer). Die
+Projektion erfolgt auf einem gemeinsamen Monatskalender: Für Plantage i mit
+Startmonat s_i ist der Bestand im Kalendermonat c der Engine-Bestand nach
+c - s_i Monaten und vor dem Start 0. Die Stichtage innerhalb des Monats
+spielen für die Ausrichtung keine Rolle.
+
+Die Plantagen werden nach der feinsten Hierarchieebene sortiert und in Blöcken
+berechnet; jeder Block verdichtet seine Zeilen sofort mit np.add.reduceat zu
+Gruppensummen. Die vollständige (Plantage × Monat)-Matrix entsteht deshalb nie,
+und gröbere Ebenen ergeben sich aus den Summen der feinsten.
+"""
+import numpy as np
+import pandas as pd
+
+from aprikosen_parallel import erstelle_ergebnisspeicher, fuehre_aufgaben_aus
+from aprikosen_prognose_engine import (
+    SZENARIO_BLOCKGROESSE,
+    berechne_bestand,
+    berechne_wachstumsfaktor,
+    runde_bestand,
+)
+
+STANDARD_PORTFOLIO_MONATE = 600
+
+
+def _berechne_portfolioblock(ziel, zeile, startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor,
+                             startmonat, kalenderstart, grenzen):
+    monate = kalenderstart + np.arange(ziel.shape[1]) - startmonat[:, None]
+    bestand = np.rint(berechne_bestand(
+        startbestand[:, None], monatliche_zugaenge[:, None], monatlicher_wachstumsfaktor[:, None], np.maximum(monate, 0)
+    ))
+    bestand[monate < 0] = 0.0
+    ziel[zeile:zeile + len(grenzen)] = np.add.reduceat(bestand, grenzen, axis=0)
+
+
+class Portfolio:
+    def __init__(self, startdatum, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, ids=None,
+                 hierarchie=None):
+        self.startmonat = pd.DatetimeIndex(np.atleast_1d(startdatum)).to_period('M').asi8
+        self.startbestand, self.monatliche_zugaenge, self.jaehrliches_wachstum_prozent = np.broadcast_arrays(*(
+            np.asarray(wert, dtype=np.float64) * np.ones(len(self.startmonat))
+            for wert in (startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent)
+        ))
+        self.ids = np.arange(len(self)) if ids is None else np.asarray(ids)
+        # Hierarchiespalten von grob nach fein, z. B. {'Region': ..., 'Eigentuemer': ...}
+        self.hierarchie = {name: pd.Categorical(werte) for name, werte in (hierarchie or {}).items()}
+        for name, werte in self.hierarchie.items():
+            if len(werte) != len(self):
+                raise ValueError(f"Hierarchiespalte {name} hat {len(werte)} statt {len(self)} Einträge.")
+
+    @classmethod
+    def aus_tabelle(cls, df, hierarchie=()):
+        """
+        Erstellt ein Portfolio aus einer Tabelle mit den Spalten startdatum,
+        startbestand, monatliche_zugaenge, jaehrliches_wachstum, optional id
+        und den Hierarchiespalten (von grob nach fein)
+        """
+        return cls(
+            pd.to_datetime(df['startdatum']),
+            df['startbestand'].to_numpy(),
+            df['monatliche_zugaenge'].to_numpy(),
+            df['jaehrliches_wachstum'].to_numpy(),
+            ids=df['id'].to_numpy() if 'id' in df else None,
+            hierarchie={name: df[name].to_numpy() for name in hierarchie},
+        )
+
+    def __len__(self):
+        return len(self.startmonat)
+
+    def _blattgruppen(self):
+        # Gruppennummer der feinsten Ebene je Plantage und die zugehörigen Hierarchiewerte
+        if not self.hierarchie:
+            return np.zeros(len(self), dtype=np.int64), pd.DataFrame(index=pd.RangeIndex(1))
+        tabelle = pd.DataFrame(self.hierarchie)
+        codes = tabelle.groupby(list(self.hierarchie), observed=True, sort=True).ngroup().to_numpy()
+        blaetter = tabelle.groupby(list(self.hierarchie), observed=True, sort=True).size().index.to_frame(index=False)
+        return codes, blaetter
+
+    def projiziere(self, monate=STANDARD_PORTFOLIO_MONATE, kalenderstart=None, max_worker=1,
+                   block_groesse=SZENARIO_BLOCKGROESSE):
+        """
+        Projiziert alle Plantagen auf einen gemeinsamen Monatskalender und summiert je Blattgruppe
+
+        Der Kalender beginnt standardmäßig mit dem frühesten Startmonat. Die
+        Bestände jeder Plantage werden wie in der Einzelprognose auf ganze
+        Bäume gerundet, bevor sie summiert werden.
+
+        Returns:
+            PortfolioErgebnis: Gruppensummen der feinsten Hierarchieebene
+        """
+        if kalenderstart is None:
+            kalenderstart = int(self.startmonat.min())
+        else:
+            kalenderstart = pd.Period(kalenderstart, freq='M').ordinal
+
+        codes, blaetter = self._blattgruppen()
+        reihenfolge = np.argsort(codes, kind='stable')
+        codes = codes[reihenfolge]
+        faktor = berechne_wachstumsfaktor(self.jaehrliches_wachstum_prozent)
+
+        # Je Block eine Ergebniszeile pro enthaltener Blattgruppe; Gruppen an Blockgrenzen erscheinen doppelt
+        aufgaben = []
+        zeilen_codes = []
+        zeile = 0
+        for start in range(0, len(self), block_groesse):
+            auswahl = reihenfolge[start:start + block_groesse]
+            block_codes = codes[start:start + block_groesse]
+            grenzen = np.flatnonzero(np.append(True, block_codes[1:] != block_codes[:-1]))
+            aufgaben.append((
+                zeile,
+                self.startbestand[auswahl],
+                self.monatliche_zugaenge[auswahl],
+                faktor[auswahl],
+                self.startmonat[auswahl],
+                kalenderstart,
+                grenzen,
+            ))
+            zeilen_codes.append(block_codes[grenzen])
+            zeile += len(grenzen)
+        zeilen_codes = np.concatenate(zeilen_codes) if zeilen_codes else np.empty(0, dtype=np.int64)
+
+        with erstelle_ergebnisspeicher((len(zeilen_codes), monate), np.float64, max_worker) as speicher:
+            fuehre_aufgaben_aus(_berechne_portfolioblock, aufgaben, speicher, max_worker)
+            teilsummen = speicher.als_array()
+
+        bestand = np.zeros((len(blaetter), monate))
+        if len(zeilen_codes):
+            grenzen = np.flatnonzero(np.append(True, zeilen_codes[1:] != zeilen_codes[:-1]))
+            bestand[zeilen_codes[grenzen]] = np.add.reduceat(teilsummen, grenzen, axis=0)
+        blaetter['Anzahl_Plantagen'] = np.bincount(codes, minlength=len(blaetter))
+        kalender = pd.PeriodIndex.from_ordinals(kalenderstart + np.arange(monate), freq='M').to_timestamp()
+        return PortfolioErgebnis(kalender, blaetter, bestand, list(self.hierarchie))
+
+
+class PortfolioErgebnis:
+    """Monatsbestände je Blattgruppe mit Verdichtung auf gröbere Hierarchieebenen"""
+
+    def __init__(self, kalender, blaetter, bestand, ebenen):
+        self.kalender = kalender
+        self.blaetter = blaetter
+        self.bestand = bestand
+        self.ebenen = ebenen
+
+    def summen(self, ebene=None):
+        """
+        Monatsbestände je Gruppe bis einschließlich ebene; None ergibt die Portfoliosumme
+
+        Returns:
+            pd.DataFrame: Eine Zeile je Gruppe (Index aus den Hierarchiespalten),
+                eine Spalte je Kalendermonat
+        """
+        if ebene is None:
+            return pd.DataFrame(
+                runde_bestand(self.bestand.sum(axis=0))[None, :],
+                index=pd.Index(['Gesamt'], name='Portfolio'),
+                columns=self.kalender,
+            )
+        if ebene not in self.ebenen:
+            raise ValueError(f"Unbekannte Hierarchieebene: {ebene}")
+        spalten = self.ebenen[:self.ebenen.index(ebene) + 1]
+        gruppen = self.blaetter.groupby(spalten, observed=True, sort=True).ngroup().to_numpy()
+        index = self.blaetter.groupby(spalten, observed=True, sort=True).size().index
+        summe = np.zeros((len(index), self.bestand.shape[1]))
+        np.add.at(summe, gruppen, self.bestand)
+        return pd.DataFrame(runde_bestand(summe), index=index, columns=self.kalender)
+
+    def anzahl_plantagen(self, ebene=None):
+        if ebene is None:
+            return int(self.blaetter['Anzahl_Plantagen'].sum())
+        spalten = self.ebenen[:self.ebenen.index(ebene) + 1]
+        return self.blaetter.groupby(spalten, observed=True, sort=True)['Anzahl_Plantagen'].sum()
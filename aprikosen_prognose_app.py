@@ -1,10 +1,43 @@
+import hashlib
+import os
 
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime, date
 
+from aprikosen_diagramme import (
+    erstelle_anteilsdiagramm,
+    erstelle_bestandsdiagramm,
+    erstelle_tornadodiagramm,
+    erstelle_ueberwachungsdiagramm,
+)
+from aprikosen_eingaben import (
+    MAX_PROGNOSEJAHRE,
+    ZEITPLAN_SPALTEN,
+    parse_float,
+    parse_int,
+    pruefe_prognoseparameter,
+    pruefe_zeitplan,
+)
+from aprikosen_monte_carlo import MonteCarloParameter, berechne_perzentilbaender
+from aprikosen_laufspeicher import Laufspeicher
+from aprikosen_prognose_cache import ErgebnisCache
+from aprikosen_prognose_engine import (
+    berechne_jahresprojektion,
+    berechne_planprojektion,
+    berechne_projektion,
+    berechne_wachstumsfaktor,
+    erstelle_kalender,
+    erstelle_saisonplan,
+    erstelle_stufenplan,
+)
+from aprikosen_sensitivitaet import berechne_tornado
+from aprikosen_szenariowuerfel import Szenariowuerfel
+from aprikosen_ueberwachung import STANDARD_SCHWELLEN, Prognoseueberwachung
+from aprikosen_zielwert import berechne_benoetigte_zugaenge, berechne_benoetigtes_wachstum, berechne_erreichungsmonat
+from aprikosen_statistik import STANDARD_RELATIVE_GENAUIGKEIT
+
 
 # Titel
 st.title("🌳 Aprikosenbäume Entwicklungsprognose")
@@ -14,199 +47,705 @@ und einem prozentualen jährlichen Wachstum.
 """)
 
 
-MAX_PROGNOSEJAHRE = 50
 ABGELTUNGSSTEUER_SATZ = 0.26
+CACHE_MAX_EINTRAEGE = 256
+CACHE_TTL_SEKUNDEN = 60 * 60
+# Ab dieser Größe werden Kennzahlen wissenschaftlich statt mit allen Stellen angezeigt
+GROSSE_ZAHL = 1e15
+# Persistenter Laufspeicher nur, wenn ein Verzeichnis gesetzt ist; Größe und Alter sind begrenzt
+LAUFSPEICHER_VERZEICHNIS = os.environ.get('APRIKOSEN_LAUFSPEICHER')
+LAUFSPEICHER_MAX_MB = float(os.environ.get('APRIKOSEN_LAUFSPEICHER_MAX_MB', 512))
+LAUFSPEICHER_MAX_TAGE = float(os.environ.get('APRIKOSEN_LAUFSPEICHER_MAX_TAGE', 30))
+MAX_MONATLICHE_PROGNOSEJAHRE = 50
+# Optionaler Szenariowürfel (aprikosen_szenariowuerfel.py) für Jahresprojektionen auf dem Wachstumsraster
+SZENARIOWUERFEL_VERZEICHNIS = os.environ.get('APRIKOSEN_SZENARIOWUERFEL')
+MAX_MONTE_CARLO_PFADE = 100_000
+SENSITIVITAET_AENDERUNG = 0.1
+ZIELWERT_GESUCHT = ("Monatliche Zugänge", "Jährliches Wachstum", "Erreichungsmonat")
+SCHWELLEN_BESCHRIFTUNG = {
+    'Abweichung_Prozent': "Letzte Abweichung (%)",
+    'Drift_Prozent': "Drift (%)",
+    'CUSUM_Prozent': "CUSUM (%)",
+}
+
+
+@st.cache_resource
+def _ergebnis_cache():
+    # Eine Instanz pro Serverprozess, gemeinsam für alle Sitzungen
+    return ErgebnisCache(max_eintraege=CACHE_MAX_EINTRAEGE, ttl_sekunden=CACHE_TTL_SEKUNDEN)
+
+
+def _formatiere_zahl(wert, log10_wert=None, format_spec=',.0f'):
+    # Große Werte wissenschaftlich, nicht darstellbare über ihren Zehnerlogarithmus
+    if np.isfinite(wert) and abs(wert) < GROSSE_ZAHL:
+        return f"{wert:{format_spec}}"
+    if np.isfinite(wert):
+        return f"{wert:.3e}"
+    if log10_wert is not None and np.isfinite(log10_wert):
+        return f"≈ 10^{log10_wert:,.1f}"
+    return f"> {np.finfo(np.float64).max:.1e}"
+
+
+def _erstelle_zeitplan(schluessel, stufen, standardwert, monate_gesamt, startdatum):
+    if schluessel == 'Monat':
+        return erstelle_stufenplan(monate_gesamt, stufen, anfangswert=standardwert)
+    profil = np.full(12, float(standardwert))
+    for kalendermonat, wert in stufen:
+        profil[kalendermonat - 1] = wert
+    return erstelle_saisonplan(monate_gesamt, profil, startdatum)
+
 
+@st.cache_resource
+def _laufspeicher():
+    # Optionaler persistenter Speicher unter dem Ergebniscache: überdauert Neustarts und verlängert Läufe
+    # inkrementell; ohne APRIKOSEN_LAUFSPEICHER bleibt es beim begrenzten Ergebniscache im Arbeitsspeicher
+    if not LAUFSPEICHER_VERZEICHNIS:
+        return None
+    return Laufspeicher(
+        LAUFSPEICHER_VERZEICHNIS,
+        max_bytes=LAUFSPEICHER_MAX_MB * 1024 ** 2,
+        max_alter_tage=LAUFSPEICHER_MAX_TAGE,
+    )
+
+
+@st.cache_resource(max_entries=1)
+def _lade_szenariowuerfel(verzeichnis, stand):
+    # stand (Änderungszeit von meta.json) gehört zum Schlüssel: ein neu geschriebener Würfel ersetzt den alten
+    return Szenariowuerfel(verzeichnis)
 
-def _parse_int(value: str, field_label: str, minimum: int = 0, maximum: int | None = None):
-    if not value.strip():
-        raise ValueError(f"{field_label} ist ein Pflichtfeld.")
+
+def _szenariowuerfel():
+    if not SZENARIOWUERFEL_VERZEICHNIS:
+        return None
     try:
-        parsed = int(value)
-    except ValueError:
-        raise ValueError(f"{field_label} muss eine ganze Zahl sein.")
-    if parsed < minimum:
-        raise ValueError(f"{field_label} muss mindestens {minimum} betragen.")
-    if maximum is not None and parsed > maximum:
-        raise ValueError(f"{field_label} darf höchstens {maximum} betragen.")
-    return parsed
-
-
-def _parse_float(value: str, field_label: str, minimum: float = 0.0):
-    if not value.strip():
-        raise ValueError(f"{field_label} ist ein Pflichtfeld.")
+        stand = os.path.getmtime(os.path.join(SZENARIOWUERFEL_VERZEICHNIS, 'meta.json'))
+    except OSError:
+        return None
+    return _lade_szenariowuerfel(SZENARIOWUERFEL_VERZEICHNIS, stand)
+
+
+@st.cache_resource
+def _ueberwachung():
+    # Inkrementeller Index aus Prognosen, Ist-Beständen und laufenden Kennzahlen, gemeinsam für alle Sitzungen
+    return Prognoseueberwachung()
+
+
+def _berechne_prognose(startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre, startdatum,
+                       zeitplan=None):
+    monate_gesamt = prognosejahre * 12
+    monatlicher_wachstumsfaktor = berechne_wachstumsfaktor(jaehrliches_wachstum)
+
+    if zeitplan is not None:
+        schluessel, zugaenge_stufen, wachstum_stufen = zeitplan
+        zugaenge_plan = _erstelle_zeitplan(schluessel, zugaenge_stufen, monatliche_zugaenge, monate_gesamt, startdatum)
+        wachstum_plan = _erstelle_zeitplan(schluessel, wachstum_stufen, jaehrliches_wachstum, monate_gesamt, startdatum)
+        df = pd.DataFrame(berechne_planprojektion(
+            startbestand, zugaenge_plan, berechne_wachstumsfaktor(wachstum_plan), monate_gesamt
+        ))
+        df.insert(1, 'Datum', erstelle_kalender(startdatum, monate_gesamt)['Datum'])
+        df['Gesamtzuwachs'] = df['Baumbestand'] - startbestand
+        df['Gesamtwachstum_%'] = ((df['Baumbestand'] / startbestand) - 1) * 100
+        # Monat m enthält die Zugänge der Monate 1 bis m - 1
+        df['Lineare_Entwicklung'] = startbestand + np.concatenate([[0.0], np.cumsum(zugaenge_plan[:-1])])
+        return df
+
+    if prognosejahre > MAX_MONATLICHE_PROGNOSEJAHRE:
+        # Lange Zeiträume in Jahresauflösung und im Logarithmus: konstant kleine Tabellen, kein Überlauf.
+        # Liegt das Wachstum auf dem Raster eines aktuellen Szenariowürfels, wird nachgeschlagen.
+        wuerfel = _szenariowuerfel()
+        jahresprojektion = None if wuerfel is None else wuerfel.jahresprojektion(
+            startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre
+        )
+        if jahresprojektion is None:
+            jahresprojektion = berechne_jahresprojektion(
+                startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, prognosejahre
+            )
+        df = pd.DataFrame(jahresprojektion)
+    elif _laufspeicher() is not None:
+        df, _ = _laufspeicher().hole_oder_berechne(
+            startdatum, startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre
+        )
+    else:
+        df = pd.DataFrame(berechne_projektion(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate_gesamt))
+        df.insert(1, 'Datum', erstelle_kalender(startdatum, monate_gesamt)['Datum'])
+    df['Gesamtzuwachs'] = df['Baumbestand'] - startbestand
+    df['Gesamtwachstum_%'] = ((df['Baumbestand'] / startbestand) - 1) * 100
+    df['Lineare_Entwicklung'] = startbestand + (df['Monat'] - 1) * monatliche_zugaenge
+    return df
+
+
+def _berechne_ergebnis(startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre, startdatum,
+                       monte_carlo=None, zeitplan=None):
+    df = _berechne_prognose(startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre, startdatum,
+                            zeitplan)
+    end_bestand = df['Baumbestand'].iloc[-1]
+    zinseszinseffekt = end_bestand - df['Lineare_Entwicklung'].iloc[-1]
+
+    baender = None
+    if monte_carlo is not None:
+        anzahl_pfade, seed, *streuungen = monte_carlo
+        parameter = MonteCarloParameter(
+            startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre, *streuungen
+        )
+        # Laufende Quantilskizze statt aller Pfade: konstanter Speicher je Anfrage
+        baender = berechne_perzentilbaender(
+            parameter, anzahl_pfade, seed=seed, relative_genauigkeit=STANDARD_RELATIVE_GENAUIGKEIT
+        )
+
+    tornadodiagramm = None
+    if zeitplan is None:
+        # Die Ableitungen der geschlossenen Form gelten nur für konstante Parameter
+        tornadodiagramm = erstelle_tornadodiagramm(
+            berechne_tornado(
+                startbestand,
+                monatliche_zugaenge,
+                jaehrliches_wachstum,
+                prognosejahre,
+                relative_aenderung=SENSITIVITAET_AENDERUNG,
+            ),
+            SENSITIVITAET_AENDERUNG,
+        )
+
+    anteilsdiagramm = None
+    if np.isfinite(end_bestand):
+        # Bei Überlauf wären die Anteile inf/inf; dann entfällt das Diagramm
+        anteilsdiagramm = erstelle_anteilsdiagramm(end_bestand - zinseszinseffekt, zinseszinseffekt)
+
+    return {
+        'df': df,
+        'baender': baender,
+        'anteilsdiagramm': anteilsdiagramm,
+        'tornadodiagramm': tornadodiagramm,
+    }
+
+
+def _monate_bis(startdatum, zieldatum):
+    # Anzahl voller Monatsschritte ab startdatum, deren Datum nicht nach zieldatum liegt
+    monate = (zieldatum.year - startdatum.year) * 12 + (zieldatum.month - startdatum.month)
+    if startdatum + pd.DateOffset(months=monate) > zieldatum:
+        monate -= 1
+    return monate
+
+
+def _zeige_zielwertsuche():
+    st.subheader("🎯 Zielwertsuche")
+    gesucht = st.sidebar.selectbox(
+        "Gesuchte Größe",
+        ZIELWERT_GESUCHT,
+        help="Die gesuchte Größe wird aus den übrigen Parametern exakt zurückgerechnet."
+    )
+    with st.sidebar.form("zielwert_form", clear_on_submit=False):
+        startbestand_input = st.text_input(
+            "Startbestand (Bäume)",
+            value="1000",
+            help="Pflichtfeld. Gesamtzahl vorhandener Bäume zu Beginn (ganze Zahl)."
+        )
+        zielbestand_input = st.text_input(
+            "Zielbestand (Bäume)",
+            value="250000",
+            help="Pflichtfeld. Bestand, der erreicht werden soll (ganze Zahl)."
+        )
+        if gesucht != "Monatliche Zugänge":
+            monatliche_zugaenge_input = st.text_input(
+                "Monatliche Zugänge",
+                value="1800",
+                help="Pflichtfeld. Geplante Neupflanzungen pro Monat (ganze Zahl)."
+            )
+        if gesucht != "Jährliches Wachstum":
+            jaehrliches_wachstum_input = st.text_input(
+                "Jährliches Wachstum (%)",
+                value="7.0",
+                help="Pflichtfeld. Prozentuales Wachstum pro Jahr (0 oder größer)."
+            )
+        startdatum_input = st.date_input(
+            "Startdatum",
+            value=datetime.today().date(),
+            min_value=date(2000, 1, 1),
+            max_value=date(2050, 12, 31),
+            help="Pflichtfeld. Datum, ab dem die Prognose beginnen soll."
+        )
+        if gesucht != "Erreichungsmonat":
+            zieldatum_input = st.date_input(
+                "Zieldatum",
+                value=date(datetime.today().year + 5, 12, 31),
+                min_value=date(2000, 1, 1),
+                help="Pflichtfeld. Datum, zu dem der Zielbestand erreicht sein soll."
+            )
+        submitted = st.form_submit_button("Zielwert berechnen")
+
+    if not submitted:
+        st.info("Bitte füllen Sie die Pflichtfelder links aus und starten Sie die Zielwertsuche.")
+        return
+
+    validation_errors = []
     try:
-        parsed = float(value.replace(",", "."))
-    except ValueError:
-        raise ValueError(f"{field_label} muss eine Zahl sein.")
-    if parsed < minimum:
-        raise ValueError(f"{field_label} muss mindestens {minimum} betragen.")
-    return parsed
+        startbestand = parse_int(startbestand_input, "Startbestand (Bäume)")
+    except ValueError as exc:
+        validation_errors.append(str(exc))
 
+    try:
+        zielbestand = parse_int(zielbestand_input, "Zielbestand (Bäume)")
+    except ValueError as exc:
+        validation_errors.append(str(exc))
 
-# Seitenleiste für Parameter
-st.sidebar.header("🔧 Parameter konfigurieren")
-with st.sidebar.form("parameter_form", clear_on_submit=False):
-    startbestand_input = st.text_input(
-        "Startbestand (Bäume)",
-        value="1000",
-        help="Pflichtfeld. Gesamtzahl vorhandener Bäume zu Beginn (ganze Zahl)."
+    if gesucht != "Monatliche Zugänge":
+        try:
+            monatliche_zugaenge = parse_int(monatliche_zugaenge_input, "Monatliche Zugänge")
+        except ValueError as exc:
+            validation_errors.append(str(exc))
+
+    if gesucht != "Jährliches Wachstum":
+        try:
+            jaehrliches_wachstum = parse_float(jaehrliches_wachstum_input, "Jährliches Wachstum (%)")
+        except ValueError as exc:
+            validation_errors.append(str(exc))
+
+    startdatum = pd.Timestamp(startdatum_input)
+    if gesucht != "Erreichungsmonat":
+        monate = _monate_bis(startdatum, pd.Timestamp(zieldatum_input))
+        if monate < 1:
+            validation_errors.append("Zieldatum muss mindestens einen Monat nach dem Startdatum liegen.")
+
+    if validation_errors:
+        for error in validation_errors:
+            st.sidebar.error(error)
+        st.error("Bitte korrigieren Sie die markierten Eingaben, um fortzufahren.")
+        return
+
+    if gesucht == "Monatliche Zugänge":
+        zugaenge = float(berechne_benoetigte_zugaenge(zielbestand, startbestand, jaehrliches_wachstum, monate))
+        if zugaenge <= 0:
+            st.success("Der Zielbestand wird bereits ohne monatliche Zugänge erreicht.")
+        else:
+            st.markdown(f"- **Benötigte monatliche Zugänge:** {np.ceil(zugaenge):,.0f} Bäume")
+    elif gesucht == "Jährliches Wachstum":
+        wachstum = float(berechne_benoetigtes_wachstum(zielbestand, startbestand, monatliche_zugaenge, monate))
+        if np.isnan(wachstum):
+            st.error("Der Zielbestand ist mit diesen Zugängen auch bei beliebigem Wachstum nicht erreichbar.")
+        else:
+            st.markdown(f"- **Benötigtes jährliches Wachstum:** {wachstum:.2f}%")
+    else:
+        monate = berechne_erreichungsmonat(zielbestand, startbestand, monatliche_zugaenge, jaehrliches_wachstum)
+        if np.isnan(monate):
+            st.error("Der Zielbestand wird mit diesen Parametern nie erreicht.")
+        else:
+            erreicht_am = startdatum + pd.DateOffset(months=int(monate))
+            st.markdown(
+                f"- **Zielbestand erreicht:** nach {int(monate):,} Monaten "
+                f"({erreicht_am.strftime('%m/%Y')}, Prognosemonat {int(monate) + 1})"
+            )
+
+    if gesucht != "Erreichungsmonat":
+        st.caption(f"Betrachteter Zeitraum: {monate} Monate ab Startdatum bis einschließlich {zieldatum_input:%d.%m.%Y}.")
+
+
+def _lies_tabelle(datei):
+    if datei.name.endswith('.parquet'):
+        return pd.read_parquet(datei)
+    kopf = datei.getvalue()[:4096].decode('utf-8-sig', errors='ignore')
+    return pd.read_csv(datei, sep=';' if ';' in kopf.split('\n')[0] else ',', encoding='utf-8-sig')
+
+
+def _zeige_ueberwachung():
+    st.subheader("📡 Prognoseüberwachung")
+    ueberwachung = _ueberwachung()
+
+    with st.sidebar.form("prognose_registrieren_form", clear_on_submit=True):
+        st.markdown("**Prognosen registrieren**")
+        prognose_name = st.text_input(
+            "Name der Prognose",
+            value="Plan",
+            help="Eine erneute Registrierung unter gleichem Namen ersetzt die Prognose für die enthaltenen Plantagen."
+        )
+        parameter_datei = st.file_uploader(
+            "Parametertabelle (CSV/Parquet)",
+            type=["csv", "parquet"],
+            help="Spalten id, startdatum, startbestand, monatliche_zugaenge und jaehrliches_wachstum, "
+                 "z. B. das Ergebnis der Kalibrierung."
+        )
+        prognosejahre = st.number_input(
+            "Prognosezeitraum (Jahre)", min_value=1, max_value=MAX_MONATLICHE_PROGNOSEJAHRE, value=10
+        )
+        registrieren = st.form_submit_button("Registrieren")
+    if registrieren:
+        if parameter_datei is None or not prognose_name.strip():
+            st.sidebar.error("Bitte Namen und Parametertabelle angeben.")
+        else:
+            try:
+                vergleiche = ueberwachung.registriere_parameter(
+                    prognose_name.strip(), _lies_tabelle(parameter_datei), int(prognosejahre) * 12
+                )
+                st.sidebar.success(f"Prognose registriert, {vergleiche:,} vorhandene Ist-Monate verglichen.")
+            except ValueError as exc:
+                st.sidebar.error(str(exc))
+
+    with st.sidebar.form("istwerte_form", clear_on_submit=True):
+        st.markdown("**Ist-Bestände einlesen**")
+        ist_datei = st.file_uploader(
+            "Ist-Bestände (CSV/Parquet)",
+            type=["csv", "parquet"],
+            help="Spalten id, Datum und Baumbestand. Bereits eingelesene Dateien und Monate werden übersprungen."
+        )
+        einlesen = st.form_submit_button("Einlesen")
+    if einlesen and ist_datei is not None:
+        try:
+            statistik = ueberwachung.verarbeite_istwerte(
+                _lies_tabelle(ist_datei),
+                pruefsumme=hashlib.sha256(ist_datei.getvalue()).hexdigest(),
+                name=ist_datei.name,
+            )
+        except ValueError as exc:
+            st.sidebar.error(str(exc))
+        else:
+            if statistik['Uebersprungen']:
+                st.sidebar.info("Diese Datei wurde bereits eingelesen.")
+            else:
+                st.sidebar.success(
+                    f"{statistik['Neue_Zeilen']:,} von {statistik['Zeilen']:,} Zeilen neu, "
+                    f"{statistik['Vergleiche']:,} Vergleiche in {statistik['Sekunden']:.2f} s."
+                )
+
+    st.sidebar.markdown("**Alarmschwellen**")
+    schwellen = {
+        name: st.sidebar.number_input(beschriftung, min_value=0.0, value=STANDARD_SCHWELLEN[name], step=0.5)
+        for name, beschriftung in SCHWELLEN_BESCHRIFTUNG.items()
+    }
+
+    kennzahlen = ueberwachung.kennzahlen(schwellen)
+    if kennzahlen.empty:
+        st.info("Bitte registrieren Sie links eine Prognose und lesen Sie Ist-Bestände ein.")
+        return
+
+    spalte_plantagen, spalte_prognosen, spalte_alarme = st.columns(3)
+    spalte_plantagen.metric("Überwachte Plantagen", f"{kennzahlen['id'].nunique():,}")
+    spalte_prognosen.metric("Prognosen", f"{kennzahlen['Prognose'].nunique():,}")
+    spalte_alarme.metric("Alarme", f"{int(kennzahlen['Alarm'].sum()):,}")
+    st.caption(
+        "Abweichung = Prognose − Ist, relativ zum Ist-Bestand (positiv: Prognose zu hoch). "
+        "Drift ist der geglättete Mittelwert der relativen Abweichung, "
+        "CUSUM die aufsummierte anhaltende Abweichung nach oben bzw. unten."
     )
-    monatliche_zugaenge_input = st.text_input(
-        "Monatliche Zugänge",
-        value="1800",
-        help="Pflichtfeld. Geplante Neupflanzungen pro Monat (ganze Zahl)."
+
+    alarme = kennzahlen[kennzahlen['Alarm']]
+    if alarme.empty:
+        st.success("Keine Schwelle überschritten.")
+    else:
+        st.dataframe(
+            alarme.sort_values('Drift_Prozent', key=np.abs, ascending=False), hide_index=True, width="stretch"
+        )
+    with st.expander("Alle Kennzahlen"):
+        st.dataframe(kennzahlen, hide_index=True, width="stretch")
+
+    # Vorauswahl: erste Plantage mit Alarm
+    plantagen = kennzahlen['id'].unique()
+    vorauswahl = 0 if alarme.empty else int(np.flatnonzero(plantagen == alarme['id'].iloc[0])[0])
+    plantage = st.selectbox("Plantage", plantagen, index=vorauswahl)
+    st.altair_chart(erstelle_ueberwachungsdiagramm(ueberwachung.abweichungen(plantage)), width="stretch")
+
+
+@st.fragment
+def _zeige_parameterformular():
+    # Eingaben werden erst beim Absenden geprüft; nur gültige Parameter lösen einen Neulauf der Ergebnisse aus
+    with st.form("parameter_form", clear_on_submit=False):
+        startbestand_input = st.text_input(
+            "Startbestand (Bäume)",
+            value="1000",
+            help="Pflichtfeld. Gesamtzahl vorhandener Bäume zu Beginn (ganze Zahl)."
+        )
+        monatliche_zugaenge_input = st.text_input(
+            "Monatliche Zugänge",
+            value="1800",
+            help="Pflichtfeld. Geplante Neupflanzungen pro Monat (ganze Zahl)."
+        )
+        jaehrliches_wachstum_input = st.text_input(
+            "Jährliches Wachstum (%)",
+            value="7.0",
+            help="Pflichtfeld. Prozentuales Wachstum pro Jahr (0 oder größer)."
+        )
+        prognosejahre_input = st.text_input(
+            "Prognosezeitraum (Jahre)",
+            value="5",
+            help=(
+                f"Pflichtfeld. Anzahl der Jahre für die Prognose (mindestens 1, maximal {MAX_PROGNOSEJAHRE})."
+            ),
+        )
+        startdatum_input = st.date_input(
+            "Startdatum",
+            value=datetime.today().date(),
+            min_value=date(2000, 1, 1),
+            max_value=date(2050, 12, 31),
+            help="Pflichtfeld. Datum, ab dem die Prognose beginnen soll."
+        )
+        with st.expander("🎲 Monte-Carlo-Simulation (optional)"):
+            monte_carlo_aktiv = st.checkbox(
+                "Unsicherheit simulieren",
+                value=False,
+                help="Zieht Wachstum und Zugänge je Monat zufällig und zeigt das P5–P95-Band."
+            )
+            wachstum_streuung_input = st.text_input(
+                "Streuung Wachstum (Prozentpunkte)",
+                value="2.0",
+                help="Standardabweichung des jährlichen Wachstums, je Monat neu gezogen."
+            )
+            zugaenge_streuung_input = st.text_input(
+                "Streuung monatliche Zugänge (Bäume)",
+                value="0",
+                help="Standardabweichung der monatlichen Zugänge."
+            )
+            korrelation_input = st.text_input(
+                "Korrelation Wachstum/Zugänge",
+                value="0.0",
+                help="Korrelation der Zufallsziehungen zwischen -1 und 1."
+            )
+            schaden_wahrscheinlichkeit_input = st.text_input(
+                "Schadenswahrscheinlichkeit pro Monat (%)",
+                value="0.0",
+                help="Wahrscheinlichkeit eines Frost- oder Hagelschadens je Monat."
+            )
+            schaden_anteil_min_input = st.text_input(
+                "Verlust bei Schaden, minimal (%)",
+                value="5.0",
+                help="Untergrenze des vernichteten Bestandsanteils bei einem Schaden."
+            )
+            schaden_anteil_max_input = st.text_input(
+                "Verlust bei Schaden, maximal (%)",
+                value="20.0",
+                help="Obergrenze des vernichteten Bestandsanteils bei einem Schaden."
+            )
+            anzahl_pfade_input = st.text_input(
+                "Anzahl Pfade",
+                value="10000",
+                help=f"Anzahl simulierter Pfade (mindestens 100, maximal {MAX_MONTE_CARLO_PFADE:,})."
+            )
+            seed_input = st.text_input(
+                "Seed",
+                value="42",
+                help="Startwert des Zufallsgenerators für reproduzierbare Ergebnisse."
+            )
+        with st.expander("📅 Zeitplan (optional)"):
+            zeitplan_datei = st.file_uploader(
+                "Zeitplan-CSV",
+                type=["csv"],
+                help=(
+                    "Spalte 'Monat' (Stufen ab dem jeweiligen Prognosemonat) oder 'Kalendermonat' "
+                    f"(Saisonprofil 1–12) sowie {' und/oder '.join(ZEITPLAN_SPALTEN)}; "
+                    "leere Zellen übernehmen die Werte oben."
+                ),
+            )
+        submitted = st.form_submit_button("Prognose berechnen")
+
+    if submitted:
+        eingaben, validation_errors = pruefe_prognoseparameter(
+            startbestand_input,
+            monatliche_zugaenge_input,
+            jaehrliches_wachstum_input,
+            prognosejahre_input,
+        )
+        startbestand = eingaben.get('startbestand')
+        monatliche_zugaenge = eingaben.get('monatliche_zugaenge')
+        jaehrliches_wachstum = eingaben.get('jaehrliches_wachstum')
+        prognosejahre = eingaben.get('prognosejahre')
+
+        monte_carlo = None
+        if monte_carlo_aktiv and prognosejahre is not None and prognosejahre > MAX_MONATLICHE_PROGNOSEJAHRE:
+            validation_errors.append(
+                f"Die Monte-Carlo-Simulation ist auf {MAX_MONATLICHE_PROGNOSEJAHRE} Prognosejahre begrenzt."
+            )
+        elif monte_carlo_aktiv:
+            try:
+                wachstum_streuung = parse_float(wachstum_streuung_input, "Streuung Wachstum (Prozentpunkte)")
+                zugaenge_streuung = parse_float(zugaenge_streuung_input, "Streuung monatliche Zugänge (Bäume)")
+                korrelation = parse_float(korrelation_input, "Korrelation Wachstum/Zugänge", minimum=-1.0, maximum=1.0)
+                schaden_wahrscheinlichkeit = parse_float(
+                    schaden_wahrscheinlichkeit_input, "Schadenswahrscheinlichkeit pro Monat (%)", maximum=100.0
+                )
+                schaden_anteil_min = parse_float(schaden_anteil_min_input, "Verlust bei Schaden, minimal (%)", maximum=100.0)
+                schaden_anteil_max = parse_float(
+                    schaden_anteil_max_input,
+                    "Verlust bei Schaden, maximal (%)",
+                    minimum=schaden_anteil_min,
+                    maximum=100.0,
+                )
+                anzahl_pfade = parse_int(anzahl_pfade_input, "Anzahl Pfade", minimum=100, maximum=MAX_MONTE_CARLO_PFADE)
+                seed = parse_int(seed_input, "Seed")
+                monte_carlo = (
+                    anzahl_pfade,
+                    seed,
+                    wachstum_streuung,
+                    zugaenge_streuung,
+                    korrelation,
+                    schaden_wahrscheinlichkeit / 100,
+                    schaden_anteil_min / 100,
+                    schaden_anteil_max / 100,
+                )
+            except ValueError as exc:
+                validation_errors.append(str(exc))
+
+        zeitplan = None
+        if zeitplan_datei is not None and prognosejahre is not None:
+            if prognosejahre > MAX_MONATLICHE_PROGNOSEJAHRE:
+                validation_errors.append(f"Zeitpläne sind auf {MAX_MONATLICHE_PROGNOSEJAHRE} Prognosejahre begrenzt.")
+            elif monte_carlo is not None:
+                validation_errors.append("Zeitplan und Monte-Carlo-Simulation können nicht kombiniert werden.")
+            else:
+                zeilen = zeitplan_datei.getvalue().decode('utf-8-sig').splitlines()
+                trennzeichen = ';' if zeilen and ';' in zeilen[0] else ','
+                werte, zeitplan_errors = pruefe_zeitplan(zeilen, prognosejahre * 12, sep=trennzeichen)
+                validation_errors.extend(zeitplan_errors)
+                if not zeitplan_errors:
+                    # Hashbar, damit der Zeitplan Teil des Cache-Schlüssels ist
+                    zeitplan = (werte['schluessel'], *(
+                        tuple(sorted(werte.get(name, {}).items())) for name in ZEITPLAN_SPALTEN
+                    ))
+        startdatum = pd.Timestamp(startdatum_input)
+        st.session_state['validation_errors'] = validation_errors
+        st.session_state['prognoseparameter'] = None if validation_errors else (
+            startbestand, monatliche_zugaenge, jaehrliches_wachstum, prognosejahre, startdatum, monte_carlo, zeitplan
+        )
+        st.rerun()
+
+    for error in st.session_state.get('validation_errors', []):
+        st.error(error)
+
+
+@st.fragment
+def _zeige_bestandsentwicklung(ergebnis):
+    st.subheader("📈 Entwicklung des Baumbestands")
+    spalte_linear, spalte_log, spalte_band = st.columns(3)
+    linear = spalte_linear.toggle("Lineare Entwicklung anzeigen", value=True)
+    logarithmisch = spalte_log.toggle("Logarithmische Achse", value='Datum' not in ergebnis['df'])
+    band = ergebnis['baender'] is not None and spalte_band.toggle("Monte-Carlo-Band anzeigen", value=True)
+    st.altair_chart(
+        erstelle_bestandsdiagramm(
+            ergebnis['df'], ergebnis['baender'] if band else None, linear=linear, logarithmisch=logarithmisch
+        ),
+        width="stretch",
     )
-    jaehrliches_wachstum_input = st.text_input(
-        "Jährliches Wachstum (%)",
-        value="7.0",
-        help="Pflichtfeld. Prozentuales Wachstum pro Jahr (0 oder größer)."
+    if 'Datum' not in ergebnis['df']:
+        st.caption(
+            f"Zeiträume über {MAX_MONATLICHE_PROGNOSEJAHRE} Jahre werden in Jahresauflösung "
+            "(Bestand am Ende jedes Prognosejahres) berechnet und dargestellt."
+        )
+
+
+@st.fragment
+def _zeige_kennzahlen(ergebnis, startbestand):
+    st.subheader("📊 Statistische Kennzahlen")
+    steuersatz = st.slider(
+        "Abgeltungssteuer (%)",
+        min_value=0.0,
+        max_value=50.0,
+        value=round(ABGELTUNGSSTEUER_SATZ * 100, 1),
+        step=0.5,
+        help="Wirkt nur auf die Kennzahlen; die Prognose wird nicht neu berechnet.",
+    ) / 100
+
+    df = ergebnis['df']
+    end_bestand = df['Baumbestand'].iloc[-1]
+    lineare_entwicklung = df['Lineare_Entwicklung'].iloc[-1]
+    with np.errstate(over='ignore', invalid='ignore'):
+        zinseszinseffekt = end_bestand - lineare_entwicklung
+        gesamtwachstum = end_bestand - startbestand
+        gesamtwachstum_prozent = ((end_bestand / startbestand) - 1) * 100
+        # Über die lineare Entwicklung gerechnet bleibt der Anteil auch bei überlaufendem Endbestand endlich
+        zinseszinseffekt_anteil_prozent = (1 - lineare_entwicklung / end_bestand) * 100 if end_bestand else 0
+        durchschnittlicher_zuwachs = df['Monatlicher_Zuwachs'].mean()
+    zinseszinseffekt_anteil_nach_steuer_prozent = zinseszinseffekt_anteil_prozent * (1 - steuersatz)
+
+    # In Jahresauflösung liegt der Bestand zusätzlich im Logarithmus vor; Zinseszins und
+    # Gesamtwachstum sind dann praktisch der ganze Endbestand
+    log10_end = df['Log10_Baumbestand'].iloc[-1] if 'Log10_Baumbestand' in df else None
+    log10_prozent = None if log10_end is None else log10_end - np.log10(startbestand) + 2
+
+    st.markdown(f"- **Startbestand:** {startbestand:,} Bäume")
+    st.markdown(f"- **Endbestand:** {_formatiere_zahl(end_bestand, log10_end)} Bäume")
+    st.markdown(
+        f"- **Gesamtwachstum:** {_formatiere_zahl(gesamtwachstum, log10_end)} Bäume "
+        f"({_formatiere_zahl(gesamtwachstum_prozent, log10_prozent, '.2f')}%)"
     )
-    prognosejahre_input = st.text_input(
-        "Prognosezeitraum (Jahre)",
-        value="5",
-        help=(
-            f"Pflichtfeld. Anzahl der Jahre für die Prognose (mindestens 1, maximal {MAX_PROGNOSEJAHRE})."
-        ),
+    st.markdown(
+        f"- **Zusätzlicher Ertrag durch Zinseszins (vor Steuer):** {_formatiere_zahl(zinseszinseffekt, log10_end)} "
+        f"Bäume ({zinseszinseffekt_anteil_prozent:.2f}% des Endbestands)"
     )
-    startdatum_input = st.date_input(
-        "Startdatum",
-        value=datetime.today().date(),
-        min_value=date(2000, 1, 1),
-        max_value=date(2050, 12, 31),
-        help="Pflichtfeld. Datum, ab dem die Prognose beginnen soll."
+    st.markdown(
+        f"- **Anteil Kapitalertrag nach Abgeltungssteuer ({steuersatz:.0%}):** "
+        f"{zinseszinseffekt_anteil_nach_steuer_prozent:.2f}%"
     )
-    submitted = st.form_submit_button("Prognose berechnen")
+    st.markdown(f"- **Durchschnittlicher monatlicher Zuwachs:** {_formatiere_zahl(durchschnittlicher_zuwachs)} Bäume")
+    if 'Log10_Baumbestand' in df:
+        if not np.isfinite(end_bestand):
+            st.warning(
+                f"Der Endbestand übersteigt den darstellbaren Zahlenbereich "
+                f"(etwa 10^{df['Log10_Baumbestand'].iloc[-1]:,.1f} Bäume)."
+            )
+        st.caption(
+            f"Geschätzte relative Genauigkeit des Endbestands: {df['Relative_Genauigkeit'].iloc[-1]:.1e} "
+            "(Berechnung im Logarithmus)."
+        )
+    if ergebnis['baender'] is not None:
+        end_baender = ergebnis['baender'].iloc[-1]
+        st.markdown(
+            f"- **Endbestand Monte-Carlo (P5 / P50 / P95):** {_formatiere_zahl(end_baender['P5'])} / "
+            f"{_formatiere_zahl(end_baender['P50'])} / {_formatiere_zahl(end_baender['P95'])} Bäume"
+        )
 
-if not submitted:
-    st.info("Bitte füllen Sie die Pflichtfelder links aus und starten Sie die Prognose.")
+
+@st.fragment
+def _zeige_anteil(ergebnis):
+    st.subheader("🥧 Anteil des Zinseszinseffekts am Endbestand")
+    if ergebnis['anteilsdiagramm'] is None:
+        st.info("Der Endbestand übersteigt den darstellbaren Zahlenbereich; die Anteile stehen in den Kennzahlen.")
+        return
+    st.altair_chart(ergebnis['anteilsdiagramm'], width="stretch")
+
+
+@st.fragment
+def _zeige_sensitivitaet(ergebnis):
+    st.subheader(f"🌪️ Sensitivität des Endbestands (±{SENSITIVITAET_AENDERUNG:.0%} je Parameter)")
+    if ergebnis['tornadodiagramm'] is None:
+        st.info("Die Sensitivitätsanalyse ist nur für konstante Parameter ohne Zeitplan verfügbar.")
+        return
+    st.caption("Lineare Näherung aus den exakten partiellen Ableitungen der geschlossenen Form.")
+    st.altair_chart(ergebnis['tornadodiagramm'], width="stretch")
+
+
+# Seitenleiste für Parameter
+st.sidebar.header("🔧 Parameter konfigurieren")
+modus = st.sidebar.radio("Modus", ("Prognose", "Zielwert", "Überwachung"), horizontal=True)
+if modus == "Zielwert":
+    _zeige_zielwertsuche()
+    st.stop()
+if modus == "Überwachung":
+    _zeige_ueberwachung()
     st.stop()
 
-validation_errors = []
-try:
-    startbestand = _parse_int(startbestand_input, "Startbestand (Bäume)")
-except ValueError as exc:
-    validation_errors.append(str(exc))
-
-try:
-    monatliche_zugaenge = _parse_int(monatliche_zugaenge_input, "Monatliche Zugänge")
-except ValueError as exc:
-    validation_errors.append(str(exc))
-
-try:
-    jaehrliches_wachstum = _parse_float(jaehrliches_wachstum_input, "Jährliches Wachstum (%)")
-except ValueError as exc:
-    validation_errors.append(str(exc))
-
-try:
-    prognosejahre = _parse_int(
-        prognosejahre_input,
-        "Prognosezeitraum (Jahre)",
-        minimum=1,
-        maximum=MAX_PROGNOSEJAHRE,
-    )
-except ValueError as exc:
-    validation_errors.append(str(exc))
+with st.sidebar:
+    _zeige_parameterformular()
+    if _szenariowuerfel() is not None and _szenariowuerfel().veraltet:
+        st.warning(
+            f"Der Szenariowürfel in {SZENARIOWUERFEL_VERZEICHNIS} ist veraltet (Modellversion "
+            f"{_szenariowuerfel().meta.get('modellversion')}); es wird vollständig mit der Engine gerechnet."
+        )
 
-if validation_errors:
-    for error in validation_errors:
-        st.sidebar.error(error)
+if st.session_state.get('validation_errors'):
     st.error("Bitte korrigieren Sie die markierten Eingaben, um fortzufahren.")
     st.stop()
 
-# Berechnungen
-startdatum = pd.Timestamp(startdatum_input)
-monate_gesamt = prognosejahre * 12
-monatlicher_wachstumsfaktor = (1 + jaehrliches_wachstum/100) ** (1/12)
-
-daten = []
-aktueller_bestand = startbestand
-
-for monat in range(1, monate_gesamt + 1):
-    aktuelles_datum = startdatum + pd.DateOffset(months=monat - 1)
-    daten.append({
-        'Monat': monat,
-        'Datum': aktuelles_datum,
-        'Baumbestand': round(aktueller_bestand),
-        'Monatlicher_Zuwachs': round(aktueller_bestand * (monatlicher_wachstumsfaktor - 1) + monatliche_zugaenge)
-    })
-    aktueller_bestand = aktueller_bestand * monatlicher_wachstumsfaktor + monatliche_zugaenge
-
-df = pd.DataFrame(daten)
-df['Gesamtzuwachs'] = df['Baumbestand'] - startbestand
-df['Gesamtwachstum_%'] = ((df['Baumbestand'] / startbestand) - 1) * 100
-
-# Plots
-st.subheader("📈 Entwicklung des Baumbestands")
-
-fig, ax = plt.subplots(figsize=(10, 5))
-
-lineare_entwicklung = startbestand + (df['Monat'] - 1) * monatliche_zugaenge
-lineares_endbestandsziel = lineare_entwicklung.iloc[-1]
-
-ax.plot(
-    df['Datum'],
-    df['Baumbestand'],
-    color='seagreen',
-    marker='$\u2618$',
-    markersize=10,
-    markerfacecolor='forestgreen',
-    markeredgecolor='forestgreen',
-    linewidth=2,
-    label='Prognose mit Wachstum'
-)
+prognoseparameter = st.session_state.get('prognoseparameter')
+if prognoseparameter is None:
+    st.info("Bitte füllen Sie die Pflichtfelder links aus und starten Sie die Prognose.")
+    st.stop()
 
-ax.plot(
-    df['Datum'],
-    lineare_entwicklung,
-    color='black',
-    linewidth=2,
-    linestyle='--',
-    label='Lineare Entwicklung (ohne Zinseszins)'
+# Berechnungen
+ergebnis_cache = _ergebnis_cache()
+ergebnis = ergebnis_cache.hole_oder_berechne(prognoseparameter, lambda: _berechne_ergebnis(*prognoseparameter))
+st.sidebar.caption(
+    f"Cache: {len(ergebnis_cache)} Einträge, Trefferquote {ergebnis_cache.trefferquote:.0%} "
+    f"({ergebnis_cache.treffer} von {ergebnis_cache.anfragen} Anfragen)"
 )
 
-ax.set_xlabel("Datum")
-ax.set_ylabel("Anzahl Bäume")
-ax.set_title("Monatliche Baumbestandsentwicklung")
-ax.grid(True)
-ax.legend()
-
-st.pyplot(fig)
-
-# Statistiken
-st.subheader("📊 Statistische Kennzahlen")
-end_bestand = df['Baumbestand'].iloc[-1]
-zinseszinseffekt = end_bestand - lineares_endbestandsziel
-zinseszinseffekt_nach_steuer = zinseszinseffekt * (1 - ABGELTUNGSSTEUER_SATZ)
-gesamtwachstum = end_bestand - startbestand
-gesamtwachstum_prozent = ((end_bestand / startbestand) - 1) * 100
-zinseszinseffekt_anteil_prozent = (zinseszinseffekt / end_bestand) * 100 if end_bestand else 0
-zinseszinseffekt_anteil_nach_steuer_prozent = zinseszinseffekt_anteil_prozent * (1 - ABGELTUNGSSTEUER_SATZ)
-
-st.markdown(f"- **Startbestand:** {startbestand:,} Bäume")
-st.markdown(f"- **Endbestand:** {end_bestand:,.0f} Bäume")
-st.markdown(f"- **Gesamtwachstum:** {gesamtwachstum:,.0f} Bäume ({gesamtwachstum_prozent:.2f}%)")
-st.markdown(
-    f"- **Zusätzlicher Ertrag durch Zinseszins (vor Steuer):** {zinseszinseffekt:,.0f} Bäume "
-    f"({zinseszinseffekt_anteil_prozent:.2f}% des Endbestands)"
-)
-st.markdown(
-    f"- **Anteil Kapitalertrag nach Abgeltungssteuer ({ABGELTUNGSSTEUER_SATZ:.0%}):** "
-    f"{zinseszinseffekt_anteil_nach_steuer_prozent:.2f}%"
-)
-st.markdown(f"- **Durchschnittlicher monatlicher Zuwachs:** {df['Monatlicher_Zuwachs'].mean():,.0f} Bäume")
-
-# Verteilung des Endbestands
-st.subheader("🥧 Anteil des Zinseszinseffekts am Endbestand")
-rest_bestand = end_bestand - zinseszinseffekt
-fig_pie, ax_pie = plt.subplots(figsize=(6, 6))
-ax_pie.pie(
-    [rest_bestand, zinseszinseffekt],
-    labels=["Lineare Entwicklung", "Zinseszinseffekt"],
-    autopct="%1.1f%%",
-    startangle=90,
-    colors=["#a3c9a8", "#2e7d32"],
-    explode=(0, 0.05),
-)
-ax_pie.axis('equal')
-st.pyplot(fig_pie)
+# Jeder Abschnitt ist ein eigenes Fragment: Anzeigeoptionen lösen nur den Neulauf ihres Abschnitts aus
+_zeige_bestandsentwicklung(ergebnis)
+_zeige_kennzahlen(ergebnis, prognoseparameter[0])
+_zeige_anteil(ergebnis)
+_zeige_sensitivitaet(ergebnis)
@@ -0,0 +1,64 @@
+"""
+Begrenzter LRU-Cache mit Ablaufzeit für Prognoseergebnisse.
+
+Der Cache ist threadsicher, damit eine einzige Instanz von allen Sitzungen
+des Streamlit-Servers gemeinsam genutzt werden kann.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ErgebnisCache:
+    def __init__(self, max_eintraege=128, ttl_sekunden=3600.0, zeitgeber=time.monotonic):
+        if max_eintraege < 1:
+            raise ValueError("max_eintraege muss mindestens 1 betragen.")
+        self.max_eintraege = max_eintraege
+        self.ttl_sekunden = ttl_sekunden
+        self._zeitgeber = zeitgeber
+        self._eintraege = OrderedDict()
+        self._sperre = threading.Lock()
+        self.treffer = 0
+        self.fehlschlaege = 0
+
+    def hole_oder_berechne(self, schluessel, berechnung):
+        """
+        Liefert den gespeicherten Wert zu schluessel oder berechnet und speichert ihn
+
+        Returns:
+            object: Ergebnis von berechnung() bzw. der gespeicherte Wert
+        """
+        jetzt = self._zeitgeber()
+        with self._sperre:
+            eintrag = self._eintraege.get(schluessel)
+            if eintrag is not None and jetzt - eintrag[0] <= self.ttl_sekunden:
+                self._eintraege.move_to_end(schluessel)
+                self.treffer += 1
+                return eintrag[1]
+            self.fehlschlaege += 1
+
+        # Berechnung außerhalb der Sperre, damit andere Sitzungen nicht blockiert werden
+        wert = berechnung()
+        with self._sperre:
+            self._eintraege[schluessel] = (self._zeitgeber(), wert)
+            self._eintraege.move_to_end(schluessel)
+            while len(self._eintraege) > self.max_eintraege:
+                self._eintraege.popitem(last=False)
+        return wert
+
+    def leeren(self):
+        with self._sperre:
+            self._eintraege.clear()
+            self.treffer = 0
+            self.fehlschlaege = 0
+
+    @property
+    def anfragen(self):
+        return self.treffer + self.fehlschlaege
+
+    @property
+    def trefferquote(self):
+        return self.treffer / self.anfragen if self.anfragen else 0.0
+
+    def __len__(self):
+        return len(self._eintraege)
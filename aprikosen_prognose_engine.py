@@ -0,0 +1,650 @@
+"""
+Gemeinsame Berechnungslogik für die Aprikosenbäume-Prognose.
+
+Die monatliche Rekursion
+
+    Neuer Bestand = Vorheriger Bestand × Monatlicher Wachstumsfaktor + Monatliche Zugänge
+
+besitzt die geschlossene Form
+
+    Bestand_k = Startbestand × f^k + Zugänge × (f^k - 1) / (f - 1)
+
+und wird deshalb in einem einzigen NumPy-Durchlauf für alle Monate berechnet.
+Für sehr lange Zeiträume oder hohe Wachstumsraten steht zusätzlich eine
+Berechnung im Logarithmus zur Verfügung, die nicht überläuft.
+
+Ändern sich Zugänge oder Wachstum im Zeitverlauf (Zeitpläne), gilt allgemein
+
+    Bestand_k = P_k × (Startbestand + Σ_{j<k} Zugänge_j / P_{j+1}),   P_k = Π_{j<k} f_j
+
+was sich mit kumulierten Summen ebenfalls ohne Schleife über die Monate auswerten lässt.
+"""
+import numpy as np
+import pandas as pd
+
+from aprikosen_parallel import erstelle_ergebnisspeicher, fuehre_aufgaben_aus
+
+# Bei jeder Änderung der Rechenregeln erhöhen; vorberechnete Ergebnisse gelten dann als veraltet
+MODELLVERSION = 1
+SZENARIO_BLOCKGROESSE = 4_096
+
+
+def berechne_wachstumsfaktor(jaehrliches_wachstum_prozent):
+    """Rechnet ein jährliches Wachstum in Prozent in den monatlichen Wachstumsfaktor um"""
+    return (1 + jaehrliches_wachstum_prozent / 100) ** (1 / 12)
+
+
+def _geometrische_summe(wachstum, exponent):
+    # ((1 + g)^k - 1) / g, numerisch stabil auch für sehr kleine g; g == 0 ergibt k
+    ohne_wachstum = wachstum == 0
+    divisor = np.where(ohne_wachstum, 1.0, wachstum)
+    return np.where(ohne_wachstum, exponent, np.expm1(exponent * np.log1p(wachstum)) / divisor)
+
+
+def berechne_bestand(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate):
+    """
+    Berechnet den ungerundeten Baumbestand nach einer beliebigen Anzahl von Monaten
+
+    Alle Argumente sind gegenseitig broadcastbar; monate = 0 ergibt den Startbestand.
+
+    Returns:
+        np.ndarray: Bestand nach monate Monaten (float64)
+    """
+    faktor = np.asarray(monatlicher_wachstumsfaktor, dtype=np.float64)
+    monate = np.asarray(monate, dtype=np.float64)
+    potenz = np.power(faktor, monate)
+    return startbestand * potenz + monatliche_zugaenge * _geometrische_summe(faktor - 1, monate)
+
+
+def berechne_log_bestand(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate):
+    """
+    Berechnet den natürlichen Logarithmus des Bestands ohne Überlauf
+
+    Für f > 1 wird B_k = f^k × (S + Z × (1 - f^-k) / (f - 1)) genutzt: Der
+    Klammerausdruck ist beschränkt, und f^k geht nur als k × log f ein. Für
+    f <= 1 ist der Bestand durch S + k × Z beschränkt und wird direkt berechnet.
+
+    Returns:
+        np.ndarray: log(Bestand) nach monate Monaten (-inf für Bestand 0)
+    """
+    startbestand, monatliche_zugaenge, faktor, monate = np.broadcast_arrays(*(
+        np.asarray(wert, dtype=np.float64)
+        for wert in (startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate)
+    ))
+    wachstum = faktor - 1
+    wachsend = wachstum > 0
+    log_faktor = np.log1p(np.where(wachsend, wachstum, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        klammer = startbestand - monatliche_zugaenge * np.expm1(-monate * log_faktor) / np.where(wachsend, wachstum, 1.0)
+        log_wachsend = monate * log_faktor + np.log(klammer)
+        log_direkt = np.log(berechne_bestand(
+            startbestand, monatliche_zugaenge, np.where(wachsend, 1.0, faktor), monate
+        ))
+    return np.where(wachsend, log_wachsend, log_direkt)
+
+
+def berechne_bestand_ohne_ueberlauf(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate):
+    """
+    Wie berechne_bestand, aber ohne Überlaufwarnungen und NaN
+
+    Darstellbare Werte stammen unverändert aus berechne_bestand; wo die direkte
+    Formel überläuft, wird über berechne_log_bestand inf geliefert.
+
+    Returns:
+        np.ndarray: Bestand nach monate Monaten (float64, inf jenseits von float64)
+    """
+    with np.errstate(over='ignore', invalid='ignore'):
+        direkt = berechne_bestand(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate)
+        if np.all(np.isfinite(direkt)):
+            return direkt
+        return np.where(np.isfinite(direkt), direkt, np.exp(berechne_log_bestand(
+            startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate
+        )))
+
+
+def schaetze_relative_genauigkeit(log_bestand, monate):
+    """
+    Schätzt den relativen Rundungsfehler des Bestands in float64
+
+    Der gerundete Wachstumsfaktor geht k-fach in log B ein, und ein Fehler von
+    einigen ulp im Logarithmus wird beim Potenzieren zu einem relativen Fehler
+    proportional zu |log B|.
+
+    Returns:
+        np.ndarray: Geschätzter relativer Fehler des Bestands
+    """
+    log_bestand = np.abs(np.nan_to_num(log_bestand, posinf=0.0, neginf=0.0))
+    return np.finfo(np.float64).eps * (4 + log_bestand + np.asarray(monate, dtype=np.float64))
+
+
+def runde_bestand(werte):
+    """Rundet Bestandswerte auf ganze Bäume; int64 nur, solange alle Werte darstellbar sind"""
+    gerundet = np.rint(werte)
+    if np.all(np.isfinite(gerundet)) and np.all(np.abs(gerundet) < 2.0 ** 63):
+        return gerundet.astype(np.int64)
+    return gerundet
+
+
+def berechne_bestandsreihe(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate_gesamt):
+    """
+    Berechnet den ungerundeten Baumbestand zu Beginn jedes Prognosemonats
+
+    Skalare Parameter ergeben eine einzelne Reihe; eindimensionale Arrays
+    (gegenseitig broadcastbar) ergeben eine Matrix mit einer Zeile pro Szenario.
+
+    Returns:
+        np.ndarray: Bestand für die Monate 1 bis monate_gesamt (float64),
+            Form (monate_gesamt,) bzw. (Szenarien, monate_gesamt)
+    """
+    return berechne_bestand(
+        np.asarray(startbestand, dtype=np.float64)[..., None],
+        np.asarray(monatliche_zugaenge, dtype=np.float64)[..., None],
+        np.asarray(monatlicher_wachstumsfaktor, dtype=np.float64)[..., None],
+        np.arange(monate_gesamt, dtype=np.float64),
+    )
+
+
+def berechne_projektion(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate_gesamt):
+    """
+    Berechnet die monatliche Projektion als Spalten-Arrays
+
+    Returns:
+        dict[str, np.ndarray]: Spalten 'Monat', 'Baumbestand' und 'Monatlicher_Zuwachs'
+    """
+    bestand = berechne_bestandsreihe(
+        startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate_gesamt
+    )
+    zuwachs = bestand * (monatlicher_wachstumsfaktor - 1) + monatliche_zugaenge
+    return {
+        'Monat': np.arange(1, monate_gesamt + 1, dtype=np.int64),
+        'Baumbestand': runde_bestand(bestand),
+        'Monatlicher_Zuwachs': runde_bestand(zuwachs),
+    }
+
+
+def erstelle_stufenplan(monate_gesamt, stufen, anfangswert=0.0):
+    """
+    Erstellt einen Monatsplan aus Stufen, die jeweils ab einem Prognosemonat gelten
+
+    Args:
+        stufen: Paare (ab_monat, wert) oder dict ab_monat -> wert; Monate vor
+            der ersten Stufe erhalten anfangswert
+
+    Returns:
+        np.ndarray: Wert je Prognosemonat 1 bis monate_gesamt
+    """
+    stufen = sorted(dict(stufen).items())
+    ab_monat = np.array([monat for monat, _ in stufen], dtype=np.int64)
+    werte = np.array([anfangswert] + [wert for _, wert in stufen], dtype=np.float64)
+    return werte[np.searchsorted(ab_monat, np.arange(1, monate_gesamt + 1), side='right')]
+
+
+def erstelle_saisonplan(monate_gesamt, profil, startdatum):
+    """
+    Wiederholt ein Jahresprofil (Januar bis Dezember) über alle Prognosemonate
+
+    Returns:
+        np.ndarray: Wert des jeweiligen Kalendermonats je Prognosemonat
+    """
+    profil = np.asarray(profil, dtype=np.float64)
+    if profil.shape != (12,):
+        raise ValueError("Ein Saisonprofil benötigt genau 12 Monatswerte.")
+    return profil[(pd.Timestamp(startdatum).month - 1 + np.arange(monate_gesamt)) % 12]
+
+
+def berechne_planreihe(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate_gesamt):
+    """
+    Berechnet den ungerundeten Bestand für zeitlich veränderliche Zugänge und Wachstumsfaktoren
+
+    Zeitpläne haben die Monate in der letzten Achse; Eintrag k gilt für den
+    Schritt von Monat k + 1 zu Monat k + 2, der letzte Eintrag wirkt also erst
+    nach dem Prognosezeitraum. Skalare gelten für alle Monate, je Szenario
+    konstante Werte werden als Spalte (Szenarien, 1) übergeben. Produkt und
+    Summe der allgemeinen Lösung werden als kumulierte Summen im Logarithmus
+    berechnet. Anders als in der geschlossenen Form wird nicht durch f - 1
+    geteilt; Abschnitte mit f = 1 (0 % Wachstum) ergeben ohne Sonderfall
+    exakt S + Z × k.
+
+    Returns:
+        np.ndarray: Bestand für die Monate 1 bis monate_gesamt (float64),
+            Form (monate_gesamt,) bzw. (Szenarien, monate_gesamt)
+    """
+    startbestand = np.asarray(startbestand, dtype=np.float64)[..., None]
+    zugaenge, faktor = np.broadcast_arrays(
+        np.asarray(monatliche_zugaenge, dtype=np.float64),
+        np.asarray(monatlicher_wachstumsfaktor, dtype=np.float64),
+    )
+    form = np.broadcast_shapes(startbestand.shape[:-1] + (monate_gesamt,), zugaenge.shape[:-1] + (monate_gesamt,))
+    zugaenge = np.broadcast_to(zugaenge if zugaenge.ndim else zugaenge[None], form)
+    faktor = np.broadcast_to(faktor if faktor.ndim else faktor[None], form)
+
+    # log P_k = Σ_{j<k} log f_j für k = 0 .. monate_gesamt - 1
+    log_potenz = np.zeros(form)
+    np.cumsum(np.log(faktor[..., :-1]), axis=-1, out=log_potenz[..., 1:])
+    with np.errstate(over='ignore', under='ignore', invalid='ignore'):
+        abgezinst = np.zeros(form)
+        np.cumsum(zugaenge[..., :-1] * np.exp(-log_potenz[..., 1:]), axis=-1, out=abgezinst[..., 1:])
+        return np.exp(log_potenz) * (startbestand + abgezinst)
+
+
+def berechne_planprojektion(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate_gesamt):
+    """
+    Monatliche Projektion wie berechne_projektion, aber mit Zeitplänen für Zugänge und Wachstum
+
+    Returns:
+        dict[str, np.ndarray]: Spalten 'Monat', 'Baumbestand' und 'Monatlicher_Zuwachs'
+    """
+    bestand = berechne_planreihe(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate_gesamt)
+    zugaenge, faktor = (
+        np.broadcast_to(np.asarray(wert, dtype=np.float64), bestand.shape)
+        for wert in (monatliche_zugaenge, monatlicher_wachstumsfaktor)
+    )
+    return {
+        'Monat': np.arange(1, monate_gesamt + 1, dtype=np.int64),
+        'Baumbestand': runde_bestand(bestand),
+        'Monatlicher_Zuwachs': runde_bestand(bestand * (faktor - 1) + zugaenge),
+    }
+
+
+def berechne_jahresprojektion(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, prognosejahre):
+    """
+    Berechnet die Projektion in Jahresauflösung ohne Monatswerte und ohne Überlauf
+
+    Jede Zeile entspricht der Monatszeile Monat = 12 × Prognosejahr; der
+    monatliche Zuwachs ist der Durchschnitt der zwölf Monate des Jahres, sodass
+    sein Mittelwert dem der Monatsprojektion entspricht. Werte jenseits von
+    float64 ergeben inf, der Logarithmus bleibt endlich.
+
+    Returns:
+        dict[str, np.ndarray]: Spalten 'Prognosejahr', 'Monat', 'Baumbestand',
+            'Log10_Baumbestand', 'Monatlicher_Zuwachs' und 'Relative_Genauigkeit'
+    """
+    jahre = np.arange(1, prognosejahre + 1, dtype=np.int64)
+    monate = np.arange(prognosejahre + 1) * 12 - 1
+    log_bestand = berechne_log_bestand(startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, monate)
+    log_jahresende = berechne_log_bestand(
+        startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, np.arange(prognosejahre + 1) * 12
+    )
+    with np.errstate(over='ignore', invalid='ignore'):
+        jahresende = np.exp(log_jahresende)
+        zuwachs = (jahresende[1:] - jahresende[:-1]) / 12
+        bestand = np.exp(log_bestand[1:])
+    return {
+        'Prognosejahr': jahre,
+        'Monat': jahre * 12,
+        'Baumbestand': runde_bestand(bestand),
+        'Log10_Baumbestand': log_bestand[1:] / np.log(10),
+        'Monatlicher_Zuwachs': runde_bestand(zuwachs),
+        'Relative_Genauigkeit': schaetze_relative_genauigkeit(log_bestand[1:], monate[1:]),
+    }
+
+
+def _berechne_szenarioblock(ziel, start, startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor):
+    ziel[start:start + len(startbestand)] = np.rint(berechne_bestandsreihe(
+        startbestand, monatliche_zugaenge, monatlicher_wachstumsfaktor, ziel.shape[1]
+    ))
+
+
+def berechne_szenarien(startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre,
+                       langformat=False, max_worker=1, block_groesse=SZENARIO_BLOCKGROESSE):
+    """
+    Berechnet beliebig viele Szenarien gleichzeitig als (Szenario × Monat)-Matrix
+
+    Die Parameter werden gegenseitig gebroadcastet, sodass skalare Werte für
+    alle Szenarien gelten. Für ein vollständiges Raster können die Arrays z. B.
+    mit np.meshgrid(...) und .ravel() erzeugt werden. Die Szenarien werden in
+    Blöcken zu block_groesse berechnet, bei max_worker > 1 (None = alle Kerne)
+    parallel in einem Prozesspool.
+
+    Returns:
+        pd.DataFrame: Eine Zeile pro Szenario mit Parametern, Endbestand und
+            Gesamtwachstum; mit langformat=True eine Zeile pro Szenario und Monat
+    """
+    startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(startbestand, dtype=np.float64)),
+        np.atleast_1d(np.asarray(monatliche_zugaenge, dtype=np.float64)),
+        np.atleast_1d(np.asarray(jaehrliches_wachstum_prozent, dtype=np.float64)),
+    )
+    monate_gesamt = prognosejahre * 12
+    monatlicher_wachstumsfaktor = berechne_wachstumsfaktor(jaehrliches_wachstum_prozent)
+    anzahl_szenarien = len(startbestand)
+
+    with erstelle_ergebnisspeicher((anzahl_szenarien, monate_gesamt), np.float64, max_worker) as speicher:
+        aufgaben = [
+            (
+                start,
+                startbestand[start:start + block_groesse],
+                monatliche_zugaenge[start:start + block_groesse],
+                monatlicher_wachstumsfaktor[start:start + block_groesse],
+            )
+            for start in range(0, anzahl_szenarien, block_groesse)
+        ]
+        fuehre_aufgaben_aus(_berechne_szenarioblock, aufgaben, speicher, max_worker)
+        bestand = speicher.als_array()
+
+    if langformat:
+        return pd.DataFrame({
+            'Szenario': np.repeat(np.arange(anzahl_szenarien), monate_gesamt),
+            'Monat': np.tile(np.arange(1, monate_gesamt + 1), anzahl_szenarien),
+            'Baumbestand': bestand.ravel(),
+        })
+
+    end_bestand = bestand[:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gesamtwachstum_prozent = (end_bestand / startbestand - 1) * 100
+    return pd.DataFrame({
+        'Startbestand': startbestand,
+        'Monatliche_Zugaenge': monatliche_zugaenge,
+        'Jaehrliches_Wachstum_Prozent': jaehrliches_wachstum_prozent,
+        'Endbestand': end_bestand,
+        'Gesamtwachstum_Prozent': gesamtwachstum_prozent,
+    }).rename_axis('Szenario')
+
+
+def iteriere_szenarien(startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre,
+                       block_groesse=SZENARIO_BLOCKGROESSE):
+    """
+    Liefert die Monatswerte vieler Szenarien blockweise im Langformat
+
+    Es liegt immer nur ein Block im Speicher; die Szenarionummern zählen über
+    alle Blöcke durch, sodass die aneinandergehängten Blöcke dem Langformat
+    von berechne_szenarien entsprechen.
+
+    Yields:
+        pd.DataFrame: Spalten 'Szenario', 'Monat' und 'Baumbestand' für bis zu block_groesse Szenarien
+    """
+    startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(startbestand, dtype=np.float64)),
+        np.atleast_1d(np.asarray(monatliche_zugaenge, dtype=np.float64)),
+        np.atleast_1d(np.asarray(jaehrliches_wachstum_prozent, dtype=np.float64)),
+    )
+    for start in range(0, len(startbestand), block_groesse):
+        block = berechne_szenarien(
+            startbestand[start:start + block_groesse],
+            monatliche_zugaenge[start:start + block_groesse],
+            jaehrliches_wachstum_prozent[start:start + block_groesse],
+            prognosejahre,
+            langformat=True,
+            block_groesse=block_groesse,
+        )
+        block['Szenario'] += start
+        yield block
+
+
+# Feste deutsche Monatsnamen, unabhängig von der Locale des Prozesses
+MONATSNAMEN = ('Januar', 'Februar', 'März', 'April', 'Mai', 'Juni', 'Juli', 'August', 'September', 'Oktober',
+               'November', 'Dezember')
+
+
+def _kalender_fuer_monate(startdatum, monatsindex):
+    # Kalenderspalten für beliebige (nullbasierte) Monatsindizes ab startdatum
+    startdatum = pd.Timestamp(startdatum)
+    monatsindex = np.asarray(monatsindex, dtype=np.int64)
+    monate = pd.PeriodIndex.from_ordinals(startdatum.to_period('M').ordinal + monatsindex, freq='M')
+    tag = np.minimum(startdatum.day, monate.days_in_month)
+    datum = (
+        monate.to_timestamp()
+        + pd.to_timedelta(np.asarray(tag) - 1, unit='D')
+        + (startdatum - startdatum.normalize())
+    )
+    return pd.DataFrame({
+        'Datum': datum,
+        'Prognosejahr': monatsindex // 12 + 1,
+        'Prognose_Monat': monatsindex % 12 + 1,
+        'Kalenderjahr': monate.year,
+        'Kalendermonat': monate.month,
+        'Monatsname': np.char.add(
+            np.asarray(MONATSNAMEN)[np.asarray(monate.month) - 1], ' ' + np.asarray(monate.year).astype(str)
+        ).astype(object),
+    })
+
+
+def erstelle_kalender(startdatum, monate_gesamt):
+    """
+    Erstellt alle Kalenderspalten der Prognose in einem vektorisierten Schritt
+
+    Das Datum von Monat k entspricht startdatum + pd.DateOffset(months=k - 1),
+    d. h. der Stichtag wird beibehalten und bei kürzeren Monaten auf das
+    Monatsende begrenzt.
+
+    Returns:
+        pd.DataFrame: Spalten 'Datum', 'Prognosejahr', 'Prognose_Monat',
+            'Kalenderjahr', 'Kalendermonat' und 'Monatsname' (z. B. 'März 2025')
+    """
+    return _kalender_fuer_monate(startdatum, np.arange(monate_gesamt))
+
+
+GRANULARITAETEN = ('Quartal', 'Prognosejahr', 'Kalenderjahr')
+
+
+def berechne_periodenwerte(bestand, startbestand, monatliche_zugaenge, startdatum=None):
+    """
+    Verdichtet Monatsbestände in einem Durchgang zu Quartalen, Prognose- und Kalenderjahren
+
+    bestand enthält die Monatszeilen 1 bis M (Zeile 1 = Startbestand) für ein
+    Szenario, Form (M,), oder für mehrere Szenarien, Form (Szenarien, M).
+    Startbestand und Zugänge werden je Szenario übergeben (broadcastbar). Da
+    alle Perioden zusammenhängende Monatsblöcke sind, ergeben sich sämtliche
+    Kennzahlen aus den Beständen an den Periodenenden; der Vorperiodenwert der
+    ersten Periode ist der Startbestand. Kalenderjahre benötigen startdatum.
+
+    Returns:
+        dict[str, pd.DataFrame]: Je Granularität die Spalten ('Szenario',)
+            'Periode', 'Monat', 'Anzahl_Monate', ('Datum',) 'Baumbestand',
+            'Perioden_Zuwachs', 'Wachstum_Prozent', 'Perioden_Zugaenge',
+            'Kumulierte_Zugaenge', 'Zinseszinsanteil_Prozent' und 'Gesamtzuwachs'
+    """
+    bestand = np.asarray(bestand)
+    mehrere = bestand.ndim == 2
+    bestand = np.atleast_2d(bestand)
+    anzahl_szenarien, monate_gesamt = bestand.shape
+    # Ganzzahlige Bestände behalten für den Gesamtzuwachs ihren Typ
+    startbestand = np.broadcast_to(np.asarray(startbestand), (anzahl_szenarien,))[:, None]
+    monatliche_zugaenge = np.broadcast_to(
+        np.asarray(monatliche_zugaenge, dtype=np.float64), (anzahl_szenarien,)
+    )[:, None]
+
+    monatsindex = np.arange(monate_gesamt)
+    kalender = None if startdatum is None else _kalender_fuer_monate(startdatum, monatsindex)
+    perioden = {'Quartal': monatsindex // 3 + 1, 'Prognosejahr': monatsindex // 12 + 1}
+    if kalender is not None:
+        perioden['Kalenderjahr'] = kalender['Kalenderjahr'].to_numpy()
+
+    ergebnis = {}
+    for granularitaet, periode in perioden.items():
+        # Letzte Monatszeile jeder Periode; die Vorperiode der ersten ist der Startbestand
+        ende = np.flatnonzero(np.append(periode[1:] != periode[:-1], True))
+        vorher = np.concatenate([[0], ende[:-1]])
+        end_bestand = bestand[:, ende].astype(np.float64)
+        vor_bestand = np.concatenate([startbestand.astype(np.float64), end_bestand[:, :-1]], axis=1)
+        zuwachs = end_bestand - vor_bestand
+        # Zeile m enthält m - 1 Zugänge
+        zugaenge = monatliche_zugaenge * (ende - vorher)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wachstum_prozent = (end_bestand / vor_bestand - 1) * 100
+            zinseszinsanteil = np.where(zuwachs != 0, (zuwachs - zugaenge) / zuwachs * 100, 0.0)
+
+        anzahl_perioden = len(ende)
+        tabelle = {}
+        if mehrere:
+            tabelle['Szenario'] = np.repeat(np.arange(anzahl_szenarien), anzahl_perioden)
+        tabelle['Periode'] = np.tile(periode[ende], anzahl_szenarien)
+        tabelle['Monat'] = np.tile(ende + 1, anzahl_szenarien)
+        tabelle['Anzahl_Monate'] = np.tile(np.diff(np.concatenate([[-1], ende])), anzahl_szenarien)
+        if kalender is not None:
+            tabelle['Datum'] = np.tile(kalender['Datum'].to_numpy()[ende], anzahl_szenarien)
+        tabelle.update({
+            'Baumbestand': bestand[:, ende].ravel(),
+            'Perioden_Zuwachs': zuwachs.ravel(),
+            'Wachstum_Prozent': wachstum_prozent.ravel(),
+            'Perioden_Zugaenge': zugaenge.ravel(),
+            'Kumulierte_Zugaenge': (monatliche_zugaenge * ende).ravel(),
+            'Zinseszinsanteil_Prozent': zinseszinsanteil.ravel(),
+            'Gesamtzuwachs': (bestand[:, ende] - startbestand).ravel(),
+        })
+        ergebnis[granularitaet] = pd.DataFrame(tabelle)
+    return ergebnis
+
+
+def kompaktiere_frame(df, konstante_spalten=(), float_toleranz=0.0):
+    """
+    Verkleinert einen Ergebnis-DataFrame ohne Informationsverlust
+
+    Ganzzahlige Spalten werden auf int32 verkleinert, sofern alle Werte
+    hineinpassen; float64-Spalten nur dann auf float32, wenn die relative
+    Abweichung höchstens float_toleranz beträgt (Standard: nur exakt
+    darstellbare Werte). Text wird kategorial, sofern sich Werte wiederholen
+    (höchstens halb so viele Kategorien wie Zeilen), und die angegebenen konstanten
+    Spalten wandern mit ihrem Wert in df.attrs['konstanten'].
+
+    Returns:
+        pd.DataFrame: Kompakter Frame; expandiere_frame stellt die ursprünglichen Spalten wieder her
+    """
+    konstanten = {}
+    for spalte in konstante_spalten:
+        werte = df[spalte].unique()
+        if len(werte) != 1:
+            raise ValueError(f"Spalte {spalte} ist nicht konstant und kann nicht in die Metadaten ausgelagert werden.")
+        konstanten[spalte] = werte[0].item() if hasattr(werte[0], 'item') else werte[0]
+
+    int32 = np.iinfo(np.int32)
+    spalten = {}
+    for spalte in df.columns:
+        if spalte in konstanten:
+            continue
+        werte = df[spalte]
+        if pd.api.types.is_integer_dtype(werte.dtype) and werte.dtype.itemsize > 4:
+            if len(werte) == 0 or (werte.min() >= int32.min and werte.max() <= int32.max):
+                werte = werte.astype(np.int32)
+        elif werte.dtype == np.float64:
+            verkleinert = werte.astype(np.float32)
+            with np.errstate(invalid='ignore', over='ignore'):
+                abweichung = np.abs(verkleinert.to_numpy(np.float64) - werte.to_numpy())
+                if np.all(np.isfinite(verkleinert) == np.isfinite(werte)) and np.all(
+                    abweichung[np.isfinite(abweichung)] <= float_toleranz * np.abs(werte.to_numpy()[np.isfinite(abweichung)])
+                ):
+                    werte = verkleinert
+        elif werte.dtype == object or pd.api.types.is_string_dtype(werte.dtype):
+            # Bei fast lauter verschiedenen Werten wäre die Kategorie größer als der Text
+            if werte.nunique(dropna=False) <= len(werte) // 2:
+                werte = werte.astype('category')
+        spalten[spalte] = werte
+
+    kompakt = pd.DataFrame(spalten, index=df.index)
+    kompakt.attrs = {**df.attrs, 'konstanten': konstanten, 'spaltenreihenfolge': list(df.columns)}
+    return kompakt
+
+
+def expandiere_frame(df):
+    """Fügt die mit kompaktiere_frame ausgelagerten konstanten Spalten wieder an ihrer Position ein"""
+    konstanten = df.attrs.get('konstanten', {})
+    if not konstanten:
+        return df
+    expandiert = df.assign(**konstanten)
+    expandiert = expandiert[[spalte for spalte in df.attrs['spaltenreihenfolge'] if spalte in expandiert.columns]]
+    expandiert.attrs = {}
+    return expandiert
+
+
+def vergleiche_speicherbedarf(vorher, nachher):
+    """
+    Stellt den Speicherbedarf je Spalte vor und nach der Kompaktierung gegenüber
+
+    Returns:
+        pd.DataFrame: Je Spalte 'Dtype_vorher', 'Dtype_nachher', 'Bytes_vorher'
+            und 'Bytes_nachher' sowie eine Zeile 'Gesamt'
+    """
+    bytes_vorher = vorher.memory_usage(index=False, deep=True)
+    bytes_nachher = nachher.memory_usage(index=False, deep=True).reindex(vorher.columns, fill_value=0)
+    bericht = pd.DataFrame({
+        'Dtype_vorher': vorher.dtypes.astype(str),
+        'Dtype_nachher': nachher.dtypes.astype(str).reindex(vorher.columns, fill_value='Metadaten'),
+        'Bytes_vorher': bytes_vorher,
+        'Bytes_nachher': bytes_nachher,
+    })
+    bericht.loc['Gesamt'] = ['', '', bytes_vorher.sum(), bytes_nachher.sum()]
+    return bericht
+
+
+class Projektion:
+    """
+    Kompaktes Prognoseergebnis: Parameter und Bestand zu jedem Jahresstichtag
+
+    Monatswerte werden nicht vorgehalten, sondern bei Bedarf für beliebige
+    Monatsbereiche aus der geschlossenen Form berechnet; erst monatswerte()
+    erzeugt einen DataFrame. Gegenüber der vollständigen Monatstabelle sinkt
+    der Speicherbedarf damit um mehr als den Faktor 12.
+    """
+
+    def __init__(self, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre,
+                 startdatum=None):
+        self.startbestand = startbestand
+        self.monatliche_zugaenge = monatliche_zugaenge
+        self.jaehrliches_wachstum_prozent = jaehrliches_wachstum_prozent
+        self.prognosejahre = prognosejahre
+        self.startdatum = None if startdatum is None else pd.Timestamp(startdatum)
+        self.monatlicher_wachstumsfaktor = berechne_wachstumsfaktor(jaehrliches_wachstum_prozent)
+        self.monate_gesamt = prognosejahre * 12
+        # Bestand in der letzten Monatszeile jedes Prognosejahres (Monat = 12 × Jahr)
+        self.jahresstichtage = self.bestand(np.arange(1, prognosejahre + 1) * 12)
+
+    def bestand(self, monat):
+        """Ungerundeter Bestand in der Zeile Monat (1 bis monate_gesamt); Arrays erlaubt"""
+        return berechne_bestand(
+            self.startbestand,
+            self.monatliche_zugaenge,
+            self.monatlicher_wachstumsfaktor,
+            np.asarray(monat, dtype=np.float64) - 1,
+        )
+
+    @property
+    def endbestand(self):
+        return self.jahresstichtage[-1]
+
+    def monatswerte(self, von=1, bis=None, kompakt=False):
+        """
+        Materialisiert die Monate von bis bis (einschließlich) als DataFrame
+
+        Mit kompakt=True wird der Frame mit kompaktiere_frame verkleinert.
+
+        Returns:
+            pd.DataFrame: Spalten wie berechne_projektion, ergänzt um die
+                Kalenderspalten aus erstelle_kalender, falls ein Startdatum gesetzt ist
+        """
+        bis = self.monate_gesamt if bis is None else bis
+        if not 1 <= von <= bis <= self.monate_gesamt:
+            raise ValueError(f"Monatsbereich muss zwischen 1 und {self.monate_gesamt} liegen.")
+        monat = np.arange(von, bis + 1, dtype=np.int64)
+        bestand = self.bestand(monat)
+        df = pd.DataFrame({
+            'Monat': monat,
+            'Baumbestand': runde_bestand(bestand),
+            'Monatlicher_Zuwachs': runde_bestand(
+                bestand * (self.monatlicher_wachstumsfaktor - 1) + self.monatliche_zugaenge
+            ),
+        })
+        if self.startdatum is not None:
+            kalender = _kalender_fuer_monate(self.startdatum, monat - 1)
+            df = pd.concat([df[['Monat']], kalender, df.drop(columns='Monat')], axis=1)
+        return kompaktiere_frame(df) if kompakt else df
+
+    def jahreswerte(self):
+        """
+        Bestand zu jedem Jahresstichtag ohne Monatsmaterialisierung
+
+        Returns:
+            pd.DataFrame: 'Prognosejahr', 'Monat', bei gesetztem Startdatum
+                'Kalenderjahr' und 'Datum', sowie 'Baumbestand'
+        """
+        jahre = np.arange(1, self.prognosejahre + 1, dtype=np.int64)
+        df = pd.DataFrame({'Prognosejahr': jahre, 'Monat': jahre * 12})
+        if self.startdatum is not None:
+            kalender = _kalender_fuer_monate(self.startdatum, jahre * 12 - 1)
+            df['Kalenderjahr'] = kalender['Kalenderjahr']
+            df['Datum'] = kalender['Datum']
+        df['Baumbestand'] = runde_bestand(self.jahresstichtage)
+        return df
+
+    def speicherbedarf(self):
+        """Belegter Speicher der vorgehaltenen Werte in Byte"""
+        return self.jahresstichtage.nbytes
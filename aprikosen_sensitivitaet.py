@@ -0,0 +1,112 @@
+"""
+Analytische Sensitivitätsanalyse der Aprikosenbäume-Prognose.
+
+Aus der geschlossenen Form des Endbestands nach k = 12 × Prognosejahre - 1 Monaten
+
+    E = S × f^k + Z × A,   A = (f^k - 1) / (f - 1),   f = (1 + p / 100)^(1/12)
+
+werden die partiellen Ableitungen von Endbestand, Zinseszinseffekt
+(E - (S + k × Z)) und Gesamtwachstum in Prozent ((E / S - 1) × 100) nach
+Startbestand S, monatlichen Zugängen Z, jährlichem Wachstum p und
+Prognosezeitraum (stetig in Jahren) exakt berechnet – ohne zusätzliche
+Simulationsläufe und für beliebig viele Basispunkte gleichzeitig.
+"""
+import numpy as np
+import pandas as pd
+
+from aprikosen_prognose_engine import berechne_wachstumsfaktor
+
+PARAMETER = ('Startbestand', 'Monatliche_Zugaenge', 'Jaehrliches_Wachstum_Prozent', 'Prognosejahre')
+ZIELGROESSEN = ('Endbestand', 'Zinseszinseffekt', 'Gesamtwachstum_Prozent')
+
+
+def _berechne_zielgroessen_und_ableitungen(startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent,
+                                           prognosejahre):
+    s, z, p, t = np.broadcast_arrays(*(
+        np.atleast_1d(np.asarray(wert, dtype=np.float64))
+        for wert in (startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre)
+    ))
+    f = berechne_wachstumsfaktor(p)
+    wachstum = f - 1
+    log_f = np.log1p(p / 100) / 12
+    k = 12 * t - 1
+    potenz = np.exp(k * log_f)
+
+    # A = (f^k - 1) / (f - 1) sowie dA/df und dA/dk, jeweils mit Grenzwert für f = 1
+    ohne_wachstum = wachstum == 0
+    divisor = np.where(ohne_wachstum, 1.0, wachstum)
+    a = np.where(ohne_wachstum, k, np.expm1(k * log_f) / divisor)
+    da_df = np.where(ohne_wachstum, k * (k - 1) / 2, (k * potenz / f - a) / divisor)
+    da_dk = np.where(ohne_wachstum, 1.0, log_f * potenz / divisor)
+
+    end_bestand = s * potenz + z * a
+    zinseszinseffekt = end_bestand - (s + k * z)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gesamtwachstum = (end_bestand / s - 1) * 100
+
+    df_dp = f / (12 * (100 + p))
+    de_dp = (s * k * potenz / f + z * da_df) * df_dp
+    de_dt = 12 * (s * log_f * potenz + z * da_dk)
+
+    werte = np.stack([end_bestand, zinseszinseffekt, gesamtwachstum])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ableitungen = np.stack([
+            np.stack([potenz, a, de_dp, de_dt]),
+            np.stack([potenz - 1, a - k, de_dp, de_dt - 12 * z]),
+            np.stack([-100 * z * a / s ** 2, 100 * a / s, 100 * de_dp / s, 100 * de_dt / s]),
+        ])
+    parameterwerte = np.stack([s, z, p, t])
+    return werte, ableitungen, parameterwerte
+
+
+def berechne_sensitivitaeten(startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre):
+    """
+    Berechnet exakte partielle Ableitungen und Elastizitäten für beliebig viele Basispunkte
+
+    Die Parameter werden gegenseitig gebroadcastet; jeder Eintrag ist ein Basispunkt.
+    Die Elastizität gibt die relative Änderung der Zielgröße je relativer Änderung
+    des Parameters an (∂y/∂x × x / y).
+
+    Returns:
+        pd.DataFrame: Eine Zeile je Basispunkt, Zielgröße und Parameter mit den
+            Spalten 'Basispunkt', 'Zielgroesse', 'Parameter', 'Wert', 'Ableitung'
+            und 'Elastizitaet'
+    """
+    werte, ableitungen, parameterwerte = _berechne_zielgroessen_und_ableitungen(
+        startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre
+    )
+    anzahl_ziele, anzahl_parameter, anzahl_punkte = ableitungen.shape
+    werte_gesamt = np.broadcast_to(werte[:, None, :], ableitungen.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        elastizitaeten = ableitungen * parameterwerte[None, :, :] / werte_gesamt
+
+    return pd.DataFrame({
+        'Basispunkt': np.tile(np.arange(anzahl_punkte), anzahl_ziele * anzahl_parameter),
+        'Zielgroesse': np.repeat(ZIELGROESSEN, anzahl_parameter * anzahl_punkte),
+        'Parameter': np.tile(np.repeat(PARAMETER, anzahl_punkte), anzahl_ziele),
+        'Wert': werte_gesamt.ravel(),
+        'Ableitung': ableitungen.ravel(),
+        'Elastizitaet': elastizitaeten.ravel(),
+    })
+
+
+def berechne_tornado(startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre,
+                     zielgroesse='Endbestand', relative_aenderung=0.1):
+    """
+    Linearisierte Auswirkung einer relativen Parameteränderung (±) auf eine Zielgröße
+
+    Returns:
+        pd.DataFrame: Eine Zeile je Parameter mit 'Basiswert', 'Aenderung_Minus'
+            und 'Aenderung_Plus', absteigend nach Wirkung sortiert
+    """
+    _, ableitungen, parameterwerte = _berechne_zielgroessen_und_ableitungen(
+        startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre
+    )
+    wirkung = ableitungen[ZIELGROESSEN.index(zielgroesse), :, 0] * parameterwerte[:, 0] * relative_aenderung
+    tornado = pd.DataFrame({
+        'Parameter': PARAMETER,
+        'Basiswert': parameterwerte[:, 0],
+        'Aenderung_Minus': -wirkung,
+        'Aenderung_Plus': wirkung,
+    })
+    return tornado.iloc[np.argsort(-np.abs(wirkung), kind='stable')].reset_index(drop=True)
@@ -0,0 +1,187 @@
+"""
+Laufende Monatsstatistiken für große Monte-Carlo-Läufe.
+
+Pfadblöcke (Form: Monate × Pfade) werden nacheinander eingespeist; gespeichert
+werden je Monat nur Anzahl, Mittelwert, Summe der quadrierten Abweichungen
+(Welford/Chan), Minimum, Maximum sowie eine Quantilskizze. Der Speicherbedarf
+ist damit unabhängig von der Anzahl der Pfade.
+
+Die Quantilskizze zählt Werte in logarithmisch gestaffelten Klassen
+(DDSketch-Prinzip): Jedes Quantil wird mit einem relativen Fehler von höchstens
+relative_genauigkeit geschätzt, und zwei Skizzen lassen sich exakt
+zusammenführen. Da alle Monate eine gemeinsame Klasseneinteilung nutzen, wird
+ein ganzer Block mit einem einzigen np.bincount verbucht.
+"""
+import numpy as np
+import pandas as pd
+
+STANDARD_RELATIVE_GENAUIGKEIT = 0.001
+
+
+class LaufendeMonatsstatistik:
+    def __init__(self, monate_gesamt, relative_genauigkeit=STANDARD_RELATIVE_GENAUIGKEIT, rohdaten_pfad=None):
+        if not 0 < relative_genauigkeit < 1:
+            raise ValueError("relative_genauigkeit muss zwischen 0 und 1 liegen.")
+        self.monate_gesamt = monate_gesamt
+        self.relative_genauigkeit = relative_genauigkeit
+        self.rohdaten_pfad = rohdaten_pfad
+
+        self.anzahl = 0
+        self.mittelwert = np.zeros(monate_gesamt)
+        self._abweichungsquadrate = np.zeros(monate_gesamt)
+        self.minimum = np.full(monate_gesamt, np.inf)
+        self.maximum = np.full(monate_gesamt, -np.inf)
+
+        # Quantilskizze: Werte <= 0 separat, positive Werte in Klassen gamma^(i-1) < x <= gamma^i
+        self._log_gamma = np.log((1 + relative_genauigkeit) / (1 - relative_genauigkeit))
+        self._nullwerte = np.zeros(monate_gesamt, dtype=np.int64)
+        self._klassen = np.zeros((monate_gesamt, 0), dtype=np.int64)
+        self._klassen_offset = 0
+
+        if rohdaten_pfad is not None:
+            # Datei leeren; Blöcke werden anschließend angehängt
+            open(rohdaten_pfad, 'wb').close()
+
+    def aktualisiere(self, block):
+        """Verbucht einen Block von Pfaden, Form (Monate, Pfade)"""
+        block = np.asarray(block, dtype=np.float64)
+        if block.ndim != 2 or block.shape[0] != self.monate_gesamt:
+            raise ValueError(f"Block muss die Form ({self.monate_gesamt}, Pfade) haben.")
+        anzahl_block = block.shape[1]
+        if anzahl_block == 0:
+            return
+
+        # Mittelwert und Varianz blockweise zusammenführen (Chan et al.)
+        mittelwert_block = block.mean(axis=1)
+        abweichungsquadrate_block = ((block - mittelwert_block[:, None]) ** 2).sum(axis=1)
+        anzahl_neu = self.anzahl + anzahl_block
+        differenz = mittelwert_block - self.mittelwert
+        self.mittelwert += differenz * anzahl_block / anzahl_neu
+        self._abweichungsquadrate += abweichungsquadrate_block + differenz ** 2 * self.anzahl * anzahl_block / anzahl_neu
+        self.anzahl = anzahl_neu
+
+        np.minimum(self.minimum, block.min(axis=1), out=self.minimum)
+        np.maximum(self.maximum, block.max(axis=1), out=self.maximum)
+
+        self._verbuche_klassen(block)
+
+        if self.rohdaten_pfad is not None:
+            with open(self.rohdaten_pfad, 'ab') as datei:
+                np.ascontiguousarray(block.T, dtype=np.float32).tofile(datei)
+
+    def _verbuche_klassen(self, block):
+        positiv = block > 0
+        self._nullwerte += block.shape[1] - positiv.sum(axis=1)
+
+        monat, pfad = np.nonzero(positiv)
+        if monat.size == 0:
+            return
+        index = np.ceil(np.log(block[monat, pfad]) / self._log_gamma).astype(np.int64)
+        self._erweitere_klassen(index.min(), index.max())
+
+        breite = self._klassen.shape[1]
+        flach = monat * breite + (index - self._klassen_offset)
+        self._klassen += np.bincount(flach, minlength=self.monate_gesamt * breite).reshape(self._klassen.shape)
+
+    def _erweitere_klassen(self, index_min, index_max):
+        if self._klassen.shape[1] == 0:
+            self._klassen_offset = index_min
+            self._klassen = np.zeros((self.monate_gesamt, index_max - index_min + 1), dtype=np.int64)
+            return
+        links = max(0, self._klassen_offset - index_min)
+        rechts = max(0, index_max - (self._klassen_offset + self._klassen.shape[1] - 1))
+        if links or rechts:
+            self._klassen = np.pad(self._klassen, ((0, 0), (links, rechts)))
+            self._klassen_offset -= links
+
+    def zusammenfuehren(self, andere):
+        """Übernimmt die Statistik eines anderen Aggregats mit gleicher Monatszahl und Genauigkeit"""
+        if andere.monate_gesamt != self.monate_gesamt or andere.relative_genauigkeit != self.relative_genauigkeit:
+            raise ValueError("Nur Statistiken mit gleicher Monatszahl und Genauigkeit sind zusammenführbar.")
+        if andere.anzahl == 0:
+            return
+        anzahl_neu = self.anzahl + andere.anzahl
+        differenz = andere.mittelwert - self.mittelwert
+        self.mittelwert += differenz * andere.anzahl / anzahl_neu
+        self._abweichungsquadrate += (
+            andere._abweichungsquadrate + differenz ** 2 * self.anzahl * andere.anzahl / anzahl_neu
+        )
+        self.anzahl = anzahl_neu
+        np.minimum(self.minimum, andere.minimum, out=self.minimum)
+        np.maximum(self.maximum, andere.maximum, out=self.maximum)
+
+        self._nullwerte += andere._nullwerte
+        if andere._klassen.shape[1]:
+            erster = andere._klassen_offset
+            self._erweitere_klassen(erster, erster + andere._klassen.shape[1] - 1)
+            start = erster - self._klassen_offset
+            self._klassen[:, start:start + andere._klassen.shape[1]] += andere._klassen
+
+    @property
+    def varianz(self):
+        if self.anzahl < 2:
+            return np.full(self.monate_gesamt, np.nan)
+        return self._abweichungsquadrate / (self.anzahl - 1)
+
+    def quantile(self, anteile):
+        """
+        Schätzt Quantile je Monat mit relativem Fehler <= relative_genauigkeit
+
+        Der Fehler bezieht sich auf den Pfadwert des Rangs floor(anteil × (n - 1)),
+        also auf np.quantile(..., method='lower').
+
+        Returns:
+            np.ndarray: Form (len(anteile), Monate)
+        """
+        anteile = np.atleast_1d(np.asarray(anteile, dtype=np.float64))
+        if self.anzahl == 0:
+            return np.full((len(anteile), self.monate_gesamt), np.nan)
+
+        gamma = np.exp(self._log_gamma)
+        kumuliert = np.cumsum(self._klassen, axis=1) + self._nullwerte[:, None]
+        ergebnis = np.empty((len(anteile), self.monate_gesamt))
+        for zeile, anteil in enumerate(anteile):
+            rang = anteil * (self.anzahl - 1)
+            klasse = (kumuliert <= rang).sum(axis=1)
+            wert = 2 * gamma ** (klasse + self._klassen_offset) / (gamma + 1)
+            ergebnis[zeile] = np.where(self._nullwerte > rang, 0.0, wert)
+        # Schätzwerte auf den beobachteten Wertebereich begrenzen
+        return np.clip(ergebnis, self.minimum, self.maximum)
+
+    def zusammenfassung(self, perzentile=(5, 50, 95)):
+        """
+        Fasst die laufende Statistik je Monat zusammen
+
+        Returns:
+            pd.DataFrame: Monat, Anzahl, Mittelwert, Standardabweichung, Minimum,
+                Maximum sowie eine Spalte 'P<q>' je Perzentil
+        """
+        tabelle = pd.DataFrame({
+            'Monat': np.arange(1, self.monate_gesamt + 1),
+            'Anzahl': self.anzahl,
+            'Mittelwert': self.mittelwert,
+            'Standardabweichung': np.sqrt(self.varianz),
+            'Minimum': self.minimum,
+            'Maximum': self.maximum,
+        })
+        for perzentil, reihe in zip(perzentile, self.quantile(np.asarray(perzentile) / 100)):
+            tabelle[f'P{perzentil:g}'] = reihe
+        return tabelle
+
+    def speicherbedarf(self):
+        """Belegter Speicher der Statistik in Byte (ohne Rohdatendatei)"""
+        return sum(
+            array.nbytes
+            for array in (self.mittelwert, self._abweichungsquadrate, self.minimum, self.maximum,
+                          self._nullwerte, self._klassen)
+        )
+
+
+def lade_rohdaten(rohdaten_pfad, monate_gesamt):
+    """
+    Öffnet die ausgelagerten Rohpfade speicherabgebildet für exakte Auswertungen
+
+    Returns:
+        np.memmap: Form (Pfade, Monate), float32, nur lesend
+    """
+    return np.memmap(rohdaten_pfad, dtype=np.float32, mode='r').reshape(-1, monate_gesamt)
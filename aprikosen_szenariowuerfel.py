@@ -0,0 +1,239 @@
+"""
+Vorberechneter Szenariowürfel für schnelle Abfragen über das übliche Parameterraster.
+
+Der Bestand nach k Monaten ist linear in Startbestand S und Zugängen Z:
+
+    B_k = S × P_k + Z × A_k,   P_k = f^k,   A_k = (f^k - 1) / (f - 1)
+
+Gespeichert werden deshalb nur die Koeffizienten P und A je Wachstumsrate des
+Rasters und je Jahresstichtag (k = 12 × Jahre - 1). Damit sind Endbestand,
+Zinseszinseffekt und Jahreswerte für beliebige S und Z exakt nachschlagbar;
+nur das Wachstum muss auf dem Raster liegen. Zwischen Rasterpunkten wird auf
+Wunsch linear interpoliert, sonst rechnet die Engine.
+
+Die Koeffizienten liegen als .npy-Dateien vor und werden speicherabgebildet
+geöffnet; meta.json enthält Raster und Modellversion. Ein Würfel mit anderer
+Modellversion gilt als veraltet und wird nicht verwendet.
+
+Aufbau:
+    python aprikosen_szenariowuerfel.py szenariowuerfel --wachstum-schritt 0.1
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from aprikosen_eingaben import MAX_PROGNOSEJAHRE
+from aprikosen_prognose_engine import (
+    MODELLVERSION,
+    berechne_bestand,
+    berechne_bestand_ohne_ueberlauf,
+    berechne_wachstumsfaktor,
+    runde_bestand,
+    schaetze_relative_genauigkeit,
+)
+
+STANDARD_WUERFEL_VERZEICHNIS = 'szenariowuerfel'
+_RASTER_TOLERANZ = 1e-9
+
+
+def erstelle_szenariowuerfel(verzeichnis=STANDARD_WUERFEL_VERZEICHNIS, wachstum_start=0.0, wachstum_ende=15.0,
+                             wachstum_schritt=0.1, max_jahre=MAX_PROGNOSEJAHRE):
+    """
+    Berechnet die Koeffizienten für alle Wachstumsraten und Jahre des Rasters und schreibt sie
+
+    Returns:
+        dict: Metadaten des geschriebenen Würfels
+    """
+    if wachstum_schritt <= 0 or wachstum_ende < wachstum_start:
+        raise ValueError("Das Wachstumsraster benötigt eine positive Schrittweite und Ende >= Start.")
+    anzahl_wachstum = int(round((wachstum_ende - wachstum_start) / wachstum_schritt)) + 1
+    wachstum = wachstum_start + np.arange(anzahl_wachstum) * wachstum_schritt
+    faktor = berechne_wachstumsfaktor(wachstum)[:, None]
+    monate = (np.arange(1, max_jahre + 1) * 12 - 1)[None, :]
+
+    os.makedirs(verzeichnis, exist_ok=True)
+    # P = Bestand für S = 1, Z = 0 und A = Bestand für S = 0, Z = 1
+    np.save(os.path.join(verzeichnis, 'potenz.npy'), berechne_bestand(1.0, 0.0, faktor, monate))
+    np.save(os.path.join(verzeichnis, 'summe.npy'), berechne_bestand(0.0, 1.0, faktor, monate))
+
+    meta = {
+        'modellversion': MODELLVERSION,
+        'wachstum_start': wachstum_start,
+        'wachstum_schritt': wachstum_schritt,
+        'anzahl_wachstum': anzahl_wachstum,
+        'max_jahre': max_jahre,
+        'erstellt': pd.Timestamp.now().isoformat(timespec='seconds'),
+    }
+    with open(os.path.join(verzeichnis, 'meta.json'), 'w', encoding='utf-8') as datei:
+        json.dump(meta, datei, indent=2)
+    return meta
+
+
+class Szenariowuerfel:
+    """Lesender Zugriff auf einen mit erstelle_szenariowuerfel geschriebenen Würfel"""
+
+    def __init__(self, verzeichnis=STANDARD_WUERFEL_VERZEICHNIS):
+        self.verzeichnis = verzeichnis
+        with open(os.path.join(verzeichnis, 'meta.json'), encoding='utf-8') as datei:
+            self.meta = json.load(datei)
+        self.potenz = np.load(os.path.join(verzeichnis, 'potenz.npy'), mmap_mode='r')
+        self.summe = np.load(os.path.join(verzeichnis, 'summe.npy'), mmap_mode='r')
+
+    @property
+    def veraltet(self):
+        return self.meta.get('modellversion') != MODELLVERSION
+
+    def _rasterposition(self, jaehrliches_wachstum_prozent):
+        # Gleitkommaposition im Wachstumsraster; ganzzahlig heißt Rasterpunkt
+        return (jaehrliches_wachstum_prozent - self.meta['wachstum_start']) / self.meta['wachstum_schritt']
+
+    def _koeffizienten(self, jaehrliches_wachstum_prozent, jahre, interpolieren):
+        position = self._rasterposition(jaehrliches_wachstum_prozent)
+        gerundet = np.rint(position)
+        jahre_ok = (jahre == np.rint(jahre)) & (jahre >= 1) & (jahre <= self.meta['max_jahre'])
+        im_raster = (position >= 0) & (position <= self.meta['anzahl_wachstum'] - 1) & jahre_ok
+        auf_raster = im_raster & (np.abs(position - gerundet) < _RASTER_TOLERANZ)
+
+        spalte = np.where(jahre_ok, jahre, 1).astype(np.int64) - 1
+        if interpolieren:
+            unten = np.clip(np.floor(position), 0, self.meta['anzahl_wachstum'] - 1).astype(np.int64)
+            oben = np.minimum(unten + 1, self.meta['anzahl_wachstum'] - 1)
+            gewicht = np.where(auf_raster, 0.0, np.clip(position - unten, 0.0, 1.0))
+            unten = np.where(auf_raster, gerundet, unten).astype(np.int64)
+            potenz = (1 - gewicht) * self.potenz[unten, spalte] + gewicht * self.potenz[oben, spalte]
+            summe = (1 - gewicht) * self.summe[unten, spalte] + gewicht * self.summe[oben, spalte]
+            return potenz, summe, auf_raster, im_raster & ~auf_raster
+
+        zeile = np.where(auf_raster, gerundet, 0).astype(np.int64)
+        return self.potenz[zeile, spalte], self.summe[zeile, spalte], auf_raster, np.zeros_like(auf_raster)
+
+    def abfrage(self, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre,
+                interpolieren=False):
+        """
+        Endbestand und Zinseszinseffekt für beliebig viele Parametersätze
+
+        Rasterpunkte werden nachgeschlagen, Zwischenwerte des Wachstums mit
+        interpolieren=True linear interpoliert; alle übrigen Anfragen (und alle
+        Anfragen an einen veralteten Würfel) berechnet die Engine.
+
+        Returns:
+            pd.DataFrame: Spalten 'Endbestand', 'Zinseszinseffekt' und 'Quelle'
+                ('Würfel', 'Interpoliert' oder 'Engine')
+        """
+        startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre = np.broadcast_arrays(*(
+            np.atleast_1d(np.asarray(wert, dtype=np.float64))
+            for wert in (startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre)
+        ))
+        letzter_monat = prognosejahre * 12 - 1
+
+        if self.veraltet:
+            auf_raster = interpoliert = np.zeros(startbestand.shape, dtype=bool)
+            end_bestand = np.empty(startbestand.shape)
+        else:
+            potenz, summe, auf_raster, interpoliert = self._koeffizienten(
+                jaehrliches_wachstum_prozent, prognosejahre, interpolieren
+            )
+            end_bestand = startbestand * potenz + monatliche_zugaenge * summe
+
+        engine = ~(auf_raster | interpoliert)
+        if engine.any():
+            end_bestand[engine] = berechne_bestand_ohne_ueberlauf(
+                startbestand[engine],
+                monatliche_zugaenge[engine],
+                berechne_wachstumsfaktor(jaehrliches_wachstum_prozent[engine]),
+                letzter_monat[engine],
+            )
+
+        return pd.DataFrame({
+            'Endbestand': end_bestand,
+            'Zinseszinseffekt': end_bestand - (startbestand + letzter_monat * monatliche_zugaenge),
+            'Quelle': np.select([auf_raster, interpoliert], ['Würfel', 'Interpoliert'], 'Engine'),
+        })
+
+    def jahreswerte(self, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre):
+        """
+        Bestand zum Ende jedes Prognosejahres für einen einzelnen Parametersatz auf dem Raster
+
+        Returns:
+            pd.DataFrame: Spalten 'Prognosejahr' und 'Baumbestand'; None, falls
+                der Parametersatz nicht auf dem Raster liegt oder der Würfel veraltet ist
+        """
+        position = self._rasterposition(jaehrliches_wachstum_prozent)
+        if (self.veraltet or abs(position - round(position)) >= _RASTER_TOLERANZ
+                or not 0 <= round(position) < self.meta['anzahl_wachstum']
+                or not 1 <= prognosejahre <= self.meta['max_jahre']):
+            return None
+        zeile = int(round(position))
+        return pd.DataFrame({
+            'Prognosejahr': np.arange(1, prognosejahre + 1),
+            'Baumbestand': startbestand * self.potenz[zeile, :prognosejahre]
+            + monatliche_zugaenge * self.summe[zeile, :prognosejahre],
+        })
+
+    def jahresprojektion(self, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre):
+        """
+        Projektion in Jahresauflösung wie berechne_jahresprojektion, aber aus dem Würfel nachgeschlagen
+
+        Das Jahresende (Monatsindex 12 × Jahr) liegt einen Monat nach dem
+        Stichtag des Würfels und folgt aus B_(k+1) = f × B_k + Z.
+
+        Returns:
+            dict[str, np.ndarray]: Spalten wie berechne_jahresprojektion; None, falls
+                der Parametersatz nicht auf dem Raster liegt, der Würfel veraltet ist
+                oder der Bestand den Zahlenbereich von float64 übersteigt
+        """
+        jahreswerte = self.jahreswerte(startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent, prognosejahre)
+        if jahreswerte is None:
+            return None
+        bestand = jahreswerte['Baumbestand'].to_numpy()
+        if not np.all(np.isfinite(bestand)):
+            # Überlauf: nur die Engine rechnet im Logarithmus weiter
+            return None
+        jahre = jahreswerte['Prognosejahr'].to_numpy()
+        faktor = berechne_wachstumsfaktor(jaehrliches_wachstum_prozent)
+        with np.errstate(over='ignore', divide='ignore'):
+            jahresende = np.concatenate([[startbestand], faktor * bestand + monatliche_zugaenge])
+            log_bestand = np.log(bestand)
+        return {
+            'Prognosejahr': jahre,
+            'Monat': jahre * 12,
+            'Baumbestand': runde_bestand(bestand),
+            'Log10_Baumbestand': log_bestand / np.log(10),
+            'Monatlicher_Zuwachs': runde_bestand(np.diff(jahresende) / 12),
+            'Relative_Genauigkeit': schaetze_relative_genauigkeit(log_bestand, jahre * 12 - 1),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Berechnet den Szenariowürfel für das Wachstumsraster vor.")
+    parser.add_argument('verzeichnis', nargs='?', default=STANDARD_WUERFEL_VERZEICHNIS,
+                        help=f"Zielverzeichnis (Standard: {STANDARD_WUERFEL_VERZEICHNIS})")
+    parser.add_argument('--wachstum-start', type=float, default=0.0, help="Kleinstes jährliches Wachstum in %%")
+    parser.add_argument('--wachstum-ende', type=float, default=15.0, help="Größtes jährliches Wachstum in %%")
+    parser.add_argument('--wachstum-schritt', type=float, default=0.1, help="Schrittweite des Wachstums in %%")
+    parser.add_argument('--max-jahre', type=int, default=MAX_PROGNOSEJAHRE, help="Längster Prognosezeitraum")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        meta = erstelle_szenariowuerfel(
+            args.verzeichnis, args.wachstum_start, args.wachstum_ende, args.wachstum_schritt, args.max_jahre
+        )
+    except ValueError as exc:
+        print(f"❌ {exc}", file=sys.stderr)
+        return 2
+    print(
+        f"✅ Szenariowürfel mit {meta['anzahl_wachstum']:,} Wachstumsraten × {meta['max_jahre']} Jahren "
+        f"in {args.verzeichnis} geschrieben ({time.perf_counter() - start:.2f} s)",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
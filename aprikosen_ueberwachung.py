@@ -0,0 +1,451 @@
+"""
+Laufende Überwachung gespeicherter Prognosen gegen eingehende Ist-Bestände.
+
+Ein SQLite-Index hält die registrierten Prognosen je Plantage und
+Kalendermonat (Primärschlüssel Plantage, Monat, Prognose), die bisher
+eingelesenen Ist-Bestände und je Paar aus Plantage und Prognose einen
+laufenden Kennzahlenstand: Summen der Abweichungen für MAE, RMSE, MAPE und
+Bias sowie den Drift als exponentiell geglätteten Mittelwert der relativen
+Abweichung und zwei CUSUM-Summen für anhaltende Abweichungen nach oben und
+unten:
+
+    Drift_t    = (1 - α) × Drift_{t-1} + α × x_t
+    CUSUM⁺_t   = max(0, CUSUM⁺_{t-1} + x_t - k)
+    CUSUM⁻_t   = max(0, CUSUM⁻_{t-1} - x_t - k)
+
+mit x_t = (Prognose - Ist) / |Ist| × 100 im Monat t. Abweichungen folgen
+damit derselben Konvention wie aprikosen_kalibrierung: Prognose (Modell) minus
+Ist, relativ zum Ist-Bestand. Ein positiver Bias oder Drift heißt, dass die
+Prognose den Bestand überschätzt. Indizes mit älterer Konvention werden beim
+Öffnen einmalig aus den gespeicherten Prognosen und Ist-Beständen neu berechnet.
+
+Beim Einlesen einer Ist-Datei werden nur Zeilen verarbeitet, deren Plantage
+und Monat noch nicht im Index stehen; bereits eingelesene Dateien werden an
+ihrer Prüfsumme erkannt und übersprungen. Die neuen Zeilen werden über den
+Primärschlüssel mit allen Prognosen für denselben Monat verknüpft und nur die
+betroffenen Kennzahlenstände fortgeschrieben, die Historie wird nie erneut
+gelesen. Nachgelieferte Monate vor dem letzten verarbeiteten Monat gehen nur
+in die Summen ein, nicht in Drift und CUSUM.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from aprikosen_kalibrierung import STANDARD_LESEBLOCK, lies_beobachtungen
+from aprikosen_prognose_engine import MODELLVERSION, berechne_bestandsreihe, berechne_wachstumsfaktor, runde_bestand
+
+STANDARD_UEBERWACHUNG = 'ueberwachung'
+STANDARD_UEBERWACHUNG_MONATE = 120
+DRIFT_GLAETTUNG = 0.3
+CUSUM_TOLERANZ_PROZENT = 0.5
+STANDARD_SCHWELLEN = {
+    'Abweichung_Prozent': 5.0,
+    'Drift_Prozent': 3.0,
+    'CUSUM_Prozent': 10.0,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prognoseliste (
+    prognose TEXT PRIMARY KEY,
+    modellversion INTEGER NOT NULL,
+    anzahl_plantagen INTEGER NOT NULL,
+    erstellt TEXT NOT NULL,
+    aktualisiert TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prognosen (
+    plantage TEXT NOT NULL,
+    monat INTEGER NOT NULL,
+    prognose TEXT NOT NULL,
+    baumbestand REAL NOT NULL,
+    PRIMARY KEY (plantage, monat, prognose)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS istwerte (
+    plantage TEXT NOT NULL,
+    monat INTEGER NOT NULL,
+    baumbestand REAL NOT NULL,
+    eingelesen TEXT NOT NULL,
+    PRIMARY KEY (plantage, monat)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS kennzahlen (
+    plantage TEXT NOT NULL,
+    prognose TEXT NOT NULL,
+    anzahl INTEGER NOT NULL,
+    summe_abweichung REAL NOT NULL,
+    summe_absolut REAL NOT NULL,
+    summe_quadrat REAL NOT NULL,
+    summe_relativ REAL NOT NULL,
+    letzter_monat INTEGER NOT NULL,
+    letzte_abweichung_prozent REAL NOT NULL,
+    drift_prozent REAL NOT NULL,
+    cusum_hoch REAL NOT NULL,
+    cusum_tief REAL NOT NULL,
+    PRIMARY KEY (plantage, prognose)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dateien (
+    pruefsumme TEXT PRIMARY KEY,
+    name TEXT,
+    zeilen INTEGER NOT NULL,
+    neue_zeilen INTEGER NOT NULL,
+    eingelesen TEXT NOT NULL
+);
+"""
+
+# PRAGMA user_version: Stand der Kennzahlen-Konvention (1 = Prognose minus Ist, relativ zum Ist)
+_KENNZAHLVERSION = 1
+
+_KENNZAHL_SPALTEN = ('anzahl', 'summe_abweichung', 'summe_absolut', 'summe_quadrat', 'summe_relativ',
+                     'letzter_monat', 'letzte_abweichung_prozent', 'drift_prozent', 'cusum_hoch', 'cusum_tief')
+
+
+def berechne_dateipruefsumme(pfad, blockgroesse=1 << 20):
+    """SHA-256 des Dateiinhalts, blockweise gelesen"""
+    pruefsumme = hashlib.sha256()
+    with open(pfad, 'rb') as datei:
+        for block in iter(lambda: datei.read(blockgroesse), b''):
+            pruefsumme.update(block)
+    return pruefsumme.hexdigest()
+
+
+def _monatsordinal(datum):
+    return pd.DatetimeIndex(datum).to_period('M').asi8
+
+
+def _als_datum(monat):
+    return pd.PeriodIndex.from_ordinals(np.asarray(monat, dtype=np.int64), freq='M').to_timestamp()
+
+
+def _pruefe_spalten(df, spalten):
+    fehlend = [spalte for spalte in spalten if spalte not in df]
+    if fehlend:
+        raise ValueError(f"Fehlende Spalten: {', '.join(fehlend)}")
+
+
+class Prognoseueberwachung:
+    def __init__(self, verzeichnis=STANDARD_UEBERWACHUNG, drift_glaettung=DRIFT_GLAETTUNG,
+                 cusum_toleranz_prozent=CUSUM_TOLERANZ_PROZENT):
+        self.verzeichnis = verzeichnis
+        self.drift_glaettung = drift_glaettung
+        self.cusum_toleranz_prozent = cusum_toleranz_prozent
+        os.makedirs(verzeichnis, exist_ok=True)
+        self._verbindung = sqlite3.connect(os.path.join(verzeichnis, 'index.sqlite'), check_same_thread=False)
+        self._sperre = threading.Lock()
+        self._verbindung.executescript(_SCHEMA)
+        self._verbindung.commit()
+        if self._verbindung.execute("PRAGMA user_version").fetchone()[0] < _KENNZAHLVERSION:
+            self._berechne_kennzahlen_neu()
+
+    def _berechne_kennzahlen_neu(self):
+        # Alle Kennzahlenstände aus der gespeicherten Historie, z. B. nach einer Änderung der Konvention
+        with self._verbindung:
+            self._verbindung.execute("DELETE FROM kennzahlen")
+            self._aktualisiere_kennzahlen(pd.read_sql_query(
+                """
+                SELECT p.plantage, p.prognose, p.monat, p.baumbestand AS prognosewert, i.baumbestand AS istwert
+                FROM prognosen p JOIN istwerte i ON i.plantage = p.plantage AND i.monat = p.monat
+                """,
+                self._verbindung,
+            ))
+            self._verbindung.execute(f"PRAGMA user_version = {_KENNZAHLVERSION}")
+
+    def schliessen(self):
+        self._verbindung.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.schliessen()
+
+    def _temporaere_tabelle(self, name, spalten, zeilen):
+        # Kurzlebige Hilfstabelle für Verknüpfungen über den Primärschlüssel
+        self._verbindung.execute(f"DROP TABLE IF EXISTS temp.{name}")
+        self._verbindung.execute(f"CREATE TEMP TABLE {name} ({', '.join(spalten)})")
+        self._verbindung.executemany(
+            f"INSERT INTO temp.{name} VALUES ({', '.join('?' * len(spalten))})", zeilen
+        )
+
+    def registriere_prognose(self, prognose, monatswerte):
+        """
+        Legt eine Prognose im Index ab oder ersetzt sie für die enthaltenen Plantagen
+
+        monatswerte hat die Spalten id, Datum und Baumbestand. Für bereits
+        eingelesene Ist-Bestände derselben Plantagen werden die Kennzahlen der
+        Prognose sofort berechnet.
+
+        Returns:
+            int: Anzahl der verglichenen Ist-Monate
+        """
+        _pruefe_spalten(monatswerte, ('id', 'Datum', 'Baumbestand'))
+        plantagen = monatswerte['id'].astype(str).to_numpy()
+        zeilen = list(zip(
+            plantagen.tolist(),
+            _monatsordinal(monatswerte['Datum']).tolist(),
+            monatswerte['Baumbestand'].to_numpy(dtype=np.float64).tolist(),
+        ))
+        jetzt = pd.Timestamp.now().isoformat(timespec='seconds')
+        with self._sperre, self._verbindung:
+            self._temporaere_tabelle('neue_prognose', ('plantage', 'monat', 'baumbestand'), zeilen)
+            self._temporaere_tabelle('paare', ('plantage', 'prognose'),
+                                     [(plantage, prognose) for plantage in np.unique(plantagen).tolist()])
+            for tabelle in ('prognosen', 'kennzahlen'):
+                self._verbindung.execute(
+                    f"DELETE FROM {tabelle} WHERE prognose = ? AND plantage IN (SELECT plantage FROM temp.paare)",
+                    (prognose,),
+                )
+            self._verbindung.execute(
+                "INSERT OR REPLACE INTO prognosen SELECT plantage, monat, ?, baumbestand FROM temp.neue_prognose",
+                (prognose,),
+            )
+            self._verbindung.execute(
+                """
+                INSERT INTO prognoseliste VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(prognose) DO UPDATE SET
+                    modellversion = excluded.modellversion,
+                    anzahl_plantagen = excluded.anzahl_plantagen,
+                    aktualisiert = excluded.aktualisiert
+                """,
+                (prognose, MODELLVERSION, len(np.unique(plantagen)), jetzt, jetzt),
+            )
+            vergleich = pd.read_sql_query(
+                """
+                SELECT n.plantage, ? AS prognose, n.monat, n.baumbestand AS prognosewert, i.baumbestand AS istwert
+                FROM temp.neue_prognose n JOIN istwerte i ON i.plantage = n.plantage AND i.monat = n.monat
+                """,
+                self._verbindung, params=(prognose,),
+            )
+            self._aktualisiere_kennzahlen(vergleich)
+        return len(vergleich)
+
+    def registriere_parameter(self, prognose, tabelle, monate=STANDARD_UEBERWACHUNG_MONATE):
+        """
+        Registriert die Prognosen einer Parametertabelle, z. B. aus kalibriere()
+
+        Erwartet wie Portfolio.aus_tabelle die Spalten id, startdatum,
+        startbestand, monatliche_zugaenge und jaehrliches_wachstum; jede
+        Plantage wird über monate Monate ab ihrem Startmonat projiziert.
+
+        Returns:
+            int: Anzahl der verglichenen Ist-Monate
+        """
+        _pruefe_spalten(tabelle, ('id', 'startdatum', 'startbestand', 'monatliche_zugaenge', 'jaehrliches_wachstum'))
+        bestand = runde_bestand(berechne_bestandsreihe(
+            tabelle['startbestand'].to_numpy(dtype=np.float64),
+            tabelle['monatliche_zugaenge'].to_numpy(dtype=np.float64),
+            berechne_wachstumsfaktor(tabelle['jaehrliches_wachstum'].to_numpy(dtype=np.float64)),
+            monate,
+        ))
+        startmonat = _monatsordinal(pd.to_datetime(tabelle['startdatum']))
+        return self.registriere_prognose(prognose, pd.DataFrame({
+            'id': np.repeat(tabelle['id'].to_numpy(), monate),
+            'Datum': _als_datum((startmonat[:, None] + np.arange(monate)).ravel()),
+            'Baumbestand': bestand.ravel(),
+        }))
+
+    def verarbeite_istwerte(self, quelle, pruefsumme=None, name=None, blockgroesse=STANDARD_LESEBLOCK, sep=';'):
+        """
+        Liest neue Ist-Bestände (Spalten id, Datum, Baumbestand) blockweise ein und schreibt die Kennzahlen fort
+
+        Dateipfade werden an ihrer Prüfsumme erkannt; für DataFrames oder
+        hochgeladene Dateien kann pruefsumme direkt übergeben werden. Zeilen zu
+        bereits bekannten Plantagen und Monaten werden übersprungen.
+
+        Returns:
+            dict: 'Zeilen', 'Neue_Zeilen', 'Vergleiche', 'Sekunden' und
+                'Uebersprungen' (Datei bereits eingelesen)
+        """
+        start = time.perf_counter()
+        if pruefsumme is None and not isinstance(quelle, pd.DataFrame) and os.path.isfile(quelle):
+            pruefsumme = berechne_dateipruefsumme(quelle)
+            name = name or os.path.basename(quelle)
+        statistik = {'Zeilen': 0, 'Neue_Zeilen': 0, 'Vergleiche': 0, 'Sekunden': 0.0, 'Uebersprungen': False}
+
+        with self._sperre, self._verbindung:
+            if pruefsumme is not None and self._verbindung.execute(
+                "SELECT 1 FROM dateien WHERE pruefsumme = ?", (pruefsumme,)
+            ).fetchone():
+                statistik['Uebersprungen'] = True
+                statistik['Sekunden'] = time.perf_counter() - start
+                return statistik
+
+            jetzt = pd.Timestamp.now().isoformat(timespec='seconds')
+            vergleiche = []
+            for block in lies_beobachtungen(quelle, blockgroesse, sep):
+                _pruefe_spalten(block, ('id', 'Datum', 'Baumbestand'))
+                block = pd.DataFrame({
+                    'plantage': block['id'].astype(str).to_numpy(),
+                    'monat': _monatsordinal(block['Datum']),
+                    'baumbestand': block['Baumbestand'].to_numpy(dtype=np.float64),
+                }).drop_duplicates(['plantage', 'monat'], keep='last')
+                statistik['Zeilen'] += len(block)
+                self._temporaere_tabelle('block', ('plantage', 'monat', 'baumbestand'),
+                                         block.itertuples(index=False, name=None))
+                self._verbindung.execute("DROP TABLE IF EXISTS temp.neu")
+                self._verbindung.execute(
+                    """
+                    CREATE TEMP TABLE neu AS SELECT b.* FROM temp.block b
+                    WHERE NOT EXISTS (SELECT 1 FROM istwerte i WHERE i.plantage = b.plantage AND i.monat = b.monat)
+                    """
+                )
+                statistik['Neue_Zeilen'] += self._verbindung.execute(
+                    "INSERT INTO istwerte SELECT plantage, monat, baumbestand, ? FROM temp.neu", (jetzt,)
+                ).rowcount
+                vergleiche.append(pd.read_sql_query(
+                    """
+                    SELECT p.plantage, p.prognose, p.monat, p.baumbestand AS prognosewert, n.baumbestand AS istwert
+                    FROM temp.neu n JOIN prognosen p ON p.plantage = n.plantage AND p.monat = n.monat
+                    """,
+                    self._verbindung,
+                ))
+            if vergleiche:
+                vergleich = pd.concat(vergleiche, ignore_index=True)
+                self._aktualisiere_kennzahlen(vergleich)
+                statistik['Vergleiche'] = len(vergleich)
+            if pruefsumme is not None:
+                self._verbindung.execute(
+                    "INSERT INTO dateien VALUES (?, ?, ?, ?, ?)",
+                    (pruefsumme, name, statistik['Zeilen'], statistik['Neue_Zeilen'], jetzt),
+                )
+        statistik['Sekunden'] = time.perf_counter() - start
+        return statistik
+
+    def _aktualisiere_kennzahlen(self, vergleich):
+        # Schreibt die Kennzahlenstände der in vergleich enthaltenen Paare (Plantage, Prognose) fort
+        if vergleich.empty:
+            return
+        vergleich = vergleich.sort_values(['plantage', 'prognose', 'monat'], ignore_index=True)
+        paare = pd.MultiIndex.from_frame(vergleich[['plantage', 'prognose']].drop_duplicates())
+        self._temporaere_tabelle('paare', ('plantage', 'prognose'), paare.tolist())
+        bisher = pd.read_sql_query(
+            "SELECT k.* FROM kennzahlen k JOIN temp.paare p USING (plantage, prognose)", self._verbindung
+        ).set_index(['plantage', 'prognose']).reindex(paare)
+        stand = {spalte: bisher[spalte].to_numpy(dtype=np.float64, copy=True) for spalte in _KENNZAHL_SPALTEN}
+        neu = np.isnan(stand['anzahl'])
+        for spalte in _KENNZAHL_SPALTEN:
+            stand[spalte][neu] = 0.0
+        stand['letzter_monat'][neu] = -np.inf
+        stand['drift_prozent'][neu] = np.nan
+
+        paar = paare.get_indexer(pd.MultiIndex.from_frame(vergleich[['plantage', 'prognose']]))
+        istwert = vergleich['istwert'].to_numpy(dtype=np.float64)
+        # Wie in aprikosen_kalibrierung: Prognose minus Ist, relativ zum Ist-Bestand
+        abweichung = vergleich['prognosewert'].to_numpy(dtype=np.float64) - istwert
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relativ = np.where(istwert != 0, abweichung / np.abs(istwert) * 100, 0.0)
+        for spalte, werte in (('anzahl', np.ones_like(abweichung)), ('summe_abweichung', abweichung),
+                              ('summe_absolut', np.abs(abweichung)), ('summe_quadrat', abweichung ** 2),
+                              ('summe_relativ', np.abs(relativ))):
+            stand[spalte] += np.bincount(paar, werte, minlength=len(paare))
+
+        # Drift und CUSUM der Reihe nach über die neuen Monate, je Schritt für alle Paare zugleich
+        monat = vergleich['monat'].to_numpy()
+        fortlaufend = monat > stand['letzter_monat'][paar]
+        paar, monat, relativ = paar[fortlaufend], monat[fortlaufend], relativ[fortlaufend]
+        rang = pd.Series(paar).groupby(paar).cumcount().to_numpy()
+        alpha, toleranz = self.drift_glaettung, self.cusum_toleranz_prozent
+        for schritt in range(rang.max() + 1 if len(rang) else 0):
+            auswahl = rang == schritt
+            p, x = paar[auswahl], relativ[auswahl]
+            drift = stand['drift_prozent'][p]
+            stand['drift_prozent'][p] = np.where(np.isnan(drift), x, (1 - alpha) * drift + alpha * x)
+            stand['cusum_hoch'][p] = np.maximum(0.0, stand['cusum_hoch'][p] + x - toleranz)
+            stand['cusum_tief'][p] = np.maximum(0.0, stand['cusum_tief'][p] - x - toleranz)
+            stand['letzte_abweichung_prozent'][p] = x
+            stand['letzter_monat'][p] = monat[auswahl]
+
+        self._verbindung.executemany(
+            f"INSERT OR REPLACE INTO kennzahlen VALUES ({', '.join('?' * (len(_KENNZAHL_SPALTEN) + 2))})",
+            zip(
+                paare.get_level_values(0).tolist(),
+                paare.get_level_values(1).tolist(),
+                stand['anzahl'].astype(np.int64).tolist(),
+                *(stand[spalte].tolist() for spalte in _KENNZAHL_SPALTEN[1:5]),
+                stand['letzter_monat'].astype(np.int64).tolist(),
+                *(stand[spalte].tolist() for spalte in _KENNZAHL_SPALTEN[6:]),
+            ),
+        )
+
+    def kennzahlen(self, schwellen=None, prognose=None, nur_alarme=False):
+        """
+        Aktueller Kennzahlenstand je Plantage und Prognose mit Alarmen
+
+        Abweichungen sind Prognose minus Ist, relative Abweichungen und MAPE
+        beziehen sich auf den Ist-Bestand (wie bei kalibriere); ein Alarm entsteht, wenn die
+        letzte relative Abweichung, der Drift oder eine CUSUM-Summe die
+        jeweilige Schwelle aus schwellen (Standard: STANDARD_SCHWELLEN) betragsmäßig
+        überschreitet.
+
+        Returns:
+            pd.DataFrame: Eine Zeile je Paar mit Anzahl_Monate, Letzter_Monat,
+                MAE, RMSE, MAPE_Prozent, Bias, Letzte_Abweichung_Prozent,
+                Drift_Prozent, CUSUM_Hoch, CUSUM_Tief, Alarm und Alarmgrund
+        """
+        schwellen = {**STANDARD_SCHWELLEN, **(schwellen or {})}
+        sql = "SELECT * FROM kennzahlen"
+        werte = ()
+        if prognose is not None:
+            sql += " WHERE prognose = ?"
+            werte = (prognose,)
+        with self._sperre:
+            stand = pd.read_sql_query(sql + " ORDER BY plantage, prognose", self._verbindung, params=werte)
+
+        anzahl = stand['anzahl'].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df = pd.DataFrame({
+                'id': stand['plantage'],
+                'Prognose': stand['prognose'],
+                'Anzahl_Monate': stand['anzahl'],
+                'Letzter_Monat': _als_datum(stand['letzter_monat']),
+                'MAE': stand['summe_absolut'] / anzahl,
+                'RMSE': np.sqrt(stand['summe_quadrat'] / anzahl),
+                'MAPE_Prozent': stand['summe_relativ'] / anzahl,
+                'Bias': stand['summe_abweichung'] / anzahl,
+                'Letzte_Abweichung_Prozent': stand['letzte_abweichung_prozent'],
+                'Drift_Prozent': stand['drift_prozent'],
+                'CUSUM_Hoch': stand['cusum_hoch'],
+                'CUSUM_Tief': stand['cusum_tief'],
+            })
+        gruende = pd.DataFrame({
+            'Abweichung': df['Letzte_Abweichung_Prozent'].abs() > schwellen['Abweichung_Prozent'],
+            'Drift': df['Drift_Prozent'].abs() > schwellen['Drift_Prozent'],
+            'CUSUM': np.maximum(df['CUSUM_Hoch'], df['CUSUM_Tief']) > schwellen['CUSUM_Prozent'],
+        })
+        df['Alarm'] = gruende.any(axis=1)
+        df['Alarmgrund'] = gruende.dot(gruende.columns + ', ').str.rstrip(', ')
+        if nur_alarme:
+            df = df[df['Alarm']].reset_index(drop=True)
+        return df
+
+    def abweichungen(self, plantage):
+        """
+        Monatsverlauf von Ist-Bestand und allen Prognosen einer Plantage
+
+        Returns:
+            pd.DataFrame: Spalten 'Datum', 'Prognose', 'Prognosewert' und 'Istwert'
+                (fehlend, solange für den Monat kein Ist-Bestand vorliegt)
+        """
+        with self._sperre:
+            df = pd.read_sql_query(
+                """
+                SELECT p.monat, p.prognose, p.baumbestand AS prognosewert, i.baumbestand AS istwert
+                FROM prognosen p LEFT JOIN istwerte i ON i.plantage = p.plantage AND i.monat = p.monat
+                WHERE p.plantage = ?
+                ORDER BY p.prognose, p.monat
+                """,
+                self._verbindung, params=(str(plantage),),
+            )
+        return pd.DataFrame({
+            'Datum': _als_datum(df['monat']),
+            'Prognose': df['prognose'],
+            'Prognosewert': df['prognosewert'],
+            'Istwert': df['istwert'],
+        })
+
+    def prognosen(self):
+        """Registrierte Prognosen mit Modellversion und Anzahl Plantagen"""
+        with self._sperre:
+            return pd.read_sql_query("SELECT * FROM prognoseliste ORDER BY erstellt", self._verbindung)
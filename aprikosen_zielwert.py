@@ -0,0 +1,139 @@
+"""
+Zielwertsuche auf Basis der geschlossenen Form der Prognose.
+
+Der Bestand nach k Monaten (entspricht der Zeile Monat = k + 1 der Prognose) ist
+
+    B_k = S × f^k + Z × (f^k - 1) / (f - 1)
+
+Daraus lassen sich die benötigten monatlichen Zugänge direkt, der Monat des
+ersten Überschreitens eines Schwellenwerts per Logarithmus und das benötigte
+Wachstum per abgesichertem Newton-Verfahren bestimmen. Alle Funktionen
+akzeptieren (broadcastbare) Arrays und beantworten beliebig viele Anfragen in
+einem Aufruf; nicht lösbare Anfragen ergeben NaN.
+"""
+import numpy as np
+
+from aprikosen_prognose_engine import berechne_wachstumsfaktor
+
+NEWTON_ITERATIONEN = 60
+NEWTON_TOLERANZ = 1e-12
+_NAHE_EINS = 1e-9
+
+
+def _bestand_und_ableitung(startbestand, monatliche_zugaenge, faktor, monate):
+    # B_k und dB_k/df; für f nahe 1 die Taylor-Näherung um f = 1
+    potenz = np.power(faktor, monate)
+    wachstum = faktor - 1
+    nahe_eins = np.abs(wachstum) < _NAHE_EINS
+    divisor = np.where(nahe_eins, 1.0, wachstum)
+    summe = np.where(nahe_eins, monate + monate * (monate - 1) / 2 * wachstum, (potenz - 1) / divisor)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        potenz_ableitung = np.where(faktor > 0, monate * potenz / faktor, np.where(monate == 1, 1.0, 0.0))
+    summe_ableitung = np.where(nahe_eins, monate * (monate - 1) / 2, (potenz_ableitung - summe) / divisor)
+    bestand = startbestand * potenz + monatliche_zugaenge * summe
+    return bestand, startbestand * potenz_ableitung + monatliche_zugaenge * summe_ableitung
+
+
+def berechne_benoetigte_zugaenge(zielbestand, startbestand, jaehrliches_wachstum_prozent, monate):
+    """
+    Berechnet die monatlichen Zugänge, mit denen nach monate Monaten zielbestand erreicht wird
+
+    Negative Ergebnisse bedeuten, dass das Ziel bereits ohne Zugänge übertroffen wird.
+
+    Returns:
+        np.ndarray: Benötigte monatliche Zugänge (NaN für monate = 0)
+    """
+    zielbestand, startbestand, jaehrliches_wachstum_prozent, monate = np.broadcast_arrays(*(
+        np.asarray(wert, dtype=np.float64)
+        for wert in (zielbestand, startbestand, jaehrliches_wachstum_prozent, monate)
+    ))
+    faktor = berechne_wachstumsfaktor(jaehrliches_wachstum_prozent)
+    potenz = np.power(faktor, monate)
+    wachstum = faktor - 1
+    ohne_wachstum = wachstum == 0
+    summe = np.where(ohne_wachstum, monate, np.expm1(monate * np.log(faktor)) / np.where(ohne_wachstum, 1.0, wachstum))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(summe > 0, (zielbestand - startbestand * potenz) / summe, np.nan)
+
+
+def berechne_benoetigtes_wachstum(zielbestand, startbestand, monatliche_zugaenge, monate,
+                                  iterationen=NEWTON_ITERATIONEN):
+    """
+    Berechnet das jährliche Wachstum in Prozent, mit dem nach monate Monaten zielbestand erreicht wird
+
+    Der Bestand steigt für S, Z >= 0 streng monoton im Wachstumsfaktor; die
+    Lösung wird zunächst eingeschachtelt und dann mit Newton-Schritten auf der
+    logarithmischen Skala bestimmt, die bei Verlassen des Intervalls durch
+    Bisektion ersetzt werden.
+
+    Returns:
+        np.ndarray: Jährliches Wachstum in Prozent (NaN, falls nicht erreichbar)
+    """
+    zielbestand, startbestand, monatliche_zugaenge, monate = np.broadcast_arrays(*(
+        np.asarray(wert, dtype=np.float64)
+        for wert in (zielbestand, startbestand, monatliche_zugaenge, monate)
+    ))
+    # Mit f = 0 (Wachstum -100 %) bleibt nach k >= 1 Monaten genau Z übrig
+    loesbar = (monate >= 1) & (startbestand > 0) & (zielbestand >= monatliche_zugaenge)
+
+    unten = np.zeros(zielbestand.shape)
+    oben = np.full(zielbestand.shape, 2.0)
+    for _ in range(64):
+        zu_klein = loesbar & (_bestand_und_ableitung(startbestand, monatliche_zugaenge, oben, monate)[0] < zielbestand)
+        if not zu_klein.any():
+            break
+        unten = np.where(zu_klein, oben, unten)
+        oben = np.where(zu_klein, oben * 2, oben)
+
+    # Newton-Schritte auf log(B) über log(f): für große k nahezu linear und damit schnell konvergent
+    faktor = (unten + oben) / 2
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(iterationen):
+            bestand, ableitung = _bestand_und_ableitung(startbestand, monatliche_zugaenge, faktor, monate)
+            if not loesbar.any() or np.max(np.abs(bestand / zielbestand - 1)[loesbar]) < NEWTON_TOLERANZ:
+                break
+            unten = np.where(bestand < zielbestand, faktor, unten)
+            oben = np.where(bestand >= zielbestand, faktor, oben)
+            newton = faktor * np.exp(-np.log(bestand / zielbestand) * bestand / (faktor * ableitung))
+            faktor = np.where((newton > unten) & (newton < oben), newton, (unten + oben) / 2)
+
+    return np.where(loesbar, (faktor ** 12 - 1) * 100, np.nan)
+
+
+def berechne_erreichungsmonat(schwellenwert, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent):
+    """
+    Berechnet, nach wie vielen Monaten der Bestand den Schwellenwert erstmals erreicht
+
+    Mit B_k = L + (S - L) × f^k und dem Fixpunkt L = -Z / (f - 1) folgt
+    k = ceil(log((T - L) / (S - L)) / log f); das Ergebnis wird anschließend an
+    den ganzzahligen Monatsgrenzen gegen Rundungsfehler abgesichert.
+
+    Returns:
+        np.ndarray: Anzahl Monate k (0, falls bereits erreicht; NaN, falls nie)
+    """
+    schwellenwert, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent = np.broadcast_arrays(*(
+        np.asarray(wert, dtype=np.float64)
+        for wert in (schwellenwert, startbestand, monatliche_zugaenge, jaehrliches_wachstum_prozent)
+    ))
+    faktor = berechne_wachstumsfaktor(jaehrliches_wachstum_prozent)
+    wachstum = faktor - 1
+    ohne_wachstum = wachstum == 0
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        fixpunkt = -monatliche_zugaenge / np.where(ohne_wachstum, 1.0, wachstum)
+        verhaeltnis = (schwellenwert - fixpunkt) / (startbestand - fixpunkt)
+        monate = np.where(
+            ohne_wachstum,
+            np.ceil((schwellenwert - startbestand) / monatliche_zugaenge),
+            np.ceil(np.log(verhaeltnis) / np.log(faktor)),
+        )
+    monate = np.where(np.isfinite(monate) & (monate >= 0), monate, np.nan)
+
+    # Rundungsfehler an der Monatsgrenze korrigieren
+    kandidat = np.nan_to_num(monate)
+    bestand = _bestand_und_ableitung(startbestand, monatliche_zugaenge, faktor, kandidat)[0]
+    monate = np.where(bestand < schwellenwert, monate + 1, monate)
+    vorher = _bestand_und_ableitung(startbestand, monatliche_zugaenge, faktor, np.maximum(kandidat - 1, 0))[0]
+    monate = np.where((kandidat >= 1) & (vorher >= schwellenwert), monate - 1, monate)
+
+    return np.where(startbestand >= schwellenwert, 0.0, monate)
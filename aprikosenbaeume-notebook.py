@@ -33,8 +33,32 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from datetime import datetime, timedelta
+from datetime import datetime
 import warnings
+from contextlib import ExitStack
+
+from aprikosen_prognose_engine import (
+    Projektion,
+    berechne_periodenwerte,
+    berechne_szenarien,
+    berechne_wachstumsfaktor,
+    expandiere_frame,
+    iteriere_szenarien,
+    kompaktiere_frame,
+    vergleiche_speicherbedarf
+)
+from aprikosen_export import (
+    CsvStromSchreiber,
+    ExcelStromSchreiber,
+    lies_arrow,
+    lies_parameter,
+    schreibe_arrow,
+    schreibe_parquet
+)
+from aprikosen_kalibrierung import kalibriere
+from aprikosen_kohorten import KohortenParameter, berechne_kohortenprojektion
+from aprikosen_laufspeicher import Laufspeicher
+
 warnings.filterwarnings('ignore')
 
 # Konfiguration für bessere Darstellung
@@ -66,11 +90,21 @@ class AprikosenbaumPrognose:
         
         # Berechnete Werte
         self.monate_gesamt = self.prognosejahre * 12
-        self.monatlicher_wachstumsfaktor = (1 + self.jaehrliches_wachstum_prozent/100) ** (1/12)
+        self.monatlicher_wachstumsfaktor = berechne_wachstumsfaktor(self.jaehrliches_wachstum_prozent)
+        
+        # Kompaktes Ergebnis (Jahresstichtage); Monatswerte werden erst bei Bedarf erzeugt
+        self.projektion = Projektion(
+            self.startbestand,
+            self.monatliche_zugaenge,
+            self.jaehrliches_wachstum_prozent,
+            self.prognosejahre,
+            self.startdatum
+        )
         
         # Datenstrukturen für Ergebnisse
         self.monatsdaten = pd.DataFrame()
         self.jahresdaten = pd.DataFrame()
+        self.perioden = {}
         
     def zeige_parameter(self):
         """Zeigt die aktuellen Parameter an"""
@@ -104,48 +138,25 @@ def berechne_monatliche_entwicklung(prognose_obj):
         pd.DataFrame: Monatliche Daten mit Datum, Bestand und Wachstum
     """
     
-    # Initialisiere Datenstrukturen
-    daten = []
-    aktueller_bestand = prognose_obj.startbestand
-    
     print("🔄 Berechne monatliche Entwicklung...")
     
-    for monat in range(1, prognose_obj.monate_gesamt + 1):
-        # Berechne aktuelles Datum
-        aktuelles_datum = prognose_obj.startdatum + timedelta(days=30.44 * (monat - 1))
-        
-        # Berechne Jahr und Monat der Prognose
-        prognosejahr = ((monat - 1) // 12) + 1
-        prognose_monat = ((monat - 1) % 12) + 1
-        
-        # Speichere aktuelle Daten
-        daten.append({
-            'Monat': monat,
-            'Datum': aktuelles_datum,
-            'Prognosejahr': prognosejahr,
-            'Prognose_Monat': prognose_monat,
-            'Kalenderjahr': aktuelles_datum.year,
-            'Kalendermonat': aktuelles_datum.month,
-            'Monatsname': aktuelles_datum.strftime('%B %Y'),
-            'Baumbestand': round(aktueller_bestand),
-            'Monatlicher_Zuwachs': round(aktueller_bestand * (prognose_obj.monatlicher_wachstumsfaktor - 1) + prognose_obj.monatliche_zugaenge),
-            'Wachstum_Prozent': round((aktueller_bestand * (prognose_obj.monatlicher_wachstumsfaktor - 1) / aktueller_bestand) * 100, 4),
-            'Zugaenge_Fix': prognose_obj.monatliche_zugaenge
-        })
-        
-        # Berechne neuen Bestand für nächsten Monat
-        aktueller_bestand = aktueller_bestand * prognose_obj.monatlicher_wachstumsfaktor + prognose_obj.monatliche_zugaenge
-    
-    # Erstelle DataFrame
-    df = pd.DataFrame(daten)
+    # Materialisiere alle Monate samt Kalenderspalten aus der geschlossenen Form
+    df = prognose_obj.projektion.monatswerte()
+    df['Wachstum_Prozent'] = round((prognose_obj.monatlicher_wachstumsfaktor - 1) * 100, 4)
+    df['Zugaenge_Fix'] = prognose_obj.monatliche_zugaenge
     
     # Berechne kumulierte Werte
     df['Gesamtzuwachs'] = df['Baumbestand'] - prognose_obj.startbestand
     df['Gesamtwachstum_Prozent'] = ((df['Baumbestand'] / prognose_obj.startbestand) - 1) * 100
     
+    # Kompakte Datentypen; konstante Spalten wandern in die Metadaten (df.attrs)
+    kompakt = kompaktiere_frame(df, konstante_spalten=['Wachstum_Prozent', 'Zugaenge_Fix'])
+    speicher = vergleiche_speicherbedarf(df, kompakt).loc['Gesamt']
+    
     print(f"✅ Berechnung abgeschlossen: {len(df)} Monate berechnet")
+    print(f"   Speicherbedarf: {speicher['Bytes_vorher'] / 1024:,.1f} KB → {speicher['Bytes_nachher'] / 1024:,.1f} KB")
     
-    return df
+    return kompakt
 
 # Berechne die monatlichen Daten
 prognose.monatsdaten = berechne_monatliche_entwicklung(prognose)
@@ -156,52 +167,60 @@ print(prognose.monatsdaten[['Datum', 'Monatsname', 'Baumbestand', 'Monatlicher_Z
 
 # Zellentyp: Markdown
 """
-## 3. Berechnung der jährlichen Zusammenfassung
+## 3. Berechnung der Perioden-Zusammenfassungen
 
-Für eine bessere Übersicht erstellen wir eine Zusammenfassung der Entwicklung am Ende jedes Prognosejahres.
+Für eine bessere Übersicht verdichten wir die Monatswerte in einem Durchgang zu Quartalen, Prognosejahren und Kalenderjahren: Endbestand, Zuwachs und Wachstum der Periode, kumulierte Zugänge und Zinseszinsanteil.
 """
 
 # Zellentyp: Code
-def berechne_jaehrliche_zusammenfassung(monatsdaten):
+def berechne_periodenzusammenfassung(prognose_obj):
     """
-    Erstellt eine jährliche Zusammenfassung basierend auf den monatlichen Daten
+    Verdichtet die Monatsbestände in einem Durchgang zu Quartalen, Prognose- und Kalenderjahren
     
     Returns:
-        pd.DataFrame: Jährliche Zusammenfassung
+        dict[str, pd.DataFrame]: Zusammenfassung je Granularität
     """
     
-    print("📅 Erstelle jährliche Zusammenfassung...")
-    
-    # Filtere Dezember-Daten (Ende jedes Prognosejahres)
-    jahresende_daten = monatsdaten[monatsdaten['Prognose_Monat'] == 12].copy()
-    
-    # Berechne zusätzliche Kennzahlen
-    jahresende_daten['Vorjahr_Bestand'] = jahresende_daten['Baumbestand'].shift(1)
-    jahresende_daten['Jaehrlicher_Zuwachs'] = jahresende_daten['Baumbestand'] - jahresende_daten['Vorjahr_Bestand']
-    jahresende_daten['Jaehrliches_Wachstum_Prozent'] = ((jahresende_daten['Baumbestand'] / jahresende_daten['Vorjahr_Bestand']) - 1) * 100
-    
-    # Für das erste Jahr: Vergleich mit Startbestand
-    jahresende_daten.loc[jahresende_daten['Prognosejahr'] == 1, 'Vorjahr_Bestand'] = prognose.startbestand
-    jahresende_daten.loc[jahresende_daten['Prognosejahr'] == 1, 'Jaehrlicher_Zuwachs'] = \
-        jahresende_daten.loc[jahresende_daten['Prognosejahr'] == 1, 'Baumbestand'] - prognose.startbestand
-    jahresende_daten.loc[jahresende_daten['Prognosejahr'] == 1, 'Jaehrliches_Wachstum_Prozent'] = \
-        ((jahresende_daten.loc[jahresende_daten['Prognosejahr'] == 1, 'Baumbestand'] / prognose.startbestand) - 1) * 100
-    
-    # Bereinige die Daten
-    jahresende_daten = jahresende_daten.round(2)
-    
-    print(f"✅ Jährliche Zusammenfassung erstellt: {len(jahresende_daten)} Jahre")
-    
-    return jahresende_daten[['Prognosejahr', 'Kalenderjahr', 'Datum', 'Baumbestand', 
-                           'Jaehrlicher_Zuwachs', 'Jaehrliches_Wachstum_Prozent', 'Gesamtzuwachs']]
-
-# Berechne jährliche Daten
-prognose.jahresdaten = berechne_jaehrliche_zusammenfassung(prognose.monatsdaten)
+    print("📅 Erstelle Periodenzusammenfassungen...")
+    
+    perioden = berechne_periodenwerte(
+        prognose_obj.monatsdaten['Baumbestand'].to_numpy(),
+        prognose_obj.startbestand,
+        prognose_obj.monatliche_zugaenge,
+        prognose_obj.startdatum,
+    )
+    
+    print(f"✅ Zusammenfassungen erstellt: {len(perioden['Quartal'])} Quartale, "
+          f"{len(perioden['Prognosejahr'])} Prognosejahre, {len(perioden['Kalenderjahr'])} Kalenderjahre")
+    
+    return perioden
+
+def jaehrliche_zusammenfassung(perioden):
+    """Jahresübersicht der Prognosejahre im bisherigen Tabellenformat"""
+    jahre = perioden['Prognosejahr']
+    return pd.DataFrame({
+        'Prognosejahr': jahre['Periode'],
+        'Kalenderjahr': jahre['Datum'].dt.year,
+        'Datum': jahre['Datum'],
+        'Baumbestand': jahre['Baumbestand'],
+        'Jaehrlicher_Zuwachs': jahre['Perioden_Zuwachs'],
+        'Jaehrliches_Wachstum_Prozent': jahre['Wachstum_Prozent'],
+        'Gesamtzuwachs': jahre['Gesamtzuwachs'],
+    }).round(2)
+
+# Berechne Quartals- und Jahresdaten
+prognose.perioden = berechne_periodenzusammenfassung(prognose)
+prognose.jahresdaten = jaehrliche_zusammenfassung(prognose.perioden)
 
 # Zeige die jährliche Zusammenfassung
 print("\n📊 Jährliche Zusammenfassung:")
 print(prognose.jahresdaten.to_string(index=False))
 
+print("\n📊 Kalenderjahre:")
+print(prognose.perioden['Kalenderjahr'][['Periode', 'Anzahl_Monate', 'Baumbestand', 'Perioden_Zuwachs',
+                                         'Kumulierte_Zugaenge', 'Zinseszinsanteil_Prozent']]
+      .round(2).to_string(index=False))
+
 # Zellentyp: Markdown
 """
 ## 4. Datenvisualisierung
@@ -374,21 +393,20 @@ def szenario_analyse():
         'Aggressiv': {'wachstum': 12.0, 'zugaenge': 2500}
     }
     
+    # Berechne alle Szenarien in einem gemeinsamen Durchlauf
+    basis_prognose = AprikosenbaumPrognose()
+    szenario_tabelle = berechne_szenarien(
+        basis_prognose.startbestand,
+        [parameter['zugaenge'] for parameter in szenarien.values()],
+        [parameter['wachstum'] for parameter in szenarien.values()],
+        basis_prognose.prognosejahre
+    )
+    
     szenario_ergebnisse = {}
     
-    for szenario_name, parameter in szenarien.items():
-        # Erstelle temporäre Prognose
-        temp_prognose = AprikosenbaumPrognose()
-        temp_prognose.jaehrliches_wachstum_prozent = parameter['wachstum']
-        temp_prognose.monatliche_zugaenge = parameter['zugaenge']
-        temp_prognose.monatlicher_wachstumsfaktor = (1 + parameter['wachstum']/100) ** (1/12)
-        
-        # Berechne Ergebnisse
-        temp_monatsdaten = berechne_monatliche_entwicklung(temp_prognose)
-        temp_jahresdaten = berechne_jaehrliche_zusammenfassung(temp_monatsdaten)
-        
-        end_bestand = temp_jahresdaten['Baumbestand'].iloc[-1]
-        gesamtwachstum = ((end_bestand / temp_prognose.startbestand) - 1) * 100
+    for (szenario_name, parameter), (_, zeile) in zip(szenarien.items(), szenario_tabelle.iterrows()):
+        end_bestand = zeile['Endbestand']
+        gesamtwachstum = zeile['Gesamtwachstum_Prozent']
         
         szenario_ergebnisse[szenario_name] = {
             'end_bestand': end_bestand,
@@ -439,69 +457,241 @@ def szenario_analyse():
 # Führe Szenario-Analyse durch
 szenario_ergebnisse = szenario_analyse()
 
+# Zellentyp: Markdown
+"""
+### 6.1 Kohortenmodell mit Altersstruktur
+
+Das Grundmodell behandelt alle Bäume gleich. Im Kohortenmodell werden die Bäume nach Alter in Monaten geführt: Jungbäume tragen erst nach einigen Jahren, haben eine höhere Ausfallrate, und alte Bäume gehen verstärkt ab. Das jährliche Wachstum wirkt nur über die tragfähigen Bäume.
+"""
+
+# Zellentyp: Code
+def kohorten_analyse(prognose_obj):
+    """
+    Vergleicht das Grundmodell mit dem altersstrukturierten Kohortenmodell
+    """
+    
+    print("🌳 KOHORTENMODELL")
+    print("=" * 60)
+    
+    parameter = KohortenParameter(
+        prognose_obj.startbestand,
+        prognose_obj.monatliche_zugaenge,
+        prognose_obj.jaehrliches_wachstum_prozent,
+        prognose_obj.prognosejahre
+    )
+    kohorten = berechne_kohortenprojektion(parameter, prognose_obj.startdatum)
+    
+    jahresende = kohorten[kohorten['Prognose_Monat'] == 12]
+    vergleich = pd.DataFrame({
+        'Prognosejahr': jahresende['Prognosejahr'].to_numpy(),
+        'Grundmodell': prognose_obj.jahresdaten['Baumbestand'].to_numpy(),
+        'Kohortenmodell': jahresende['Baumbestand'].round().to_numpy(),
+        'Reife_Baeume': jahresende['Reife_Baeume'].round().to_numpy(),
+        'Ertrag_t_Monat': (jahresende['Ertrag_kg'] / 1000).round(1).to_numpy(),
+    })
+    print(vergleich.to_string(index=False))
+    print(f"\n   Abgänge im Prognosezeitraum: {kohorten['Abgaenge'].sum():,.0f} Bäume")
+    print(f"   Gesamtertrag im Prognosezeitraum: {kohorten['Ertrag_kg'].sum() / 1000:,.1f} t")
+    
+    return kohorten
+
+kohortendaten = kohorten_analyse(prognose)
+
+# Zellentyp: Markdown
+"""
+### 6.2 Kalibrierung an beobachteten Beständen
+
+Sobald reale Bestandszahlen vorliegen, lassen sich Startbestand, Zugänge und Wachstum aus ihnen schätzen. Hier dienen verrauschte Werte der Prognose als Beispiel für Ist-Daten; die letzten 12 Monate werden nicht zur Schätzung verwendet, sondern als Prognose-gegen-Ist-Vergleich.
+"""
+
+# Zellentyp: Code
+def kalibrierungs_analyse(prognose_obj, pruefmonate=12, rauschen_prozent=1.0):
+    """
+    Schätzt die Modellparameter aus (hier simulierten) Ist-Beständen und bewertet die Prognosegüte
+    """
+    
+    print("🎯 KALIBRIERUNG AN IST-DATEN")
+    print("=" * 60)
+    
+    zufall = np.random.default_rng(42)
+    beobachtungen = pd.DataFrame({
+        'id': 'Plantage_1',
+        'Datum': prognose_obj.monatsdaten['Datum'],
+        'Baumbestand': (prognose_obj.monatsdaten['Baumbestand']
+                        * (1 + zufall.normal(0, rauschen_prozent / 100, prognose_obj.monate_gesamt))).round(),
+    })
+    kalibrierung = kalibriere(beobachtungen, pruefmonate=pruefmonate)
+    ergebnis = kalibrierung.iloc[0]
+    
+    vergleich = pd.DataFrame({
+        'Parameter': ['Startbestand', 'Monatliche Zugänge', 'Jährliches Wachstum (%)'],
+        'Annahme': [prognose_obj.startbestand, prognose_obj.monatliche_zugaenge,
+                    prognose_obj.jaehrliches_wachstum_prozent],
+        'Geschätzt': [ergebnis['startbestand'], ergebnis['monatliche_zugaenge'], ergebnis['jaehrliches_wachstum']],
+    })
+    print(vergleich.to_string(index=False))
+    print(f"\n   Anpassung:  RMSE {ergebnis['RMSE']:,.0f} Bäume, MAPE {ergebnis['MAPE_Prozent']:.2f}%, "
+          f"R² {ergebnis['R2']:.4f}")
+    print(f"   Prognose der letzten {pruefmonate} Monate:  RMSE {ergebnis['Prognose_RMSE']:,.0f} Bäume, "
+          f"MAPE {ergebnis['Prognose_MAPE_Prozent']:.2f}%, Bias {ergebnis['Prognose_Bias']:+,.0f} Bäume")
+    
+    return kalibrierung
+
+kalibrierung = kalibrierungs_analyse(prognose)
+
 # Zellentyp: Markdown
 """
 ## 7. Export und Speicherung
 
-Speichere die Ergebnisse in verschiedenen Formaten für weitere Verwendung.
+Speichere die Ergebnisse in verschiedenen Formaten für weitere Verwendung. Parquet und Arrow sind spaltenorientiert, kompakt und enthalten die Parameter in den Metadaten; Excel, CSV und JSON sind optional.
 """
 
 # Zellentyp: Code
-def exportiere_ergebnisse(monatsdaten, jahresdaten, statistiken):
+def zeige_exportstatistik(statistik):
+    """Gibt Durchsatz eines Exports aus"""
+    print(f"   {statistik['Zeilen']:,} Zeilen, {statistik['Bytes'] / 1024:,.1f} KB in {statistik['Sekunden']:.2f} s "
+          f"({statistik['Zeilen_pro_Sekunde']:,.0f} Zeilen/s, {statistik['Bytes_pro_Sekunde'] / 1024:,.0f} KB/s)")
+
+def szenario_bloecke(szenarien):
+    """
+    Liefert die Monatswerte der Szenarien blockweise aus der Engine, mit Szenarionamen
+    """
+    namen = np.array(list(szenarien))
+    for block in iteriere_szenarien(
+        prognose.startbestand,
+        [ergebnis['parameter']['zugaenge'] for ergebnis in szenarien.values()],
+        [ergebnis['parameter']['wachstum'] for ergebnis in szenarien.values()],
+        prognose.prognosejahre
+    ):
+        block['Szenario'] = namen[block['Szenario']]
+        yield block
+
+def exportiere_ergebnisse(monatsdaten, jahresdaten, statistiken, szenarien=None,
+                          formate=('parquet', 'arrow')):
     """
     Exportiert die Ergebnisse in verschiedene Formate
+    
+    Parquet und Arrow werden spaltenweise mit den Parametern in den Metadaten
+    geschrieben; Excel, CSV und JSON sind langsamere, optionale Formate. Die
+    Monatswerte der Szenarien werden einmal blockweise berechnet und jeder
+    Block an alle gewählten Formate übergeben.
     """
     
     print("💾 DATENEXPORT")
     print("=" * 40)
     
+    # Exporte enthalten wieder alle Spalten, auch die in die Metadaten ausgelagerten
+    monatsdaten = expandiere_frame(monatsdaten)
+    
+    parameter = {
+        'startdatum': prognose.startdatum.isoformat(),
+        'startbestand': prognose.startbestand,
+        'monatliche_zugaenge': prognose.monatliche_zugaenge,
+        'jaehrliches_wachstum_prozent': prognose.jaehrliches_wachstum_prozent,
+        'prognosejahre': prognose.prognosejahre
+    }
+    
     try:
-        # Excel-Export
-        with pd.ExcelWriter('aprikosenbaeume_prognose.xlsx', engine='openpyxl') as writer:
-            monatsdaten.to_excel(writer, sheet_name='Monatsdaten', index=False)
-            jahresdaten.to_excel(writer, sheet_name='Jahresdaten', index=False)
+        with ExitStack() as dateien:
+            # Spaltenorientierter Export
+            if 'parquet' in formate:
+                schreibe_parquet(monatsdaten, 'aprikosenbaeume_monatsdaten.parquet', parameter)
+                schreibe_parquet(jahresdaten, 'aprikosenbaeume_jahresdaten.parquet', parameter)
+                print("✅ Parquet-Dateien erstellt:")
+                print("   - aprikosenbaeume_monatsdaten.parquet")
+                print("   - aprikosenbaeume_jahresdaten.parquet")
             
-            # Statistiken als DataFrame
-            statistiken_df = pd.DataFrame([statistiken])
-            statistiken_df.to_excel(writer, sheet_name='Statistiken', index=False)
+            if 'arrow' in formate:
+                schreibe_arrow(monatsdaten, 'aprikosenbaeume_monatsdaten.arrow', parameter)
+                print("✅ Arrow-Datei erstellt: aprikosenbaeume_monatsdaten.arrow")
             
-        print("✅ Excel-Datei erstellt: aprikosenbaeume_prognose.xlsx")
-        
-        # CSV-Export
-        monatsdaten.to_csv('aprikosenbaeume_monatsdaten.csv', index=False, sep=';')
-        jahresdaten.to_csv('aprikosenbaeume_jahresdaten.csv', index=False, sep=';')
+            # Excel-Export (Nur-Schreiben-Modus, konstanter Speicherbedarf)
+            excel = None
+            if 'excel' in formate:
+                excel = dateien.enter_context(ExcelStromSchreiber('aprikosenbaeume_prognose.xlsx'))
+                excel.schreibe('Monatsdaten', monatsdaten)
+                excel.schreibe('Jahresdaten', jahresdaten)
+                
+                # Statistiken als DataFrame
+                excel.schreibe('Statistiken', pd.DataFrame([statistiken]))
+            
+            # CSV-Export (gepuffert, blockweise)
+            szenario_csv = None
+            if 'csv' in formate:
+                print("✅ CSV-Dateien erstellt:")
+                for daten, pfad in ((monatsdaten, 'aprikosenbaeume_monatsdaten.csv'),
+                                    (jahresdaten, 'aprikosenbaeume_jahresdaten.csv')):
+                    with CsvStromSchreiber(pfad, sep=';') as csv_datei:
+                        csv_datei.schreibe(daten)
+                    print(f"   - {pfad}")
+                    zeige_exportstatistik(csv_datei.statistik)
+                if szenarien is not None:
+                    szenario_csv = dateien.enter_context(
+                        CsvStromSchreiber('aprikosenbaeume_szenarien.csv', sep=';')
+                    )
+            
+            # Szenarien: jeder Block wird einmal berechnet und an alle Formate übergeben
+            if szenarien is not None:
+                for block in szenario_bloecke(szenarien):
+                    if 'parquet' in formate:
+                        # Jeder Block ersetzt nur die Partitionen seiner eigenen Szenarien
+                        schreibe_parquet(block, 'aprikosenbaeume_szenarien', parameter, partitionen=['Szenario'])
+                    if excel is not None:
+                        excel.schreibe('Szenarien', block)
+                    if szenario_csv is not None:
+                        szenario_csv.schreibe(block)
+                if 'parquet' in formate:
+                    print("   - aprikosenbaeume_szenarien/ (Parquet, partitioniert nach Szenario)")
         
-        print("✅ CSV-Dateien erstellt:")
-        print("   - aprikosenbaeume_monatsdaten.csv")
-        print("   - aprikosenbaeume_jahresdaten.csv")
+        # Statistiken erst nach dem Schließen, dann sind alle Blöcke geschrieben
+        if szenario_csv is not None:
+            print("   - aprikosenbaeume_szenarien.csv")
+            zeige_exportstatistik(szenario_csv.statistik)
+        if excel is not None:
+            print("✅ Excel-Datei erstellt: aprikosenbaeume_prognose.xlsx")
+            zeige_exportstatistik(excel.statistik)
         
         # JSON-Export für API-Verwendung
-        export_data = {
-            'parameter': {
-                'startdatum': prognose.startdatum.isoformat(),
-                'startbestand': prognose.startbestand,
-                'monatliche_zugaenge': prognose.monatliche_zugaenge,
-                'jaehrliches_wachstum_prozent': prognose.jaehrliches_wachstum_prozent,
-                'prognosejahre': prognose.prognosejahre
-            },
-            'monatsdaten': monatsdaten.to_dict('records'),
-            'jahresdaten': jahresdaten.to_dict('records'),
-            'statistiken': statistiken
-        }
-        
-        import json
-        with open('aprikosenbaeume_prognose.json', 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, ensure_ascii=False, indent=2, default=str)
-        
-        print("✅ JSON-Datei erstellt: aprikosenbaeume_prognose.json")
+        if 'json' in formate:
+            export_data = {
+                'parameter': parameter,
+                'monatsdaten': monatsdaten.to_dict('records'),
+                'jahresdaten': jahresdaten.to_dict('records'),
+                'statistiken': statistiken
+            }
+            
+            import json
+            with open('aprikosenbaeume_prognose.json', 'w', encoding='utf-8') as f:
+                json.dump(export_data, f, ensure_ascii=False, indent=2, default=str)
+            
+            print("✅ JSON-Datei erstellt: aprikosenbaeume_prognose.json")
         
     except Exception as e:
         print(f"❌ Fehler beim Export: {e}")
         
     print("\n📁 Alle Dateien wurden erfolgreich erstellt!")
 
-# Exportiere Ergebnisse
-exportiere_ergebnisse(prognose.monatsdaten, prognose.jahresdaten, statistiken)
+# Exportiere Ergebnisse (spaltenorientiert sowie in den bisherigen Formaten)
+exportiere_ergebnisse(prognose.monatsdaten, prognose.jahresdaten, statistiken, szenario_ergebnisse,
+                      formate=('parquet', 'arrow', 'excel', 'csv', 'json'))
+
+# Lauf im lokalen Laufspeicher ablegen; gleiche Parameter werden beim nächsten Mal wiederverwendet,
+# ein längerer Prognosezeitraum setzt den gespeicherten Lauf fort
+with Laufspeicher() as laufspeicher:
+    _, herkunft = laufspeicher.hole_oder_berechne(
+        prognose.startdatum,
+        prognose.startbestand,
+        prognose.monatliche_zugaenge,
+        prognose.jaehrliches_wachstum_prozent,
+        prognose.prognosejahre
+    )
+    anzahl_laeufe = len(laufspeicher.abfrage())
+print(f"🗄️ Laufspeicher: {herkunft} ({anzahl_laeufe} gespeicherte Läufe)")
+
+# Spaltenorientierte Dateien lassen sich ohne Kopie speicherabgebildet lesen
+monatsdaten_arrow = lies_arrow('aprikosenbaeume_monatsdaten.arrow')
+print(f"   Gelesen: {monatsdaten_arrow.num_rows} Zeilen, Parameter aus den Metadaten: "
+      f"{lies_parameter(monatsdaten_arrow)[0]}")
 
 # Zellentyp: Markdown
 """
@@ -524,4 +714,5 @@ exportiere_ergebnisse(prognose.monatsdaten, prognose.jahresdaten, statistiken)
 ### Nächste Schritte:
 
 1. Regelmäßige Aktualisierung der Prognose mit realen Daten
-2. Er
\ No newline at end of file
+2. Er
+"""
@@ -0,0 +1,21 @@
+import io
+
+import pandas as pd
+
+from aprikosen_cli import fuehre_batch_aus
+
+
+def test_ueberlauf_aendert_andere_zeilen_nicht():
+    eingabe = io.StringIO(
+        "id;startbestand;monatliche_zugaenge;jaehrliches_wachstum;prognosejahre\n"
+        "a;60000;1800;7;5\n"
+        "b;1000;100;500;1000\n"
+    )
+    ausgabe = io.StringIO()
+    statistik = fuehre_batch_aus(eingabe, ausgabe)
+    assert statistik['berechnet'] == 2
+
+    zeilen = ausgabe.getvalue().splitlines()
+    assert zeilen[1].split(';')[5] == '209322'
+    ergebnis = pd.read_csv(io.StringIO(ausgabe.getvalue()), sep=';')
+    assert ergebnis['Log10_Endbestand'].iloc[1] > 700
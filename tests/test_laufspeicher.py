@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from aprikosen_laufspeicher import Laufspeicher
+from aprikosen_prognose_engine import berechne_projektion, berechne_wachstumsfaktor
+
+
+def test_fortsetzung_ueber_int64_grenze(tmp_path):
+    with Laufspeicher(str(tmp_path)) as speicher:
+        kurz, herkunft = speicher.hole_oder_berechne('2025-05-01', 60_000, 1_800, 1000.0, 5)
+        assert herkunft == 'Neu'
+        assert kurz['Baumbestand'].dtype == np.int64
+
+        lang, herkunft = speicher.hole_oder_berechne('2025-05-01', 60_000, 1_800, 1000.0, 50)
+        assert herkunft == 'Fortgesetzt'
+        assert len(lang) == 600
+        assert lang['Baumbestand'].dtype == np.float64
+        assert lang['Baumbestand'].iloc[-1] > 2.0 ** 63
+
+        erwartet = pd.DataFrame(berechne_projektion(60_000, 1_800, berechne_wachstumsfaktor(1000.0), 600))
+        np.testing.assert_allclose(lang['Baumbestand'], erwartet['Baumbestand'], rtol=1e-12)
+
+        # Der kurze Zeitraum kommt weiter ganzzahlig aus dem gemischten Lauf
+        wieder, herkunft = speicher.hole_oder_berechne('2025-05-01', 60_000, 1_800, 1000.0, 5)
+        assert herkunft == 'Speicher'
+        pd.testing.assert_frame_equal(wieder, kurz)
@@ -0,0 +1,8 @@
+from aprikosen_monte_carlo import MonteCarloParameter, berechne_perzentilbaender
+
+
+def test_skizze_unabhaengig_von_worker_anzahl():
+    parameter = MonteCarloParameter(60_000, 1_800, 7.0, 3, 2.0, 200, 0.3, 0.01, 0.05, 0.2)
+    seriell = berechne_perzentilbaender(parameter, 5_000, seed=7, block_groesse=500)
+    parallel = berechne_perzentilbaender(parameter, 5_000, seed=7, block_groesse=500, max_worker=2)
+    assert seriell.equals(parallel)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from aprikosen_prognose_engine import berechne_planreihe, berechne_projektion, berechne_wachstumsfaktor
+
+
+def _schrittweise(startbestand, zugaenge, faktor):
+    bestand = float(startbestand)
+    reihe = []
+    for zugang, f in zip(zugaenge, faktor):
+        reihe.append(bestand)
+        bestand = f * bestand + zugang
+    return np.array(reihe)
+
+
+def test_planreihe_mit_nullwachstum():
+    wachstum = np.r_[np.full(12, 5.0), np.zeros(12), np.full(12, 3.0)]
+    faktor = berechne_wachstumsfaktor(wachstum)
+    zugaenge = np.full(36, 100.0)
+
+    bestand = berechne_planreihe(1000, zugaenge, faktor, 36)
+    assert np.isfinite(bestand).all()
+    np.testing.assert_allclose(bestand, _schrittweise(1000, zugaenge, faktor), rtol=1e-12)
+    # Im Abschnitt mit 0 % wächst der Bestand genau um die Zugänge
+    np.testing.assert_allclose(np.diff(bestand[12:25]), 100.0, rtol=1e-12)
+
+
+def test_planreihe_ohne_wachstum_wie_geschlossene_form():
+    faktor = berechne_wachstumsfaktor(0.0)
+    bestand = berechne_planreihe(1000, 100, faktor, 24)
+    np.testing.assert_array_equal(bestand, 1000 + 100 * np.arange(24))
+    np.testing.assert_array_equal(bestand, berechne_projektion(1000, 100, faktor, 24)['Baumbestand'])
+
+
+def test_planreihe_je_szenario_mit_nullwachstum():
+    faktor = berechne_wachstumsfaktor(np.array([[0.0], [7.0]]))
+    bestand = berechne_planreihe(np.array([1000, 500]), 50, faktor, 12)
+    assert np.isfinite(bestand).all()
+    np.testing.assert_allclose(bestand[0], 1000 + 50 * np.arange(12), rtol=1e-12)
+    np.testing.assert_allclose(bestand[1], _schrittweise(500, np.full(12, 50.0), np.full(12, faktor[1, 0])), rtol=1e-12)